@@ -0,0 +1,126 @@
+# ----------------------------
+# Description: Shared helpers for benchmarks of interpret.py
+# Name: common.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from xml.sax.saxutils import escape
+
+benchDir = os.path.dirname(os.path.abspath(__file__))
+repoDir = os.path.dirname(benchDir)
+interpretScript = os.path.join(repoDir, "interpret.py")
+
+labelInstructions = {"LABEL", "JUMP", "CALL", "JUMPIFEQ",
+                     "JUMPIFNEQ", "JUMPIFEQS", "JUMPIFNEQS"}
+
+
+"""
+    Converts IPPcode21 written as list of lines to XML representation
+    which is accepted by interpret.py. Argument types are taken from 'type@value'
+    notation, variables, labels and types are recognized by position.
+"""
+def toXML(lines):
+    xml = ['<?xml version="1.0" encoding="UTF-8"?>',
+           '<program language="IPPcode21">']
+    order = 0
+    for line in lines:
+        parts = line.split()
+        if len(parts) == 0:
+            continue
+        order += 1
+        opcode = parts[0].upper()
+        xml.append('<instruction order="{}" opcode="{}">'.format(order, opcode))
+        for i, arg in enumerate(parts[1:], 1):
+            if arg[0:3] in ("GF@", "LF@", "TF@"):
+                argType, value = "var", arg
+            elif i == 1 and opcode in labelInstructions:
+                argType, value = "label", arg
+            elif i == 2 and opcode == "READ":
+                argType, value = "type", arg
+            else:
+                argType, value = arg.split("@", 1)
+            xml.append('<arg{0} type="{1}">{2}</arg{0}>'.format(
+                i, argType, escape(value)))
+        xml.append('</instruction>')
+    xml.append('</program>')
+    return "\n".join(xml) + "\n"
+
+
+"""
+    Source text of IPPcode21 program given as list of lines, for --source-format=text.
+"""
+def toText(lines):
+    return "\n".join([".IPPcode21"] + lines) + "\n"
+
+
+def writeProgram(directory, name, lines, sourceFormat="xml"):
+    path = os.path.join(directory, name + "." + sourceFormat)
+    with open(path, "w") as f:
+        f.write(toText(lines) if sourceFormat == "text" else toXML(lines))
+    return path
+
+
+"""
+    Writes interpret.py from given git revision to directory and returns its path.
+"""
+def scriptAtRevision(revision, directory):
+    path = os.path.join(directory, "interpret-{}.py".format(
+        revision.replace("/", "_").replace("~", "_")))
+    source = subprocess.run(["git", "show", revision + ":interpret.py"],
+                            cwd=repoDir, stdout=subprocess.PIPE, check=True).stdout
+    with open(path, "wb") as f:
+        f.write(source)
+    return path
+
+
+"""
+    Runs interpreter in separate process.
+    Returns return code, output, wall time in seconds and peak RSS of process in kB.
+    If process runs longer than timeout it is killed and return code is None.
+    With inputPipe input file is given to interpreter through pipe on stdin instead of --input.
+"""
+def runInterpreter(script, source, inputFile=None, extraArgs=(), timeout=None, inputPipe=False):
+    args = [sys.executable, script, "--source=" + source]
+    if not inputPipe:
+        args.append("--input=" + (inputFile if inputFile else os.devnull))
+    args.extend(extraArgs)
+
+    with tempfile.TemporaryFile() as output:
+        start = time.perf_counter()
+        feeder = None
+        if inputPipe:
+            feeder = subprocess.Popen(["cat", inputFile], stdout=subprocess.PIPE)
+            process = subprocess.Popen(args, stdin=feeder.stdout, stdout=output,
+                                       stderr=subprocess.DEVNULL)
+            feeder.stdout.close()
+        else:
+            process = subprocess.Popen(args, stdout=output, stderr=subprocess.DEVNULL)
+        while True:
+            pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+            if pid != 0:
+                break
+            if timeout != None and time.perf_counter() - start > timeout:
+                process.kill()
+                os.wait4(process.pid, 0)
+                if feeder:
+                    feeder.kill()
+                    feeder.wait()
+                return {"rc": None, "stdout": b"", "wall": timeout, "maxrss": None}
+            time.sleep(0.005)
+        wall = time.perf_counter() - start
+        if feeder:
+            feeder.wait()
+        output.seek(0)
+        stdout = output.read()
+
+    if os.WIFEXITED(status):
+        returnCode = os.WEXITSTATUS(status)
+    else:
+        returnCode = -os.WTERMSIG(status)
+
+    return {"rc": returnCode, "stdout": stdout, "wall": wall, "maxrss": usage.ru_maxrss}
@@ -0,0 +1,107 @@
+# ----------------------------
+# Description: Benchmark of frame heavy recursion ( CREATEFRAME, PUSHFRAME, DEFVAR, POPFRAME ) of interpret.py
+# Name: frames.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import argparse
+import sys
+import tempfile
+
+from common import interpretScript, runInterpreter, scriptAtRevision, writeProgram
+
+
+"""
+    Recursion to 'depth' started 'repeat' times from loop in GF. Every level creates frame
+    with argument, defines 'localsCount' local variables and returns value on data stack,
+    so frames of finished calls can be used again by next calls.
+"""
+def recursionWorkload(depth, repeat, localsCount):
+    lines = [
+        "DEFVAR GF@i",
+        "DEFVAR GF@sum",
+        "DEFVAR GF@result",
+        "MOVE GF@i int@{}".format(repeat),
+        "MOVE GF@sum int@0",
+        "LABEL loop",
+        "CREATEFRAME",
+        "DEFVAR TF@n",
+        "MOVE TF@n int@{}".format(depth),
+        "CALL rec",
+        "POPS GF@result",
+        "ADD GF@sum GF@sum GF@result",
+        "SUB GF@i GF@i int@1",
+        "JUMPIFNEQ loop GF@i int@0",
+        "WRITE GF@sum",
+        "EXIT int@0",
+        "LABEL rec",
+        "PUSHFRAME",
+    ]
+    for i in range(localsCount):
+        lines.append("DEFVAR LF@v{}".format(i))
+        lines.append("MOVE LF@v{} LF@n".format(i))
+    lines += [
+        "JUMPIFNEQ deeper LF@n int@0",
+        "PUSHS int@0",
+        "POPFRAME",
+        "RETURN",
+        "LABEL deeper",
+        "CREATEFRAME",
+        "DEFVAR TF@n",
+        "SUB TF@n LF@n int@1",
+        "CALL rec",
+        "POPS LF@v0",
+        "ADD LF@v0 LF@v0 int@1",
+        "PUSHS LF@v0",
+        "POPFRAME",
+        "RETURN",
+    ]
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare time and peak RSS of interpret.py with older revision on deep recursion.")
+    parser.add_argument("--rev", default="HEAD",
+                        help="git revision used as 'before' (default HEAD)")
+    parser.add_argument("--depths", default="10000,100000",
+                        help="comma separated depths of recursion")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="count of recursions in one program (default 5)")
+    parser.add_argument("--locals", type=int, default=4,
+                        help="count of local variables of every call (default 4)")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="count of runs, best time is reported (default 3)")
+    parser.add_argument("--args", default="",
+                        help="extra arguments of interpreter, for example '--compile'")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        before = scriptAtRevision(args.rev, directory)
+        print("{:>10} {:>22} {:>22}".format(
+            "depth", "before ({})".format(args.rev), "after"))
+        for depth in [int(x) for x in args.depths.split(",")]:
+            source = writeProgram(directory, "frames",
+                                  recursionWorkload(depth, args.repeat, args.locals))
+            row = []
+            outputs = set()
+            for script in (before, interpretScript):
+                wall = None
+                for _ in range(args.runs):
+                    result = runInterpreter(script, source, extraArgs=args.args.split())
+                    if result["rc"] != 0:
+                        print("{}: interpreter failed with {}".format(
+                            script, result["rc"]), file=sys.stderr)
+                        sys.exit(1)
+                    outputs.add(result["stdout"])
+                    if wall == None or result["wall"] < wall:
+                        wall = result["wall"]
+                row.append("{:.2f} s {:>7} kB".format(wall, result["maxrss"]))
+            if len(outputs) != 1:
+                print("outputs of interpreters differ", file=sys.stderr)
+                sys.exit(1)
+            print("{:>10} {:>22} {:>22}".format(depth, *row))
+
+
+if __name__ == '__main__':
+    main()
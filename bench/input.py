@@ -0,0 +1,82 @@
+# ----------------------------
+# Description: Input benchmark of interpret.py, program reading large input
+# Name: input.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import argparse
+import os
+import sys
+import tempfile
+
+from common import interpretScript, runInterpreter, scriptAtRevision, writeProgram
+
+
+"""
+    Reads lines until end of input, ten READ instructions per iteration.
+    Every second line is read as int, others as string. Writes last read values.
+"""
+def readWorkload():
+    lines = [
+        "DEFVAR GF@x",
+        "DEFVAR GF@s",
+        "LABEL loop",
+    ]
+    for i in range(5):
+        lines.append("READ GF@x int")
+        lines.append("READ GF@s string")
+    lines += [
+        "JUMPIFNEQ loop GF@s nil@nil",
+        "WRITE GF@x",
+    ]
+    return lines
+
+
+def writeInput(path, pairs):
+    with open(path, "w") as f:
+        for i in range(pairs):
+            f.write("{}\nline number {} of input\n".format(i, i))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare READ throughput of interpret.py with older revision.")
+    parser.add_argument("--rev", default="HEAD",
+                        help="git revision used as 'before' (default HEAD)")
+    parser.add_argument("--pairs", type=int, default=1000000,
+                        help="count of int and string line pairs in input (default 1M)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs of every interpreter, best time is reported")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = writeProgram(directory, "input", readWorkload())
+        inputFile = os.path.join(directory, "input.txt")
+        writeInput(inputFile, args.pairs)
+        before = scriptAtRevision(args.rev, directory)
+
+        print("{} lines, {:.1f} MB of input".format(
+            2 * args.pairs, os.path.getsize(inputFile) / 1e6))
+        for inputPipe in (False, True):
+            outputs = set()
+            for name, script in (("before ({})".format(args.rev), before), ("after", interpretScript)):
+                best = None
+                for _ in range(args.repeat):
+                    result = runInterpreter(script, source, inputFile, inputPipe=inputPipe)
+                    if result["rc"] != 0:
+                        print("{}: interpreter failed with {}".format(
+                            name, result["rc"]), file=sys.stderr)
+                        sys.exit(1)
+                    outputs.add(result["stdout"])
+                    if best == None or result["wall"] < best:
+                        best = result["wall"]
+                print("{:<6} {:<20} {:.2f} s   {:.2f} M lines/s".format(
+                    "pipe" if inputPipe else "file", name, best,
+                    2 * args.pairs / best / 1e6))
+            if len(outputs) != 1:
+                print("outputs differ", file=sys.stderr)
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
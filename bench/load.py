@@ -0,0 +1,70 @@
+# ----------------------------
+# Description: Load time benchmark of interpret.py on large XML and text programs
+# Name: load.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import argparse
+import tempfile
+
+from common import interpretScript, runInterpreter, scriptAtRevision, writeProgram
+
+
+"""
+    Program with 'count' instructions which are only loaded.
+    First instruction jumps to the end, so load phase dominates the run.
+"""
+def largeProgram(count):
+    lines = ["JUMP end", "DEFVAR GF@x", "DEFVAR GF@s"]
+    body = [
+        "MOVE GF@x int@{}",
+        "ADD GF@x GF@x int@-{}",
+        "CONCAT GF@s string@a\\032b string@{}",
+        "LABEL l{}",
+        "JUMPIFEQ l{} GF@x int@{}",
+        "WRITE float@0x1.8p+1",
+        "PUSHS bool@true",
+        "POPS GF@x",
+    ]
+    i = 0
+    while len(lines) < count - 1:
+        lines.append(body[i % len(body)].format(i, i))
+        i += 1
+    lines.append("LABEL end")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare load time of interpret.py with older revision on large programs. "
+                    "Column 'after text' loads the same program from IPPcode21 text ( --source-format=text ).")
+    parser.add_argument("--rev", default="HEAD",
+                        help="git revision used as 'before' (default HEAD)")
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="comma separated counts of instructions")
+    parser.add_argument("--timeout", type=float, default=300,
+                        help="seconds after which run is killed")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        before = scriptAtRevision(args.rev, directory)
+        print("{:>10} {:>22} {:>22} {:>22}".format(
+            "insts", "before ({})".format(args.rev), "after", "after text"))
+        for size in [int(x) for x in args.sizes.split(",")]:
+            source = writeProgram(directory, "load", largeProgram(size))
+            text = writeProgram(directory, "load", largeProgram(size), "text")
+            runs = [(before, source, ()), (interpretScript, source, ()),
+                    (interpretScript, text, ("--source-format=text",))]
+            row = []
+            for script, program, extraArgs in runs:
+                result = runInterpreter(script, program, extraArgs=extraArgs, timeout=args.timeout)
+                if result["rc"] == None:
+                    row.append("timeout")
+                else:
+                    row.append("{:.2f} s {:>7} kB".format(
+                        result["wall"], result["maxrss"]))
+            print("{:>10} {:>22} {:>22} {:>22}".format(size, *row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# ----------------------------
+# Description: Benchmark of memoization of pure subroutines of interpret.py ( --memo )
+# Name: memo.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import argparse
+import sys
+import tempfile
+
+from common import interpretScript, runInterpreter, writeProgram
+from suite import fibWorkload
+
+
+"""
+    Binomial coefficient by recursion C(n, k) = C(n-1, k-1) + C(n-1, k),
+    arguments and result are passed on data stack.
+"""
+def binomialWorkload(n):
+    return [
+        "DEFVAR GF@result",
+        "PUSHS int@{}".format(n),
+        "PUSHS int@{}".format(n // 2),
+        "CALL binomial",
+        "POPS GF@result",
+        "WRITE GF@result",
+        "EXIT int@0",
+        "LABEL binomial",
+        "CREATEFRAME",
+        "PUSHFRAME",
+        "DEFVAR LF@n",
+        "DEFVAR LF@k",
+        "POPS LF@k",
+        "POPS LF@n",
+        "JUMPIFEQ one LF@k int@0",
+        "JUMPIFEQ one LF@k LF@n",
+        "SUB LF@n LF@n int@1",
+        "PUSHS LF@n",
+        "SUB LF@k LF@k int@1",
+        "PUSHS LF@k",
+        "CALL binomial",
+        "PUSHS LF@n",
+        "ADD LF@k LF@k int@1",
+        "PUSHS LF@k",
+        "CALL binomial",
+        "ADDS",
+        "POPFRAME",
+        "RETURN",
+        "LABEL one",
+        "PUSHS int@1",
+        "POPFRAME",
+        "RETURN",
+    ]
+
+
+workloads = {
+    "fib": fibWorkload,
+    "binomial": binomialWorkload,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare interpret.py without and with --memo on recursive workloads.")
+    parser.add_argument("--sizes", default="10,15,20",
+                        help="comma separated arguments of workloads (default 10,15,20)")
+    parser.add_argument("--memo", type=int, default=1024,
+                        help="size of cache (default 1024)")
+    parser.add_argument("--args", default="",
+                        help="extra arguments of interpreter, for example '--compile'")
+    parser.add_argument("--timeout", type=float, default=300,
+                        help="seconds after which run is killed")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print("{:<10} {:>5} {:>16} {:>16} {:>10} {:>8}".format(
+            "workload", "n", "plain", "--memo", "insts", "hits"))
+        for name, generator in workloads.items():
+            for size in [int(x) for x in args.sizes.split(",")]:
+                source = writeProgram(directory, name, generator(size))
+                statsFile = directory + "/stats"
+                runs = [args.args.split(), args.args.split() + ["--memo={}".format(args.memo),
+                        "--stats=" + statsFile, "--insts", "--memohits"]]
+                row = []
+                outputs = set()
+                for extraArgs in runs:
+                    result = runInterpreter(interpretScript, source, extraArgs=extraArgs,
+                                            timeout=args.timeout)
+                    if result["rc"] == None:
+                        row.append("timeout")
+                        continue
+                    if result["rc"] != 0:
+                        print("{}: interpreter failed with {}".format(
+                            name, result["rc"]), file=sys.stderr)
+                        sys.exit(1)
+                    outputs.add(result["stdout"])
+                    row.append("{:.2f} s".format(result["wall"]))
+                if len(outputs) > 1:
+                    print("{}: outputs differ".format(name), file=sys.stderr)
+                    sys.exit(1)
+                with open(statsFile) as f:
+                    insts, hits = f.read().split()
+                print("{:<10} {:>5} {:>16} {:>16} {:>10} {:>8}".format(
+                    name, size, row[0], row[1], insts, hits))
+
+
+if __name__ == '__main__':
+    main()
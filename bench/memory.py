@@ -0,0 +1,80 @@
+# ----------------------------
+# Description: Peak memory benchmark of interpret.py on recursive workload
+# Name: memory.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import argparse
+import sys
+import tempfile
+
+from common import interpretScript, runInterpreter, scriptAtRevision, writeProgram
+
+
+"""
+    Recursive function with large local frame. Every level defines and initializes
+    'localsCount' variables in LF and pushes one value on data stack.
+"""
+def recursiveWorkload(depth, localsCount):
+    lines = [
+        "DEFVAR GF@depth",
+        "MOVE GF@depth int@{}".format(depth),
+        "CREATEFRAME",
+        "DEFVAR TF@n",
+        "MOVE TF@n int@0",
+        "CALL rec",
+        "WRITE string@done",
+        "EXIT int@0",
+        "LABEL rec",
+        "PUSHFRAME",
+    ]
+    for i in range(localsCount):
+        lines.append("DEFVAR LF@v{}".format(i))
+        lines.append("MOVE LF@v{} LF@n".format(i))
+    lines += [
+        "JUMPIFEQ end LF@n GF@depth",
+        "PUSHS LF@n",
+        "CREATEFRAME",
+        "DEFVAR TF@n",
+        "ADD TF@n LF@n int@1",
+        "CALL rec",
+        "POPS LF@v0",
+        "LABEL end",
+        "POPFRAME",
+        "RETURN",
+    ]
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare peak RSS of interpret.py with older revision on recursive workload.")
+    parser.add_argument("--rev", default="HEAD",
+                        help="git revision used as 'before' (default HEAD)")
+    parser.add_argument("--depth", type=int, default=2000)
+    parser.add_argument("--locals", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = writeProgram(directory, "recursive",
+                              recursiveWorkload(args.depth, args.locals))
+        before = scriptAtRevision(args.rev, directory)
+
+        results = []
+        for name, script in (("before ({})".format(args.rev), before), ("after", interpretScript)):
+            result = runInterpreter(script, source)
+            if result["rc"] != 0:
+                print("{}: interpreter failed with {}".format(
+                    name, result["rc"]), file=sys.stderr)
+                sys.exit(1)
+            results.append((name, result))
+
+    print("recursive workload: depth {}, {} locals per frame".format(
+        args.depth, args.locals))
+    for name, result in results:
+        print("{:<20} peak RSS {:>8} kB   time {:.2f} s".format(
+            name, result["maxrss"], result["wall"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# ----------------------------
+# Description: Output benchmark of interpret.py, program writing many small values
+# Name: output.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import argparse
+import hashlib
+import sys
+import tempfile
+
+from common import interpretScript, runInterpreter, scriptAtRevision, writeProgram
+
+
+"""
+    Loop which writes 'count' small values, ten WRITE instructions per iteration.
+"""
+def writeWorkload(count):
+    lines = [
+        "DEFVAR GF@i",
+        "MOVE GF@i int@{}".format(count // 10),
+        "LABEL loop",
+    ]
+    values = ["int@7", "string@a", "bool@true", "GF@i", "string@\\010",
+              "int@-1", "float@0x1p+0", "nil@nil", "string@xy", "GF@i"]
+    for value in values:
+        lines.append("WRITE " + value)
+    lines += [
+        "SUB GF@i GF@i int@1",
+        "JUMPIFNEQ loop GF@i int@0",
+    ]
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare WRITE throughput of interpret.py with older revision.")
+    parser.add_argument("--rev", default="HEAD",
+                        help="git revision used as 'before' (default HEAD)")
+    parser.add_argument("--count", type=int, default=10000000,
+                        help="count of written values (default 10M)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = writeProgram(directory, "output", writeWorkload(args.count))
+        before = scriptAtRevision(args.rev, directory)
+
+        outputs = set()
+        print("{} written values".format(args.count))
+        for name, script in (("before ({})".format(args.rev), before), ("after", interpretScript)):
+            result = runInterpreter(script, source)
+            if result["rc"] != 0:
+                print("{}: interpreter failed with {}".format(
+                    name, result["rc"]), file=sys.stderr)
+                sys.exit(1)
+            outputs.add(hashlib.sha256(result["stdout"]).hexdigest())
+            print("{:<20} {:.2f} s   {:.2f} M values/s   {} bytes".format(
+                name, result["wall"], args.count / result["wall"] / 1e6, len(result["stdout"])))
+
+        if len(outputs) != 1:
+            print("outputs differ", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# ----------------------------
+# Description: Data stack benchmark of interpret.py, stack-machine-style generated code
+# Name: stack.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import argparse
+import sys
+import tempfile
+
+from common import interpretScript, runInterpreter, scriptAtRevision, writeProgram
+
+
+"""
+    Loop in the style of code generated for stack machine,
+    every value goes through data stack. One iteration executes 20 stack instructions.
+"""
+def stackWorkload(iterations):
+    return [
+        "DEFVAR GF@i",
+        "DEFVAR GF@s",
+        "DEFVAR GF@b",
+        "MOVE GF@s int@0",
+        "PUSHS int@{}".format(iterations),
+        "POPS GF@i",
+        "LABEL loop",
+        "PUSHS GF@s",
+        "PUSHS GF@i",
+        "ADDS",
+        "PUSHS int@3",
+        "MULS",
+        "PUSHS int@1000003",
+        "IDIVS",
+        "POPS GF@s",
+        "PUSHS GF@s",
+        "PUSHS GF@i",
+        "LTS",
+        "NOTS",
+        "POPS GF@b",
+        "PUSHS GF@i",
+        "PUSHS int@1",
+        "SUBS",
+        "POPS GF@i",
+        "PUSHS GF@i",
+        "PUSHS int@0",
+        "JUMPIFNEQS loop",
+        "WRITE GF@s",
+        "WRITE GF@b",
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare stack instructions throughput of interpret.py with older revision.")
+    parser.add_argument("--rev", default="HEAD",
+                        help="git revision used as 'before' (default HEAD)")
+    parser.add_argument("--iterations", type=int, default=500000,
+                        help="count of loop iterations (default 500k)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="count of runs, best time is reported (default 3)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = writeProgram(directory, "stack", stackWorkload(args.iterations))
+        before = scriptAtRevision(args.rev, directory)
+
+        outputs = set()
+        instructions = args.iterations * 20
+        print("{} iterations, {} stack instructions".format(args.iterations, instructions))
+        for name, script in (("before ({})".format(args.rev), before), ("after", interpretScript)):
+            best = None
+            for _ in range(args.repeat):
+                result = runInterpreter(script, source)
+                if result["rc"] != 0:
+                    print("{}: interpreter failed with {}".format(
+                        name, result["rc"]), file=sys.stderr)
+                    sys.exit(1)
+                outputs.add(result["stdout"])
+                if best == None or result["wall"] < best:
+                    best = result["wall"]
+            print("{:<20} {:.2f} s   {:.2f} M instructions/s".format(
+                name, best, instructions / best / 1e6))
+
+        if len(outputs) != 1:
+            print("outputs differ", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
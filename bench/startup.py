@@ -0,0 +1,111 @@
+# ----------------------------
+# Description: Startup benchmark of interpret.py, wall time of empty program and import times
+# Name: startup.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from common import interpretScript, repoDir, scriptAtRevision, writeProgram
+
+sys.path.insert(0, repoDir)
+from build import buildZipapp
+
+
+def bestWall(command, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        wall = time.perf_counter() - start
+        if process.returncode != 0:
+            print("{} failed with {}".format(" ".join(command), process.returncode), file=sys.stderr)
+            sys.exit(1)
+        if best == None or wall < best:
+            best = wall
+    return best
+
+
+"""
+    Returns times of imported modules in microseconds from 'python -X importtime',
+    name: (self, cumulative, nesting level).
+"""
+def importTimes(command):
+    process = subprocess.run([sys.executable, "-X", "importtime"] + command,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    modules = {}
+    for line in process.stderr.decode().splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        selfTime, cumulative, name = line[len("import time:"):].split("|")
+        level = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(selfTime), int(cumulative), level)
+    return modules
+
+
+"""
+    Modules imported by interpreter on top of bare Python start.
+    Returns their summed self time and top level imports sorted by cumulative time.
+"""
+def interpreterImports(command, baseline):
+    modules = importTimes(command)
+    extra = {name: times for name, times in modules.items() if not name in baseline}
+    total = sum(times[0] for times in extra.values())
+    topLevel = sorted(((times[1], name) for name, times in extra.items() if times[2] == 0),
+                      reverse=True)
+    return total, [{"module": name, "cumulative": cumulative} for cumulative, name in topLevel]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure startup of interpret.py on empty program: best wall time and import time.")
+    parser.add_argument("--rev", default="HEAD",
+                        help="git revision used as 'before' (default HEAD)")
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="count of runs, best time is reported (default 20)")
+    parser.add_argument("--top", type=int, default=5,
+                        help="count of slowest imports which are listed (default 5)")
+    parser.add_argument("--output",
+                        help="JSON line with results is appended to this file, so startup can be tracked over time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = writeProgram(directory, "empty", [])
+        before = scriptAtRevision(args.rev, directory)
+        zipapp = buildZipapp(os.path.join(directory, "interpret.pyz"))
+        programArgs = ["--source=" + source, "--input=" + os.devnull]
+        baseline = importTimes(["-c", "pass"])
+
+        runs = [
+            ("python -c pass", ["-c", "pass"]),
+            ("before ({})".format(args.rev), [before] + programArgs),
+            ("after", [interpretScript] + programArgs),
+            ("after zipapp", [zipapp] + programArgs),
+        ]
+        results = []
+        print("{:<20} {:>10} {:>12}".format("", "wall ms", "imports ms"))
+        for name, command in runs:
+            wall = bestWall([sys.executable] + command, args.repeat)
+            imports, slowest = interpreterImports(command, baseline)
+            results.append({"name": name, "wall": wall, "imports": imports / 1e6,
+                            "slowest": slowest[:args.top]})
+            print("{:<20} {:>10.1f} {:>12.1f}   {}".format(
+                name, wall * 1000, imports / 1000,
+                ", ".join("{} {:.1f}".format(x["module"], x["cumulative"] / 1000) for x in slowest[:args.top])))
+
+    if args.output:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repoDir,
+                                  stdout=subprocess.PIPE).stdout.decode().strip()
+        with open(args.output, "a") as f:
+            f.write(json.dumps({"date": time.strftime("%Y-%m-%dT%H:%M:%S"), "revision": revision,
+                                "python": sys.version.split()[0], "results": results}) + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# ----------------------------
+# Description: String building benchmark of interpret.py, CONCAT and SETCHAR in loop
+# Name: strings.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import argparse
+import tempfile
+
+from common import interpretScript, runInterpreter, scriptAtRevision, writeProgram
+
+
+"""
+    String of 'count' characters built by appending one character at a time.
+"""
+def concatWorkload(count):
+    return [
+        "DEFVAR GF@s",
+        "DEFVAR GF@n",
+        "MOVE GF@s string@",
+        "LABEL loop",
+        "CONCAT GF@s GF@s string@a",
+        "STRLEN GF@n GF@s",
+        "JUMPIFNEQ loop GF@n int@{}".format(count),
+        "WRITE GF@n",
+        "WRITE GF@s",
+    ]
+
+
+"""
+    String of at least 'count' characters made by doubling,
+    then first 'count' characters are rewritten one by one.
+"""
+def setcharWorkload(count):
+    return [
+        "DEFVAR GF@s",
+        "DEFVAR GF@n",
+        "DEFVAR GF@i",
+        "DEFVAR GF@c",
+        "MOVE GF@s string@a",
+        "LABEL double",
+        "CONCAT GF@s GF@s GF@s",
+        "STRLEN GF@n GF@s",
+        "LT GF@c GF@n int@{}".format(count),
+        "JUMPIFEQ double GF@c bool@true",
+        "MOVE GF@i int@0",
+        "LABEL loop",
+        "SETCHAR GF@s GF@i string@b",
+        "ADD GF@i GF@i int@1",
+        "JUMPIFNEQ loop GF@i int@{}".format(count),
+        "GETCHAR GF@c GF@s int@{}".format(count - 1),
+        "WRITE GF@c",
+        "WRITE GF@s",
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare string building of interpret.py with older revision.")
+    parser.add_argument("--rev", default="HEAD",
+                        help="git revision used as 'before' (default HEAD)")
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="comma separated lengths of built strings")
+    parser.add_argument("--timeout", type=float, default=300,
+                        help="seconds after which run is killed")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        before = scriptAtRevision(args.rev, directory)
+        print("{:>8} {:>10} {:>22} {:>22}".format(
+            "workload", "chars", "before ({})".format(args.rev), "after"))
+        for name, workload in (("concat", concatWorkload), ("setchar", setcharWorkload)):
+            for size in [int(x) for x in args.sizes.split(",")]:
+                source = writeProgram(directory, name, workload(size))
+                row = []
+                outputs = set()
+                for script in (before, interpretScript):
+                    result = runInterpreter(script, source, timeout=args.timeout)
+                    if result["rc"] == None:
+                        row.append("timeout")
+                    else:
+                        outputs.add(result["stdout"])
+                        row.append("{:.2f} s {:>7} kB".format(
+                            result["wall"], result["maxrss"]))
+                if len(outputs) > 1:
+                    row[1] += " (output differs)"
+                print("{:>8} {:>10} {:>22} {:>22}".format(name, size, *row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,375 @@
+# ----------------------------
+# Description: Benchmark suite of interpret.py with generated workloads, JSON results and comparison of runs
+# Name: suite.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+from common import interpretScript, repoDir, runInterpreter, scriptAtRevision, writeProgram
+from input import readWorkload, writeInput
+from load import largeProgram
+from output import writeWorkload
+from stack import stackWorkload
+from strings import concatWorkload, setcharWorkload
+
+
+"""
+    Tight integer loop, one iteration executes 8 instructions.
+"""
+def arithmeticWorkload(iterations):
+    return [
+        "DEFVAR GF@i",
+        "DEFVAR GF@s",
+        "DEFVAR GF@t",
+        "DEFVAR GF@c",
+        "MOVE GF@i int@{}".format(iterations),
+        "MOVE GF@s int@0",
+        "LABEL loop",
+        "MUL GF@t GF@i int@7",
+        "ADD GF@s GF@s GF@t",
+        "IDIV GF@s GF@s int@3",
+        "SUB GF@i GF@i int@1",
+        "LT GF@c GF@s int@0",
+        "JUMPIFEQ error GF@c bool@true",
+        "GT GF@c GF@i int@0",
+        "JUMPIFEQ loop GF@c bool@true",
+        "WRITE GF@s",
+        "EXIT int@0",
+        "LABEL error",
+        "EXIT int@1",
+    ]
+
+
+"""
+    Recursive fib(n), every call creates, pushes and pops its own frame.
+"""
+def fibWorkload(n):
+    return [
+        "DEFVAR GF@result",
+        "CREATEFRAME",
+        "DEFVAR TF@n",
+        "MOVE TF@n int@{}".format(n),
+        "CALL fib",
+        "POPS GF@result",
+        "WRITE GF@result",
+        "EXIT int@0",
+        "LABEL fib",
+        "PUSHFRAME",
+        "DEFVAR LF@c",
+        "DEFVAR LF@a",
+        "LT LF@c LF@n int@2",
+        "JUMPIFEQ small LF@c bool@true",
+        "CREATEFRAME",
+        "DEFVAR TF@n",
+        "SUB TF@n LF@n int@1",
+        "CALL fib",
+        "CREATEFRAME",
+        "DEFVAR TF@n",
+        "SUB TF@n LF@n int@2",
+        "CALL fib",
+        "POPS LF@a",
+        "POPS LF@c",
+        "ADD LF@a LF@a LF@c",
+        "PUSHS LF@a",
+        "POPFRAME",
+        "RETURN",
+        "LABEL small",
+        "PUSHS LF@n",
+        "POPFRAME",
+        "RETURN",
+    ]
+
+
+"""
+    Float loop approximating pi by Leibniz series.
+"""
+def floatWorkload(iterations):
+    return [
+        "DEFVAR GF@i",
+        "DEFVAR GF@d",
+        "DEFVAR GF@t",
+        "DEFVAR GF@sum",
+        "DEFVAR GF@sign",
+        "MOVE GF@i int@0",
+        "MOVE GF@sum float@0x0p+0",
+        "MOVE GF@sign float@0x1p+0",
+        "LABEL loop",
+        "INT2FLOAT GF@d GF@i",
+        "MUL GF@d GF@d float@0x1p+1",
+        "ADD GF@d GF@d float@0x1p+0",
+        "DIV GF@t GF@sign GF@d",
+        "ADD GF@sum GF@sum GF@t",
+        "MUL GF@sign GF@sign float@-0x1p+0",
+        "ADD GF@i GF@i int@1",
+        "JUMPIFNEQ loop GF@i int@{}".format(iterations),
+        "MUL GF@sum GF@sum float@0x1p+2",
+        "WRITE GF@sum",
+    ]
+
+
+"""
+    Reads every character of string of 'count' characters by GETCHAR and STRI2INT.
+"""
+def getcharWorkload(count):
+    return [
+        "DEFVAR GF@s",
+        "DEFVAR GF@n",
+        "DEFVAR GF@i",
+        "DEFVAR GF@c",
+        "DEFVAR GF@x",
+        "DEFVAR GF@sum",
+        "MOVE GF@s string@abcdefghij",
+        "LABEL double",
+        "CONCAT GF@s GF@s GF@s",
+        "STRLEN GF@n GF@s",
+        "LT GF@c GF@n int@{}".format(count),
+        "JUMPIFEQ double GF@c bool@true",
+        "MOVE GF@i int@0",
+        "MOVE GF@sum int@0",
+        "LABEL loop",
+        "GETCHAR GF@c GF@s GF@i",
+        "STRI2INT GF@x GF@c int@0",
+        "ADD GF@sum GF@sum GF@x",
+        "ADD GF@i GF@i int@1",
+        "JUMPIFNEQ loop GF@i int@{}".format(count),
+        "WRITE GF@sum",
+    ]
+
+
+"""
+    Workloads of suite, name: (generator of program, default size, generator of input or None).
+    Sizes are multiplied by --scale, fib depth is not scaled because its cost grows exponentially.
+"""
+workloads = {
+    "arith": (arithmeticWorkload, 200000, None),
+    "fib": (fibWorkload, 20, None),
+    "stack": (stackWorkload, 100000, None),
+    "concat": (concatWorkload, 200000, None),
+    "setchar": (setcharWorkload, 200000, None),
+    "getchar": (getcharWorkload, 200000, None),
+    "float": (floatWorkload, 200000, None),
+    "read": (lambda size: readWorkload(), 200000, writeInput),
+    "write": (writeWorkload, 1000000, None),
+    "load": (largeProgram, 200000, None),
+}
+
+
+def workloadSize(name, scale):
+    size = workloads[name][1]
+    if name == "fib":
+        return size
+    return max(1, int(size * scale))
+
+
+def fileHash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def revisionOf(revision):
+    result = subprocess.run(["git", "rev-parse", revision], cwd=repoDir,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    return result.stdout.decode().strip() or None
+
+
+def readNumber(path):
+    try:
+        with open(path) as f:
+            return int(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+"""
+    Runs one workload. First run counts executed instructions by --stats --insts and measures
+    load time as wall time minus execution time from --profile, when interpreter supports it.
+    Then program is run 'repeat' times, best wall time and highest peak memory are reported.
+"""
+def runWorkload(name, size, script, directory, repeat, timeout, extraArgs):
+    generator, _, inputGenerator = workloads[name]
+    source = writeProgram(directory, name, generator(size))
+    inputFile = None
+    if inputGenerator:
+        inputFile = os.path.join(directory, name + ".in")
+        inputGenerator(inputFile, size)
+
+    statsFile = os.path.join(directory, name + ".stats")
+    profileFile = os.path.join(directory, name + ".profile")
+    result = runInterpreter(script, source, inputFile,
+                            list(extraArgs) + ["--stats=" + statsFile, "--insts", "--profile=" + profileFile],
+                            timeout=timeout)
+    if result["rc"] == 10:
+        # Older revision without --profile
+        result = runInterpreter(script, source, inputFile,
+                                list(extraArgs) + ["--stats=" + statsFile, "--insts"], timeout=timeout)
+    if result["rc"] != 0:
+        return {"size": size, "error": "timeout" if result["rc"] == None else result["rc"]}
+
+    load = None
+    try:
+        with open(profileFile) as f:
+            load = max(0.0, result["wall"] - json.load(f)["time"])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    output = hashlib.sha256(result["stdout"]).hexdigest()
+    walls = []
+    maxrss = 0
+    for _ in range(repeat):
+        result = runInterpreter(script, source, inputFile, extraArgs, timeout=timeout)
+        if result["rc"] != 0:
+            return {"size": size, "error": "timeout" if result["rc"] == None else result["rc"]}
+        if hashlib.sha256(result["stdout"]).hexdigest() != output:
+            return {"size": size, "error": "output differs between runs"}
+        walls.append(result["wall"])
+        maxrss = max(maxrss, result["maxrss"])
+
+    instructions = readNumber(statsFile)
+    wall = min(walls)
+    return {
+        "size": size,
+        "source": fileHash(source),
+        "output": output,
+        "instructions": instructions,
+        "wall": wall,
+        "walls": walls,
+        "ips": instructions / wall if instructions else None,
+        "load": load,
+        "maxrss": maxrss,
+    }
+
+
+def run(args):
+    names = args.workloads.split(",") if args.workloads else list(workloads)
+    for name in names:
+        if name not in workloads:
+            print("unknown workload '{}', choose from: {}".format(
+                name, ", ".join(workloads)), file=sys.stderr)
+            sys.exit(2)
+
+    with tempfile.TemporaryDirectory() as directory:
+        script = scriptAtRevision(args.rev, directory) if args.rev else interpretScript
+        results = {
+            "revision": revisionOf(args.rev or "HEAD"),
+            "dirty": args.rev == None and subprocess.run(
+                ["git", "diff", "--quiet", "HEAD", "--", "interpret.py"], cwd=repoDir).returncode != 0,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "args": args.args.split(),
+            "scale": args.scale,
+            "repeat": args.repeat,
+            "workloads": {},
+        }
+        print("{:<8} {:>8} {:>12} {:>9} {:>10} {:>8} {:>10}".format(
+            "name", "size", "insts", "wall s", "M inst/s", "load s", "peak kB"))
+        for name in names:
+            size = workloadSize(name, args.scale)
+            result = runWorkload(name, size, script, directory, args.repeat,
+                                 args.timeout, args.args.split())
+            results["workloads"][name] = result
+            if "error" in result:
+                print("{:<8} {:>8} failed: {}".format(name, size, result["error"]))
+                continue
+            print("{:<8} {:>8} {:>12} {:>9.3f} {:>10} {:>8} {:>10}".format(
+                name, size, str(result["instructions"]), result["wall"],
+                "{:.2f}".format(result["ips"] / 1e6) if result["ips"] else "-",
+                "{:.3f}".format(result["load"]) if result["load"] != None else "-",
+                result["maxrss"]))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+    if any("error" in x for x in results["workloads"].values()):
+        sys.exit(1)
+
+
+"""
+    Compares two result files. Workload is regression when its wall time or peak memory
+    grew by more than threshold, or when output of program changed.
+"""
+def compare(args):
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    regressions = 0
+    print("{:<8} {:>10} {:>10} {:>8} {:>10} {:>10} {:>8}".format(
+        "name", "before s", "after s", "time", "before kB", "after kB", "memory"))
+    for name, old in before["workloads"].items():
+        new = after["workloads"].get(name)
+        if new == None:
+            continue
+        if "error" in old or "error" in new:
+            print("{:<8} failed: {} -> {}".format(name, old.get("error", "ok"), new.get("error", "ok")))
+            regressions += "error" in new
+            continue
+        if old["size"] != new["size"] or old["source"] != new["source"]:
+            print("{:<8} different workload, skipped".format(name))
+            continue
+
+        flags = []
+        timeRatio = new["wall"] / old["wall"]
+        memoryRatio = new["maxrss"] / old["maxrss"]
+        if timeRatio > 1 + args.threshold:
+            flags.append("SLOWER")
+        if memoryRatio > 1 + args.threshold:
+            flags.append("MEMORY")
+        if old["output"] != new["output"]:
+            flags.append("OUTPUT")
+        regressions += len(flags) != 0
+        print("{:<8} {:>10.3f} {:>10.3f} {:>7.2f}x {:>10} {:>10} {:>7.2f}x {}".format(
+            name, old["wall"], new["wall"], timeRatio, old["maxrss"], new["maxrss"],
+            memoryRatio, " ".join(flags)))
+
+    if regressions:
+        print("{} regression(s), threshold {:.0%}".format(regressions, args.threshold))
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark suite of interpret.py. Results are printed and written as JSON.")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    runParser = commands.add_parser("run", help="run workloads")
+    runParser.add_argument("--workloads",
+                           help="comma separated names (default all): " + ", ".join(workloads))
+    runParser.add_argument("--rev",
+                           help="git revision of interpret.py to measure (default working tree)")
+    runParser.add_argument("--scale", type=float, default=1.0,
+                           help="multiplier of workload sizes (default 1.0)")
+    runParser.add_argument("--repeat", type=int, default=3,
+                           help="count of timed runs, best time is reported (default 3)")
+    runParser.add_argument("--timeout", type=float, default=300,
+                           help="seconds after which run is killed")
+    runParser.add_argument("--args", default="",
+                           help="extra arguments of interpreter, for example --args=--compile")
+    runParser.add_argument("--output", help="file the JSON results are written to")
+
+    compareParser = commands.add_parser("compare", help="compare two JSON results")
+    compareParser.add_argument("before")
+    compareParser.add_argument("after")
+    compareParser.add_argument("--threshold", type=float, default=0.1,
+                               help="allowed relative growth of time and memory (default 0.1)")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args)
+
+
+if __name__ == '__main__':
+    main()
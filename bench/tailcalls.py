@@ -0,0 +1,82 @@
+# ----------------------------
+# Description: Benchmark of tail recursion of interpret.py, time and peak memory with --tailcalls
+# Name: tailcalls.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import argparse
+import sys
+import tempfile
+
+from common import interpretScript, runInterpreter, scriptAtRevision, writeProgram
+
+
+"""
+    Tail recursive counting to 'count'. Every call pops its frame back to TF, increments
+    argument and calls itself in tail position ( POPFRAME ; CALL ; RETURN ).
+"""
+def countingWorkload(count):
+    return [
+        "DEFVAR GF@limit",
+        "MOVE GF@limit int@{}".format(count),
+        "CREATEFRAME",
+        "DEFVAR TF@n",
+        "MOVE TF@n int@0",
+        "CALL count",
+        "WRITE TF@n",
+        "EXIT int@0",
+        "LABEL count",
+        "PUSHFRAME",
+        "JUMPIFEQ done LF@n GF@limit",
+        "ADD LF@n LF@n int@1",
+        "POPFRAME",
+        "CALL count",
+        "RETURN",
+        "LABEL done",
+        "POPFRAME",
+        "RETURN",
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare time and peak RSS of tail recursive counting, older revision "
+                    "against interpret.py with --tailcalls.")
+    parser.add_argument("--rev", default="HEAD",
+                        help="git revision used as 'before' (default HEAD)")
+    parser.add_argument("--counts", default="100000,1000000,10000000",
+                        help="comma separated counts of recursive calls")
+    parser.add_argument("--args", default="",
+                        help="extra arguments of both interpreters, for example '--compile'")
+    parser.add_argument("--timeout", type=float, default=600,
+                        help="seconds after which run is killed")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        before = scriptAtRevision(args.rev, directory)
+        print("{:>10} {:>22} {:>22}".format(
+            "calls", "before ({})".format(args.rev), "after --tailcalls"))
+        for count in [int(x) for x in args.counts.split(",")]:
+            source = writeProgram(directory, "tailcalls", countingWorkload(count))
+            runs = [(before, args.args.split()), (interpretScript, args.args.split() + ["--tailcalls"])]
+            row = []
+            outputs = set()
+            for script, extraArgs in runs:
+                result = runInterpreter(script, source, extraArgs=extraArgs, timeout=args.timeout)
+                if result["rc"] == None:
+                    row.append("timeout")
+                    continue
+                if result["rc"] != 0:
+                    print("{}: interpreter failed with {}".format(
+                        script, result["rc"]), file=sys.stderr)
+                    sys.exit(1)
+                outputs.add(result["stdout"])
+                row.append("{:.2f} s {:>7} kB".format(result["wall"], result["maxrss"]))
+            if len(outputs) > 1:
+                print("outputs of interpreters differ", file=sys.stderr)
+                sys.exit(1)
+            print("{:>10} {:>22} {:>22}".format(count, *row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# ----------------------------
+# Description: Packs interpret.py to single file zipapp with precompiled bytecode
+# Name: build.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import argparse
+import os
+import py_compile
+import stat
+import sys
+import tempfile
+import zipfile
+
+repoDir = os.path.dirname(os.path.abspath(__file__))
+
+# Entry point of zipapp, interpreter is imported as module so its bytecode is taken from archive
+mainModule = "import interpret\ninterpret.main()\n"
+
+
+"""
+    Writes zipapp with interpret.py source and its bytecode.
+    Script run directly is compiled by Python on every start, module from archive is not.
+    Bytecode is unchecked hash-based .pyc, so it is used without comparing times of files
+    in archive. Python of other version ignores it and compiles source from archive.
+"""
+def buildZipapp(output, script=None, python="/usr/bin/env python3"):
+    if script == None:
+        script = os.path.join(repoDir, "interpret.py")
+
+    with tempfile.TemporaryDirectory() as directory:
+        bytecode = os.path.join(directory, "interpret.pyc")
+        py_compile.compile(script, cfile=bytecode, dfile="interpret.py", doraise=True,
+                           invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+
+        with open(output, "wb") as f:
+            f.write("#!{}\n".format(python).encode())
+            with zipfile.ZipFile(f, "w", zipfile.ZIP_STORED) as archive:
+                archive.writestr("__main__.py", mainModule)
+                archive.write(script, "interpret.py")
+                archive.write(bytecode, "interpret.pyc")
+
+    mode = os.stat(output).st_mode
+    os.chmod(output, mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return output
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pack interpret.py to zipapp, which is run as 'python3 interpret.pyz --source=...'.")
+    parser.add_argument("--output", default=os.path.join(repoDir, "interpret.pyz"),
+                        help="path of zipapp (default interpret.pyz next to interpret.py)")
+    parser.add_argument("--python", default="/usr/bin/env python3",
+                        help="interpreter in shebang line (default '/usr/bin/env python3')")
+    args = parser.parse_args()
+
+    try:
+        buildZipapp(args.output, python=args.python)
+    except (OSError, py_compile.PyCompileError) as error:
+        print(error, file=sys.stderr)
+        sys.exit(1)
+    print(args.output)
+
+
+if __name__ == '__main__':
+    main()
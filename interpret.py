@@ -6,48 +6,193 @@
 # Version: 1.0
 # Python 3.8
 # ----------------------------
-import argparse
+import io
+import operator
+import os
 import sys
-import re
-import xml.etree.ElementTree as ET
+import time
+import types
+from functools import partial
 
-currentInstIndex = 0
-exitBool = False
-exitValue = 0
+# Modules needed only by XML check, cache and some options ( argparse, re, xml.etree, hashlib,
+# tempfile, json ) are imported in functions which use them, so start of interpreter
+# does not pay for them.
 
-frames = {"GF": {}}
-framesStack = []
-callStack = []
-dataStack = []
-labels = {}
-
-instCount = 0
-inicializedMaxCount = 0
-dataStackCount = 0
-dataStackMaxCount = 0
+"""
+    STATE OF RUN
+    Everything one run of program changes ( frames, stacks, labels, counters, output buffer )
+    is kept in its Machine. Functions which work with it get it as first argument 'vm', handlers
+    of instructions have it bound together with their arguments at load phase.
+    Tables of this module ( instructions, validators, fusions, ... ) are built once and only read,
+    so every run has its own Machine and nothing else.
+"""
+class Machine:
+    def __init__(self, options=None, outputStream=None, errorStream=None):
+        self.options = types.SimpleNamespace(**optionDefaults) if options == None else options
+        self.currentInstIndex = 0
+        self.exitBool = False
+        self.exitValue = 0
+
+        self.framesStack = []
+        self.callStack = []
+        self.labels = {}
+
+        # Tail calls ( --tailcalls ), path of skipped instructions of every tail CALL
+        # and counts of tail CALLs waiting for RETURN by depth of callStack
+        self.tailPaths = {}
+        self.tailReturns = {}
+
+        # Memoization ( --memo ), memoized CALLs, cache of results and calls waiting for RETURN
+        self.memoSites = {}
+        self.memoCache = {}
+        self.memoPending = []
+        self.memoSize = 1024
+        self.memoHits = 0
+
+        self.instCounters = []
+        self.inicializedCount = 0
+        self.inicializedMaxCount = 0
+        self.dataStackCount = 0
+        self.dataStackMaxCount = 0
+
+        # Data stack keeps values and types in parallel lists, top of the stack is kept apart
+        # in dataStackTopValue and dataStackTopType, type None means stack is empty.
+        self.dataStackValues = []
+        self.dataStackTypes = []
+        self.dataStackTopValue = None
+        self.dataStackTopType = None
+
+        self.cacheDirectory = self.options.cache
+        self.sourceFile = None
+        self.inputFile = None
+        self.outputStream = sys.stdout if outputStream == None else outputStream
+        self.errorStream = sys.stderr if errorStream == None else errorStream
+
+        self.outputBuffer = []
+        self.outputSize = 0
+
+        # Frame pool, see newFrame
+        self.freeFrames = []
+        self.freeCells = []
+
+        # --vars runs tracking versions of functions and handlers, see STATI --vars
+        self.handlers = {opcode: instructions[opcode]["func"] for opcode in instructions}
+        if self.options.vars:
+            self.frameType = Frame
+            self.setVar = partial(setVarTracked, self)
+            self.setVarValue = partial(setVarValueTracked, self)
+            self.handlers.update(trackedHandlers)
+        else:
+            self.frameType = dict
+            self.setVar = partial(setVar, self)
+            self.setVarValue = partial(setVarValue, self)
+        self.frames = {"GF": self.frameType()}
 
-statistic = False
 
-sourceFile = sys.stdin
-inputFile = sys.stdin
+outputBufferLimit = 1 << 16
 
 
 """
     ARGUMENT PARSING
+    Options of run are in vm.options. Without command line ( Interpreter API ) defaults are used,
+    parser is built only by main.
+"""
+optionDefaults = {"help": False, "source": None, "input": None, "stats": None, "insts": False,
+                  "hot": False, "vars": False, "cache": None, "fuse": False, "optimize": False,
+                  "specialize": False, "compile": False, "profile": None, "report": None,
+                  "batch": None, "results": None, "sourceFormat": "xml", "tailcalls": False,
+                  "memo": None, "memohits": False}
+
+
+def buildParser():
+    import argparse
+    parser = argparse.ArgumentParser(add_help=False, prefix_chars="--")
+    parser.add_argument('--help', action='store_true')
+    parser.add_argument('--source', dest='source')
+    parser.add_argument('--input', dest='input')
+    parser.add_argument('--stats', dest='stats')
+    parser.add_argument('--insts', action='store_true')
+    parser.add_argument('--hot', action='store_true')
+    parser.add_argument('--vars', action='store_true')
+    parser.add_argument('--cache', dest='cache')
+    parser.add_argument('--fuse', action='store_true')
+    parser.add_argument('--optimize', action='store_true')
+    parser.add_argument('--specialize', action='store_true')
+    parser.add_argument('--compile', action='store_true')
+    parser.add_argument('--tailcalls', action='store_true')
+    parser.add_argument('--memo', dest='memo', nargs='?', type=int, const=1024)
+    parser.add_argument('--memohits', action='store_true')
+    parser.add_argument('--profile', dest='profile')
+    parser.add_argument('--report', dest='report')
+    parser.add_argument('--batch', dest='batch')
+    parser.add_argument('--results', dest='results')
+    parser.add_argument('--source-format', dest='sourceFormat', choices=["xml", "text"], default="xml")
+    return parser
+
+
+
+
+"""
+    TYPE TAGS
+    Types of values are stored as small integers instead of strings.
+"""
+T_NIL = 0
+T_INT = 1
+T_BOOL = 2
+T_FLOAT = 3
+T_STRING = 4
+
+typeNames = ("nil", "int", "bool", "float", "string")
+typeTags = {"nil": T_NIL, "int": T_INT, "bool": T_BOOL,
+            "float": T_FLOAT, "string": T_STRING}
+
+
+"""
+    Cell holding value and type tag of variable.
+    Uninicialized variable has value and type set to None.
+"""
+class Cell:
+    __slots__ = ("value", "type")
+
+    def __init__(self, value, varType):
+        self.value = value
+        self.type = varType
+
+    def __repr__(self):
+        varType = None if self.type == None else typeNames[self.type]
+        return repr({"value": self.value, "type": varType})
+
+
 """
-parser = argparse.ArgumentParser(add_help=False, prefix_chars="--")
-parser.add_argument('--help', action='store_true')
-parser.add_argument('--source', dest='source')
-parser.add_argument('--input', dest='input')
-parser.add_argument('--stats', dest='stats')
-parser.add_argument('--insts', action='store_true')
-parser.add_argument('--hot', action='store_true')
-parser.add_argument('--vars', action='store_true')
+    Cell of string variable changed by SETCHAR or appended by CONCAT.
+    String is kept as list of characters, so every change costs O(1) instead of copying whole string.
+    Value is joined back to str only when it is read and cached until next change.
+    Assigning new value keeps it as it is, list of characters is made again on next change.
+"""
+class StringCell(Cell):
+    __slots__ = ("chars", "string")
+
+    def __init__(self, string):
+        self.chars = list(string)
+        self.string = string
+        self.type = T_STRING
+
+    @property
+    def value(self):
+        if self.string == None:
+            self.string = "".join(self.chars)
+        return self.string
+
+    @value.setter
+    def value(self, value):
+        self.chars = None
+        self.string = value
 
-try:
-    args = parser.parse_args()
-except:
-    sys.exit(10)
+    def characters(self):
+        if self.chars == None:
+            self.chars = list(self.string)
+        self.string = None
+        return self.chars
 
 
 
@@ -56,535 +201,693 @@ except:
     HELP FUNCTIONS FOR INTERPRETING
 """
 def getFrameAndName(var):
-    return var["value"][0:2], var["value"][3:]
+    return var["frame"], var["name"]
 
 
-def frameExists(frame):
-    if not frame in frames:
+def frameExists(vm, frame):
+    if not frame in vm.frames:
         print("{}: Frame doesn't exists".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(55)
 
 
-def varExistsInFrame(frame, name):
-    frameExists(frame)
-    if not name in frames[frame]:
+def varExistsInFrame(vm, frame, name):
+    frameExists(vm, frame)
+    if not name in vm.frames[frame]:
         print("{}: Undefiend variable".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(54)
 
 
-def getVarValue(var):
-    frame, name = getFrameAndName(var)
-    varExistsInFrame(frame, name)
+"""
+    Returns cell of variable with value and type.
+    Variable has frame and name already resolved at load phase ( resolveArguments ),
+    so accessing variable costs only one lookup. Checks for errors are done only on failure.
+"""
+def getVariable(vm, var):
+    try:
+        return vm.frames[var["frame"]][var["name"]]
+    except KeyError:
+        varExistsInFrame(vm, var["frame"], var["name"])
+
 
-    value = frames[frame][name]["value"]
-    return value
+def getVarValue(vm, var):
+    return getVariable(vm, var).value
 
 
-def getVarType(var):
-    frame, name = getFrameAndName(var)
-    varExistsInFrame(frame, name)
-    varType = frames[frame][name]["type"]
-    return varType
+def getVarType(vm, var):
+    return getVariable(vm, var).type
 
 
-def setVarValue(var, value):
-    frame, name = getFrameAndName(var)
-    varExistsInFrame(frame, name)
-    frames[frame][name]["value"] = value
+def setVarValue(vm, var, value):
+    getVariable(vm, var).value = value
 
 
-def setVarType(var, varType):
-    frame, name = getFrameAndName(var)
-    varExistsInFrame(frame, name)
-    frames[frame][name]["type"] = varType
+def setVarType(vm, var, varType):
+    getVariable(vm, var).type = varType
 
 
-def getVal(arg):
+def setVar(vm, var, value, varType):
+    variable = getVariable(vm, var)
+    variable.value = value
+    variable.type = varType
+
+
+def getVal(vm, arg):
     if arg["type"] == "var":
-        value = getVarValue(arg)
+        value = getVarValue(vm, arg)
         if value == None:
             print("{}: Trying to get value from uninicialzated variable".format(
-                currentInstIndex), file=sys.stderr)
+                vm.currentInstIndex), file=vm.errorStream)
             sys.exit(56)
         return value
     else:
         return arg["value"]
 
 
-def getType(arg):
+def getType(vm, arg):
     if arg["type"] == "var":
-        varType = getVarType(arg)
+        varType = getVarType(vm, arg)
         if varType == None:
             print("{}: Trying to get value from uninicialzated variable".format(
-                currentInstIndex), file=sys.stderr)
+                vm.currentInstIndex), file=vm.errorStream)
+            sys.exit(56)
+        return varType
+    else:
+        return arg["tag"]
+
+
+"""
+    Returns value and type of symbol, variable is looked up only once.
+"""
+def getValAndType(vm, arg):
+    if arg["type"] == "var":
+        variable = getVariable(vm, arg)
+        if variable.type == None:
+            print("{}: Trying to get value from uninicialzated variable".format(
+                vm.currentInstIndex), file=vm.errorStream)
             sys.exit(56)
-        return getVarType(arg)
+        return variable.value, variable.type
     else:
-        return arg["type"]
+        return arg["value"], arg["tag"]
+
+
+"""
+    Returns string cell of variable, which can be changed in place. Variable has to be inicialized string.
+"""
+def getStringCell(vm, var):
+    variable = getVariable(vm, var)
+    if variable.__class__ is not StringCell:
+        variable = StringCell(variable.value)
+        vm.frames[var["frame"]][var["name"]] = variable
+    return variable
+
+
+"""
+    Returns string of symbol, or list of its characters when variable was changed in place,
+    so reading length or one character doesn't join it back to str.
+"""
+def getCharacters(vm, arg):
+    if arg["type"] == "var":
+        variable = getVariable(vm, arg)
+        if variable.__class__ is StringCell and variable.string == None:
+            return variable.chars
+    return getVal(vm, arg)
 
 
-def getLabel(var):
-    if not var["value"] in labels:
-        print("{}: Undefiend label".format(currentInstIndex), file=sys.stderr)
+def getLabel(vm, var):
+    target = var["target"]
+    if target == None:
+        print("{}: Undefiend label".format(vm.currentInstIndex), file=vm.errorStream)
         sys.exit(52)
 
-    return labels[var["value"]] - 1
+    return target
+
+
+"""
+    OUTPUT BUFFER
+    Output of WRITE is collected in buffer and written to output stream at once when buffer is full,
+    when interpreting ends ( also by EXIT ) and before exit with error code.
+"""
+def flushOutput(vm):
+    if len(vm.outputBuffer) == 0:
+        return
+    try:
+        vm.outputStream.write("".join(vm.outputBuffer))
+    except UnicodeEncodeError:
+        # Write pieces one by one, so output ends at the same place as without buffer
+        for text in vm.outputBuffer:
+            vm.outputStream.write(text)
+    finally:
+        vm.outputBuffer.clear()
+        vm.outputSize = 0
+
+
+"""
+    String which cannot be encoded to output stream has to fail at its own WRITE,
+    so everything written before is flushed and string is written directly.
+"""
+def checkOutputEncoding(vm, text):
+    if getattr(vm.outputStream, "encoding", None) == None:
+        return
+    try:
+        text.encode(vm.outputStream.encoding, vm.outputStream.errors)
+    except UnicodeEncodeError:
+        flushOutput(vm)
+        print(text, end="", file=vm.outputStream)
+
+
+"""
+    INPUT FOR READ
+    Input is read in large blocks and every block is decoded and split to lines at once,
+    first time READ asks for line from it. Encoding is taken from given text file.
+    Line endings are same as text file has: universal ( \n, \r\n and \r ) for opened file,
+    only \n for stdin.
+    Block is read by one system call at most, so input from pipe is not waiting for full block.
+"""
+class InputReader:
+    blockSize = 1 << 20
+
+    def __init__(self, textFile, universalNewlines):
+        self.file = textFile
+        self.stream = textFile.buffer
+        self.encoding = textFile.encoding
+        self.errors = textFile.errors
+        self.universalNewlines = universalNewlines
+        self.lines = iter(())
+        self.rest = b""
+        self.eof = False
+
+    """
+        Returns next line without line ending or None at the end of input.
+    """
+    def readLine(self):
+        line = next(self.lines, None)
+        if line == None:
+            if not self.fill():
+                return None
+            line = next(self.lines)
+        return line
+
+    def fill(self):
+        while True:
+            if self.eof:
+                return False
+
+            block = self.stream.read1(self.blockSize)
+            if len(block) == 0:
+                self.eof = True
+                # Last line without line ending, \r at the end of input is line ending
+                if len(self.rest) == 0:
+                    return False
+                if self.universalNewlines and self.rest.endswith(b"\r"):
+                    self.rest = self.rest[:-1]
+                self.lines = iter([self.rest.decode(self.encoding, self.errors)])
+                self.rest = b""
+                return True
+
+            data = self.rest + block
+            tail = b""
+            if self.universalNewlines:
+                # \r at the end of block can be first part of \r\n
+                if data.endswith(b"\r"):
+                    data = data[:-1]
+                    tail = b"\r"
+                data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+            # Only complete lines are decoded, rest waits for next block
+            end = data.rfind(b"\n")
+            self.rest = data[end + 1:] + tail
+            if end != -1:
+                lines = data[:end].decode(self.encoding, self.errors).split("\n")
+                self.lines = iter(lines)
+                return True
+
+
+"""
+    FRAME POOL
+    Frames and cells of variables are recycled instead of being left to garbage collector.
+    Temporary frame replaced by CREATEFRAME or POPFRAME is not reachable anymore, so it is cleared
+    and kept in vm.freeFrames, its cells in vm.freeCells, and CREATEFRAME and DEFVAR take them from there.
+    Cells are never kept between instructions ( every access goes through frames ), so reuse
+    can't be seen by program. Popped LF is moved to TF as it is, it is released only when
+    it is replaced.
+    Pool has no fixed size, it holds only what was released, so it grows to the most frames
+    and cells which program had at once and never above it.
+"""
+
+def newFrame(vm):
+    if vm.freeFrames:
+        return vm.freeFrames.pop()
+    return vm.frameType()
+
+
+def newCell(vm):
+    if vm.freeCells:
+        return vm.freeCells.pop()
+    return Cell(None, None)
+
+
+def releaseFrame(vm, frame):
+    for cell in frame.values():
+        # StringCell keeps its characters, it is not reused
+        if type(cell) is Cell:
+            cell.value = None
+            cell.type = None
+            vm.freeCells.append(cell)
+    frame.clear()
+    vm.freeFrames.append(frame)
+
+
 
 
 """
     FUNCTIONS FOR DEFAULT INSTRUCTIONS
 """
-def move(args):
-    setVarValue(args[0], getVal(args[1]))
-    setVarType(args[0], getType(args[1]))
+def move(vm, args):
+    vm.setVar(args[0], getVal(vm, args[1]), getType(vm, args[1]))
 
 
-def defvar(args):
+def defvar(vm, args):
     frame, name = getFrameAndName(args[0])
-    frameExists(frame)
-    if name in frames[frame]:
+    frameExists(vm, frame)
+    if name in vm.frames[frame]:
         print("{}: Redefinition of variable".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(52)
 
-    frames[frame][name] = {"value": None, "type": None}
+    vm.frames[frame][name] = newCell(vm)
 
 
-def write(args):
-    valType = getType(args[0])
-    if(valType == "nil"):
-        print("", end="")
-    elif(valType == "float"):
-        print(float.hex(getVal(args[0])), end="")
-    elif(valType == "bool"):
-        print(str(getVal(args[0])).lower(), end="")
+def write(vm, args):
+    valType = getType(vm, args[0])
+    if(valType == T_NIL):
+        return
+    elif(valType == T_FLOAT):
+        text = float.hex(getVal(vm, args[0]))
+    elif(valType == T_BOOL):
+        text = str(getVal(vm, args[0])).lower()
+    elif(valType == T_STRING):
+        text = getVal(vm, args[0])
+        if not text.isascii():
+            checkOutputEncoding(vm, text)
     else:
-        print(getVal(args[0]), end="")
+        text = str(getVal(vm, args[0]))
+
+    vm.outputBuffer.append(text)
+    vm.outputSize += len(text)
+    if vm.outputSize >= outputBufferLimit:
+        flushOutput(vm)
 
 
-def concat(args):
-    if (getType(args[1]) != "string" or getType(args[2]) != "string"):
+def concat(vm, args):
+    if (getType(vm, args[1]) != T_STRING or getType(vm, args[2]) != T_STRING):
         print("{}: CONCAT variable types missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
-    setVarType(args[0], "string")
-    setVarValue(args[0], getVal(args[1])+getVal(args[2]))
+    # Appending to the same variable extends it in place
+    if args[1]["type"] == "var" and args[1]["value"] == args[0]["value"]:
+        string = getVal(vm, args[2])
+        getStringCell(vm, args[0]).characters().extend(string)
+        return
+    vm.setVar(args[0], getVal(vm, args[1])+getVal(vm, args[2]), T_STRING)
 
 
-def jumpifeq(args):
-    global currentInstIndex
-    if((getType(args[1]) == "nil") ^ (getType(args[2]) == "nil")):
+def jumpifeq(vm, args):
+    if((getType(vm, args[1]) == T_NIL) ^ (getType(vm, args[2]) == T_NIL)):
         return
 
-    if(getType(args[1]) != getType(args[2])):
+    if(getType(vm, args[1]) != getType(vm, args[2])):
         print("{}: JUMPIFEQ not same types of variables".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    label = getLabel(args[0])
-    if(getVal(args[1]) == getVal(args[2])):
-        currentInstIndex = label
+    label = getLabel(vm, args[0])
+    if(getVal(vm, args[1]) == getVal(vm, args[2])):
+        vm.currentInstIndex = label
 
 
-def jumpifneq(args):
-    global currentInstIndex
-    if((getType(args[1]) == "nil") ^ (getType(args[2]) == "nil")):
-        currentInstIndex = getLabel(args[0])
+def jumpifneq(vm, args):
+    if((getType(vm, args[1]) == T_NIL) ^ (getType(vm, args[2]) == T_NIL)):
+        vm.currentInstIndex = getLabel(vm, args[0])
         return
-    if(getType(args[1]) != getType(args[2])):
+    if(getType(vm, args[1]) != getType(vm, args[2])):
         print("{}: JUMPIFNEQ not same types of variables 1:{} 2:{}".format(
-            currentInstIndex, getVal(args[1]), getType(args[2])), file=sys.stderr)
+            vm.currentInstIndex, getVal(vm, args[1]), getType(vm, args[2])), file=vm.errorStream)
         sys.exit(53)
 
-    label = getLabel(args[0])
-    if(getVal(args[1]) != getVal(args[2])):
-        currentInstIndex = label
+    label = getLabel(vm, args[0])
+    if(getVal(vm, args[1]) != getVal(vm, args[2])):
+        vm.currentInstIndex = label
 
 
-def jump(args):
-    global currentInstIndex
-    currentInstIndex = getLabel(args[0])
+def jump(vm, args):
+    vm.currentInstIndex = getLabel(vm, args[0])
 
 
-def createframe(args):
-    frames["TF"] = {}
+def createframe(vm, args):
+    if "TF" in vm.frames:
+        releaseFrame(vm, vm.frames["TF"])
+    vm.frames["TF"] = newFrame(vm)
 
 
-def pushframe(args):
-    frameExists("TF")
-    maxInicializedInFrame()
-    framesStack.append(frames["TF"])
-    frames.pop("TF")
-    frames["LF"] = framesStack[len(framesStack)-1]
+def pushframe(vm, args):
+    frameExists(vm, "TF")
+    vm.framesStack.append(vm.frames["TF"])
+    vm.frames.pop("TF")
+    vm.frames["LF"] = vm.framesStack[len(vm.framesStack)-1]
 
 
-def popframe(args):
-    frameExists("LF")
-    maxInicializedInFrame()
-    frames["TF"] = frames["LF"]
-    framesStack.pop()
-    if len(framesStack) > 0:
-        frames["LF"] = framesStack[len(framesStack)-1]
+def popframe(vm, args):
+    frameExists(vm, "LF")
+    if "TF" in vm.frames:
+        releaseFrame(vm, vm.frames["TF"])
+    vm.frames["TF"] = vm.frames["LF"]
+    vm.framesStack.pop()
+    if len(vm.framesStack) > 0:
+        vm.frames["LF"] = vm.framesStack[len(vm.framesStack)-1]
     else:
-        frames.pop("LF")
+        vm.frames.pop("LF")
 
 
-def call(args):
-    global currentInstIndex, callStack
-    callStack.append(currentInstIndex)
-    currentInstIndex = getLabel(args[0])
+def call(vm, args):
+    vm.callStack.append(vm.currentInstIndex)
+    vm.currentInstIndex = getLabel(vm, args[0])
 
 
-def ret(args):
-    global currentInstIndex, callStack
-    if len(callStack) == 0:
+def ret(vm, args):
+    if len(vm.callStack) == 0:
         print("{}: RETURN missing value at call stack".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(56)
-    currentInstIndex = callStack.pop()
+    vm.currentInstIndex = vm.callStack.pop()
 
 
-def add(args):
-    if (not(getType(args[1]) == "int" and getType(args[2]) == "int") and not(getType(args[1]) == "float" and getType(args[2]) == "float")):
+def add(vm, args):
+    if (not(getType(vm, args[1]) == T_INT and getType(vm, args[2]) == T_INT) and not(getType(vm, args[1]) == T_FLOAT and getType(vm, args[2]) == T_FLOAT)):
         print("{}: ADD variable types missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setVarType(args[0], getType(args[1]))
-    setVarValue(args[0], getVal(args[1]) + getVal(args[2]))
+    vm.setVar(args[0], getVal(vm, args[1]) + getVal(vm, args[2]), getType(vm, args[1]))
 
 
-def sub(args):
-    if (not(getType(args[1]) == "int" and getType(args[2]) == "int") and not(getType(args[1]) == "float" and getType(args[2]) == "float")):
+def sub(vm, args):
+    if (not(getType(vm, args[1]) == T_INT and getType(vm, args[2]) == T_INT) and not(getType(vm, args[1]) == T_FLOAT and getType(vm, args[2]) == T_FLOAT)):
         print("{}: SUB variable types missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setVarType(args[0], getType(args[1]))
-    setVarValue(args[0], getVal(args[1]) - getVal(args[2]))
+    vm.setVar(args[0], getVal(vm, args[1]) - getVal(vm, args[2]), getType(vm, args[1]))
 
 
-def mul(args):
-    if (not(getType(args[1]) == "int" and getType(args[2]) == "int") and not(getType(args[1]) == "float" and getType(args[2]) == "float")):
+def mul(vm, args):
+    if (not(getType(vm, args[1]) == T_INT and getType(vm, args[2]) == T_INT) and not(getType(vm, args[1]) == T_FLOAT and getType(vm, args[2]) == T_FLOAT)):
         print("{}: MUL variable types missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setVarType(args[0], getType(args[1]))
-    setVarValue(args[0], getVal(args[1]) * getVal(args[2]))
+    vm.setVar(args[0], getVal(vm, args[1]) * getVal(vm, args[2]), getType(vm, args[1]))
 
 
-def idiv(args):
-    if getVal(args[2]) == 0:
+def idiv(vm, args):
+    if getVal(vm, args[2]) == 0:
         sys.exit(57)
 
-    if (not(getType(args[1]) == "int" and getType(args[2]) == "int") and not(getType(args[1]) == "float" and getType(args[2]) == "float")):
+    if (not(getType(vm, args[1]) == T_INT and getType(vm, args[2]) == T_INT) and not(getType(vm, args[1]) == T_FLOAT and getType(vm, args[2]) == T_FLOAT)):
         print("{}: IDIV variable types missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setVarType(args[0], getType(args[1]))
-    setVarValue(args[0], getVal(args[1]) // getVal(args[2]))
+    vm.setVar(args[0], getVal(vm, args[1]) // getVal(vm, args[2]), getType(vm, args[1]))
 
 
-def div(args):
-    if getVal(args[2]) == 0:
+def div(vm, args):
+    if getVal(vm, args[2]) == 0:
         sys.exit(57)
 
-    if (getType(args[1]) != "float" or getType(args[2]) != "float"):
-        breakInterpret("")
+    if (getType(vm, args[1]) != T_FLOAT or getType(vm, args[2]) != T_FLOAT):
+        breakInterpret(vm, "")
         print("{}: DIV variable types missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setVarType(args[0], "float")
-    setVarValue(args[0], getVal(args[1]) / getVal(args[2]))
+    vm.setVar(args[0], getVal(vm, args[1]) / getVal(vm, args[2]), T_FLOAT)
 
 
-def lt(args):
-    if(getType(args[1]) == "nil" or getType(args[2]) == "nil" or getType(args[1]) != getType(args[2])):
+def lt(vm, args):
+    if(getType(vm, args[1]) == T_NIL or getType(vm, args[2]) == T_NIL or getType(vm, args[1]) != getType(vm, args[2])):
         print("{}: LT not same types of variables".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setVarType(args[0], "bool")
-    if getVal(args[1]) < getVal(args[2]):
-        setVarValue(args[0], True)
-    else:
-        setVarValue(args[0], False)
+    vm.setVar(args[0], getVal(vm, args[1]) < getVal(vm, args[2]), T_BOOL)
 
 
-def gt(args):
-    if(getType(args[1]) == "nil" or getType(args[2]) == "nil" or getType(args[1]) != getType(args[2])):
+def gt(vm, args):
+    if(getType(vm, args[1]) == T_NIL or getType(vm, args[2]) == T_NIL or getType(vm, args[1]) != getType(vm, args[2])):
         print("{}: GT not same types of variables".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setVarType(args[0], "bool")
-    if getVal(args[1]) > getVal(args[2]):
-        setVarValue(args[0], True)
-    else:
-        setVarValue(args[0], False)
+    vm.setVar(args[0], getVal(vm, args[1]) > getVal(vm, args[2]), T_BOOL)
 
 
-def eq(args):
-    if((getType(args[1]) == "nil") ^ (getType(args[2]) == "nil")):
-        setVarType(args[0], "bool")
-        setVarValue(args[0], False)
+def eq(vm, args):
+    if((getType(vm, args[1]) == T_NIL) ^ (getType(vm, args[2]) == T_NIL)):
+        vm.setVar(args[0], False, T_BOOL)
         return
 
-    if(getType(args[1]) != getType(args[2])):
+    if(getType(vm, args[1]) != getType(vm, args[2])):
         print("{}: EQ not same types of variables".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setVarType(args[0], "bool")
-    if getVal(args[1]) == getVal(args[2]):
-        setVarValue(args[0], True)
-    else:
-        setVarValue(args[0], False)
+    vm.setVar(args[0], getVal(vm, args[1]) == getVal(vm, args[2]), T_BOOL)
 
 
-def logAnd(args):
-    if (getType(args[1]) != "bool" or getType(args[2]) != "bool"):
+def logAnd(vm, args):
+    if (getType(vm, args[1]) != T_BOOL or getType(vm, args[2]) != T_BOOL):
         print("{}: AND not bool variables".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setVarType(args[0], "bool")
-    setVarValue(args[0], getVal(args[1]) and getVal(args[2]))
+    vm.setVar(args[0], getVal(vm, args[1]) and getVal(vm, args[2]), T_BOOL)
 
 
-def logOr(args):
-    if (getType(args[1]) != "bool" or getType(args[2]) != "bool"):
+def logOr(vm, args):
+    if (getType(vm, args[1]) != T_BOOL or getType(vm, args[2]) != T_BOOL):
         print("{}: OR not bool variables".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setVarType(args[0], "bool")
-    setVarValue(args[0], getVal(args[1]) or getVal(args[2]))
+    vm.setVar(args[0], getVal(vm, args[1]) or getVal(vm, args[2]), T_BOOL)
 
 
-def logNot(args):
-    if (getType(args[1]) != "bool"):
+def logNot(vm, args):
+    if (getType(vm, args[1]) != T_BOOL):
         print("{}: NOT not bool variable".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setVarType(args[0], "bool")
-    setVarValue(args[0], not getVal(args[1]))
+    vm.setVar(args[0], not getVal(vm, args[1]), T_BOOL)
 
 
-def int2char(args):
-    if getType(args[1]) != "int":
+def int2char(vm, args):
+    if getType(vm, args[1]) != T_INT:
         print("{}: INT2CHAR variable type missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
-    val = getVal(args[1])
+    val = getVal(vm, args[1])
     try:
         val = chr(val)
-    except:
+    except (ValueError, OverflowError):
         print("{}: INT2CHAR chr function failed".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(58)
 
-    setVarValue(args[0], val)
-    setVarType(args[0], "string")
+    vm.setVar(args[0], val, T_STRING)
 
 
-def str2int(args):
-    if getType(args[1]) != "string" or getType(args[2]) != "int":
+def str2int(vm, args):
+    if getType(vm, args[1]) != T_STRING or getType(vm, args[2]) != T_INT:
         print("{}: STR2INT variable types missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
-    string = getVal(args[1])
-    index = getVal(args[2])
+    string = getCharacters(vm, args[1])
+    index = getVal(vm, args[2])
     if index < 0:
         print("{}: STR2INT index is < 0".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(58)
     try:
         val = ord(string[index])
-    except:
+    except IndexError:
         print("{}: STR2INT ord function failed , or index is out of boundries".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(58)
 
-    setVarValue(args[0], val)
-    setVarType(args[0], "int")
+    vm.setVar(args[0], val, T_INT)
 
 
-def read(args):
-    val = inputFile.readline()
-    varType = getVal(args[1])
-    setType = "nil"
+def read(vm, args):
+    val = vm.inputFile.readLine()
+    varType = args[1]["tag"]
+    setType = T_NIL
     setValue = "nil"
 
-    if len(val) == 0:
-        setVarType(args[0], setType)
-        setVarValue(args[0], setValue)
+    if val == None:
+        vm.setVar(args[0], setValue, setType)
         return
 
-    val = val.rstrip("\n")
-
-    if varType == "bool":
-        setType = "bool"
+    if varType == T_BOOL:
+        setType = T_BOOL
         if val.lower() == "true":
             setValue = True
         else:
             setValue = False
-    elif varType == "int":
-        setType = "int"
+    elif varType == T_INT:
+        setType = T_INT
         try:
             setValue = int(val)
-        except:
-            setType = "nil"
+        except ValueError:
+            setType = T_NIL
             setValue = "nil"
-    elif varType == "string":
-        setType = "string"
+    elif varType == T_STRING:
+        setType = T_STRING
         setValue = val
-    elif varType == "float":
-        setType = "float"
+    elif varType == T_FLOAT:
+        setType = T_FLOAT
         try:
             setValue = float.fromhex(val)
-        except:
-            setType = "nil"
+        except (ValueError, OverflowError):
+            setType = T_NIL
             setValue = "nil"
 
-    setVarType(args[0], setType)
-    setVarValue(args[0], setValue)
+    vm.setVar(args[0], setValue, setType)
 
 
-def strlen(args):
-    if (getType(args[1]) != "string"):
+def strlen(vm, args):
+    if (getType(vm, args[1]) != T_STRING):
         print("{}: STRLEN variable type missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
-    setVarValue(args[0], len(getVal(args[1])))
-    setVarType(args[0], "int")
+    vm.setVar(args[0], len(getCharacters(vm, args[1])), T_INT)
 
 
-def getchar(args):
-    if getType(args[1]) != "string" or getType(args[2]) != "int":
+def getchar(vm, args):
+    if getType(vm, args[1]) != T_STRING or getType(vm, args[2]) != T_INT:
         print("{}: GETCHAR variable types missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
-    string = getVal(args[1])
-    index = getVal(args[2])
+    string = getCharacters(vm, args[1])
+    index = getVal(vm, args[2])
     if index < 0:
         sys.exit(58)
         print("{}: GETCHAR index is < 0".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
     try:
         value = string[index]
-    except:
+    except IndexError:
         print("{}: GETCHAR index is out of boundries".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(58)
 
-    setVarValue(args[0], value)
-    setVarType(args[0], "string")
+    vm.setVar(args[0], value, T_STRING)
 
 
-def setchar(args):
-    if getType(args[0]) != "string" or getType(args[1]) != "int" or getType(args[2]) != "string":
+def setchar(vm, args):
+    if getType(vm, args[0]) != T_STRING or getType(vm, args[1]) != T_INT or getType(vm, args[2]) != T_STRING:
         print("{}: SETCHAR variable types missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
-    index = getVal(args[1])
+    index = getVal(vm, args[1])
     if index < 0:
         sys.exit(58)
         print("{}: SETCHAR index is < 0".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
     try:
-        val = getVal(args[0])
-        val = list(val)
-        val[index] = getVal(args[2])[0]
-        val = ''.join(val)
-        setVarValue(args[0], val)
-    except:
+        char = getVal(vm, args[2])[0]
+        getStringCell(vm, args[0]).characters()[index] = char
+    except IndexError:
         print("{}: SETCHAR index is out of boundries".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(58)
 
 
-def typeFunc(args):
+def typeFunc(vm, args):
     if args[1]["type"] == "var":
-        varType = getVarType(args[1])
+        varType = getVarType(vm, args[1])
         if varType == None:
             varType = ""
+        else:
+            varType = typeNames[varType]
     else:
         varType = args[1]["type"]
 
     if varType == "var":
         frame, name = getFrameAndName(args[1])
-        if not name in frames[frame]:
+        if not name in vm.frames[frame]:
             varType = ""
 
-    setVarType(args[0], "string")
-    setVarValue(args[0], varType)
+    vm.setVar(args[0], varType, T_STRING)
 
 
-def exitInterpret(args):
-    global exitValue, exitBool
-    if (getType(args[0]) != "int"):
+def exitInterpret(vm, args):
+    if (getType(vm, args[0]) != T_INT):
         print("{}: EXIT variable types missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
-    val = getVal(args[0])
+    val = getVal(vm, args[0])
     if val < 0 or val > 49:
         print("{}: EXIT value out of <0,49>".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(57)
 
-    exitBool = True
-    exitValue = val
+    vm.exitBool = True
+    vm.exitValue = val
 
 
-def dprint(args):
-    print(getVal(args[0]), file=sys.stderr)
+def dprint(vm, args):
+    print(getVal(vm, args[0]), file=vm.errorStream)
 
 
-def breakInterpret(args):
+def breakInterpret(vm, args):
     print("Current instruction executed index: {}".format(
-        currentInstIndex), file=sys.stderr)
-    print(frames, file=sys.stderr)
+        vm.currentInstIndex), file=vm.errorStream)
+    print(vm.frames, file=vm.errorStream)
 
 
-def float2int(args):
-    if getType(args[1]) != "float":
+def float2int(vm, args):
+    if getType(vm, args[1]) != T_FLOAT:
         print("{}: FLOAT2INT variable type missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
-    val = getVal(args[1])
+    val = getVal(vm, args[1])
     try:
         val = int(val)
-    except:
+    except (ValueError, OverflowError):
         print("{}: FLOAT2INT cannot do operation".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(58)
 
-    setVarValue(args[0], val)
-    setVarType(args[0], "int")
+    vm.setVar(args[0], val, T_INT)
 
 
-def int2float(args):
-    if getType(args[1]) != "int":
+def int2float(vm, args):
+    if getType(vm, args[1]) != T_INT:
         print("{}: INT2FLOAT variable type missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
-    val = getVal(args[1])
+    val = getVal(vm, args[1])
     try:
         val = float(val)
-    except:
+    except OverflowError:
         print("{}: INT2FLOAT cannot do operation".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(58)
 
-    setVarValue(args[0], val)
-    setVarType(args[0], "float")
+    vm.setVar(args[0], val, T_FLOAT)
 
 
 
@@ -592,308 +895,423 @@ def int2float(args):
 """
     FUNCTIONS FOR STACK INSTRUCTIONS
 """
-def getValStack():
-    global dataStack, dataStackCount
-    if len(dataStack) == 0:
-        sys.exit(56)
-
-    dataStackCount -= 1
-    return dataStack.pop()
-
-
-def setValStack(val, varType):
-    global dataStack, dataStackCount, dataStackMaxCount
-    dataStack.append({"value": val, "type": varType})
-    dataStackCount += 1
-    if dataStackCount > dataStackMaxCount:
-        dataStackMaxCount = dataStackCount
-
-
-def pushs(args):
-    global dataStack, dataStackCount, dataStackMaxCount
-    dataStack.append({"value": getVal(args[0]), "type": getType(args[0])})
-    dataStackCount += 1
-    if dataStackCount > dataStackMaxCount:
-        dataStackMaxCount = dataStackCount
+def emptyStackError(vm):
+    print("{}: Data stack is empty cannot pop value".format(
+        vm.currentInstIndex), file=vm.errorStream)
+    sys.exit(56)
+
+
+def pushStack(vm, value, varType):
+    if vm.dataStackTopType != None:
+        vm.dataStackValues.append(vm.dataStackTopValue)
+        vm.dataStackTypes.append(vm.dataStackTopType)
+    vm.dataStackTopValue = value
+    vm.dataStackTopType = varType
+    vm.dataStackCount += 1
+    if vm.dataStackCount > vm.dataStackMaxCount:
+        vm.dataStackMaxCount = vm.dataStackCount
+
+
+def popStack(vm):
+    if vm.dataStackTopType == None:
+        emptyStackError(vm)
+
+    value, varType = vm.dataStackTopValue, vm.dataStackTopType
+    if vm.dataStackTypes:
+        vm.dataStackTopValue = vm.dataStackValues.pop()
+        vm.dataStackTopType = vm.dataStackTypes.pop()
+    else:
+        vm.dataStackTopValue = vm.dataStackTopType = None
+    vm.dataStackCount -= 1
+    return value, varType
 
 
-def pops(args):
-    global dataStack, dataStackCount
-    if len(dataStack) == 0:
-        print("{}: Data stack is empty cannot pop value".format(
-            currentInstIndex), file=sys.stderr)
-        sys.exit(56)
+def pushs(vm, args):
+    pushStack(vm, *getValAndType(vm, args[0]))
 
-    dataStackCount -= 1
-    var = dataStack.pop()
-    setVarValue(args[0], var["value"])
-    setVarType(args[0], var["type"])
 
+def pops(vm, args):
+    value, varType = popStack(vm)
+    vm.setVar(args[0], value, varType)
 
-def clears(args):
-    global dataStack
-    dataStack = []
 
+def clears(vm, args):
+    vm.dataStackValues = []
+    vm.dataStackTypes = []
+    vm.dataStackTopValue = vm.dataStackTopType = None
 
-def adds(args):
-    arg2 = getValStack()
-    arg1 = getValStack()
 
-    if (not(getType(arg1) == "int" and getType(arg2) == "int") and not(getType(arg1) == "float" and getType(arg2) == "float")):
+"""
+    Operations of stack instructions.
+    Take value and type of operands and return value and type of result,
+    so fused superinstructions can use them without pushing operands to data stack.
+"""
+def addsOperation(vm, value1, type1, value2, type2):
+    if (not(type1 == T_INT and type2 == T_INT) and not(type1 == T_FLOAT and type2 == T_FLOAT)):
         print("{}: ADDD variable types missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setValStack(getVal(arg1) + getVal(arg2), getType(arg1))
+    return value1 + value2, type1
 
 
-def subs(args):
-    arg2 = getValStack()
-    arg1 = getValStack()
-
-    if (not(getType(arg1) == "int" and getType(arg2) == "int") and not(getType(arg1) == "float" and getType(arg2) == "float")):
+def subsOperation(vm, value1, type1, value2, type2):
+    if (not(type1 == T_INT and type2 == T_INT) and not(type1 == T_FLOAT and type2 == T_FLOAT)):
         print("{}: SUBS variable types missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setValStack(getVal(arg1) - getVal(arg2), getType(arg1))
-
+    return value1 - value2, type1
 
-def muls(args):
-    arg2 = getValStack()
-    arg1 = getValStack()
 
-    if (not(getType(arg1) == "int" and getType(arg2) == "int") and not(getType(arg1) == "float" and getType(arg2) == "float")):
+def mulsOperation(vm, value1, type1, value2, type2):
+    if (not(type1 == T_INT and type2 == T_INT) and not(type1 == T_FLOAT and type2 == T_FLOAT)):
         print("{}: MULS variable types missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setValStack(getVal(arg1) * getVal(arg2), getType(arg1))
+    return value1 * value2, type1
 
 
-def idivs(args):
-    arg2 = getValStack()
-    arg1 = getValStack()
-
-    if getVal(arg2) == 0:
+def idivsOperation(vm, value1, type1, value2, type2):
+    if value2 == 0:
         sys.exit(57)
 
-    if (not(getType(arg1) == "int" and getType(arg2) == "int") and not(getType(arg1) == "float" and getType(arg2) == "float")):
+    if (not(type1 == T_INT and type2 == T_INT) and not(type1 == T_FLOAT and type2 == T_FLOAT)):
         print("{}: IDIVS variable types missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setValStack(getVal(arg1) // getVal(arg2), getType(arg1))
-
+    return value1 // value2, type1
 
-def divs(args):
-    arg2 = getValStack()
-    arg1 = getValStack()
 
-    if getVal(arg2) == 0:
+def divsOperation(vm, value1, type1, value2, type2):
+    if value2 == 0:
         sys.exit(57)
 
-    if (getType(arg1) != "float" or getType(arg2) != "float"):
+    if (type1 != T_FLOAT or type2 != T_FLOAT):
         print("{}: DIVS variable types missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setValStack(getVal(arg1) / getVal(arg2), "float")
+    return value1 / value2, T_FLOAT
 
 
-def lts(args):
-    arg2 = getValStack()
-    arg1 = getValStack()
-
-    if(getType(arg1) == "nil" or getType(arg2) == "nil" or getType(arg1) != getType(arg2)):
+def ltsOperation(vm, value1, type1, value2, type2):
+    if(type1 == T_NIL or type2 == T_NIL or type1 != type2):
         print("{}: LTS not same types of variables".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    if getVal(arg1) < getVal(arg2):
-        setValStack(True, "bool")
-    else:
-        setValStack(False, "bool")
-
+    return value1 < value2, T_BOOL
 
-def gts(args):
-    arg2 = getValStack()
-    arg1 = getValStack()
 
-    if(getType(arg1) == "nil" or getType(arg2) == "nil" or getType(arg1) != getType(arg2)):
+def gtsOperation(vm, value1, type1, value2, type2):
+    if(type1 == T_NIL or type2 == T_NIL or type1 != type2):
         print("{}: GTS not same types of variables".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    if getVal(arg1) > getVal(arg2):
-        setValStack(True, "bool")
-    else:
-        setValStack(False, "bool")
-
+    return value1 > value2, T_BOOL
 
-def eqs(args):
-    arg2 = getValStack()
-    arg1 = getValStack()
 
-    if((getType(arg1) == "nil") ^ (getType(arg2) == "nil")):
-        setValStack(False, "bool")
-        return
+def eqsOperation(vm, value1, type1, value2, type2):
+    if((type1 == T_NIL) ^ (type2 == T_NIL)):
+        return False, T_BOOL
 
-    if(getType(arg1) != getType(arg2)):
+    if(type1 != type2):
         print("{}: EQS not same types of variables".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    if getVal(arg1) == getVal(arg2):
-        setValStack(True, "bool")
-    else:
-        setValStack(False, "bool")
+    return value1 == value2, T_BOOL
 
 
-def logAnds(args):
-    arg2 = getValStack()
-    arg1 = getValStack()
-    if (getType(arg1) != "bool" or getType(arg2) != "bool"):
+def logAndsOperation(vm, value1, type1, value2, type2):
+    if (type1 != T_BOOL or type2 != T_BOOL):
         print("{}: ANDS not bool variables".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setValStack(getVal(arg1) and getVal(arg2), "bool")
-
+    return value1 and value2, T_BOOL
 
-def logOrs(args):
-    arg2 = getValStack()
-    arg1 = getValStack()
 
-    if (getType(arg1) != "bool" or getType(arg2) != "bool"):
+def logOrsOperation(vm, value1, type1, value2, type2):
+    if (type1 != T_BOOL or type2 != T_BOOL):
         print("{}: ORS not bool variables".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setValStack(getVal(arg1) or getVal(arg2), "bool")
+    return value1 or value2, T_BOOL
 
 
-def logNots(args):
-    arg1 = getValStack()
-
-    if (getType(arg1) != "bool"):
+def logNotsOperation(vm, value1, type1):
+    if (type1 != T_BOOL):
         print("{}: NOTS not bool variable".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    setValStack(not getVal(arg1), "bool")
-
+    return not value1, T_BOOL
 
-def int2chars(args):
-    arg1 = getValStack()
 
-    if getType(arg1) != "int":
+def int2charsOperation(vm, value1, type1):
+    if type1 != T_INT:
         print("{}: INT2CHARS variable type missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
-    val = getVal(arg1)
     try:
-        val = chr(val)
-    except:
+        return chr(value1), T_STRING
+    except (ValueError, OverflowError):
         print("{}: INT2CHARS chr function failed".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(58)
-    setValStack(val, "string")
-
 
-def str2ints(args):
-    arg2 = getValStack()
-    arg1 = getValStack()
 
-    if getType(arg1) != "string" or getType(arg2) != "int":
+def str2intsOperation(vm, value1, type1, value2, type2):
+    if type1 != T_STRING or type2 != T_INT:
         print("{}: STR2INTS variable types missmatch".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
-    string = getVal(arg1)
-    index = getVal(arg2)
-    if index < 0:
+    if value2 < 0:
         print("{}: STR2INTS index is < 0".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(58)
     try:
-        setValStack(ord(string[index]), "int")
-    except:
+        return ord(value1[value2]), T_INT
+    except IndexError:
         print("{}: STR2INTS ord function failed , or index is out of boundries".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(58)
 
 
-def jumpifeqs(args):
-    arg2 = getValStack()
-    arg1 = getValStack()
+"""
+    Binary stack instructions take first operand from the stack lists and second from the top
+    of the stack, result replaces top of the stack.
+"""
+def adds(vm, args):
+    if not vm.dataStackTypes:
+        emptyStackError(vm)
+
+    vm.dataStackCount -= 1
+    vm.dataStackTopValue, vm.dataStackTopType = addsOperation(
+        vm, vm.dataStackValues.pop(), vm.dataStackTypes.pop(), vm.dataStackTopValue, vm.dataStackTopType)
+
+
+def subs(vm, args):
+    if not vm.dataStackTypes:
+        emptyStackError(vm)
+
+    vm.dataStackCount -= 1
+    vm.dataStackTopValue, vm.dataStackTopType = subsOperation(
+        vm, vm.dataStackValues.pop(), vm.dataStackTypes.pop(), vm.dataStackTopValue, vm.dataStackTopType)
+
+
+def muls(vm, args):
+    if not vm.dataStackTypes:
+        emptyStackError(vm)
+
+    vm.dataStackCount -= 1
+    vm.dataStackTopValue, vm.dataStackTopType = mulsOperation(
+        vm, vm.dataStackValues.pop(), vm.dataStackTypes.pop(), vm.dataStackTopValue, vm.dataStackTopType)
+
+
+def idivs(vm, args):
+    if not vm.dataStackTypes:
+        emptyStackError(vm)
+
+    vm.dataStackCount -= 1
+    vm.dataStackTopValue, vm.dataStackTopType = idivsOperation(
+        vm, vm.dataStackValues.pop(), vm.dataStackTypes.pop(), vm.dataStackTopValue, vm.dataStackTopType)
+
+
+def divs(vm, args):
+    if not vm.dataStackTypes:
+        emptyStackError(vm)
+
+    vm.dataStackCount -= 1
+    vm.dataStackTopValue, vm.dataStackTopType = divsOperation(
+        vm, vm.dataStackValues.pop(), vm.dataStackTypes.pop(), vm.dataStackTopValue, vm.dataStackTopType)
+
+
+def lts(vm, args):
+    if not vm.dataStackTypes:
+        emptyStackError(vm)
+
+    vm.dataStackCount -= 1
+    vm.dataStackTopValue, vm.dataStackTopType = ltsOperation(
+        vm, vm.dataStackValues.pop(), vm.dataStackTypes.pop(), vm.dataStackTopValue, vm.dataStackTopType)
+
 
-    global currentInstIndex
-    if((getType(arg1) == "nil") ^ (getType(arg2) == "nil")):
+def gts(vm, args):
+    if not vm.dataStackTypes:
+        emptyStackError(vm)
+
+    vm.dataStackCount -= 1
+    vm.dataStackTopValue, vm.dataStackTopType = gtsOperation(
+        vm, vm.dataStackValues.pop(), vm.dataStackTypes.pop(), vm.dataStackTopValue, vm.dataStackTopType)
+
+
+def eqs(vm, args):
+    if not vm.dataStackTypes:
+        emptyStackError(vm)
+
+    vm.dataStackCount -= 1
+    vm.dataStackTopValue, vm.dataStackTopType = eqsOperation(
+        vm, vm.dataStackValues.pop(), vm.dataStackTypes.pop(), vm.dataStackTopValue, vm.dataStackTopType)
+
+
+def logAnds(vm, args):
+    if not vm.dataStackTypes:
+        emptyStackError(vm)
+
+    vm.dataStackCount -= 1
+    vm.dataStackTopValue, vm.dataStackTopType = logAndsOperation(
+        vm, vm.dataStackValues.pop(), vm.dataStackTypes.pop(), vm.dataStackTopValue, vm.dataStackTopType)
+
+
+def logOrs(vm, args):
+    if not vm.dataStackTypes:
+        emptyStackError(vm)
+
+    vm.dataStackCount -= 1
+    vm.dataStackTopValue, vm.dataStackTopType = logOrsOperation(
+        vm, vm.dataStackValues.pop(), vm.dataStackTypes.pop(), vm.dataStackTopValue, vm.dataStackTopType)
+
+
+def str2ints(vm, args):
+    if not vm.dataStackTypes:
+        emptyStackError(vm)
+
+    vm.dataStackCount -= 1
+    vm.dataStackTopValue, vm.dataStackTopType = str2intsOperation(
+        vm, vm.dataStackValues.pop(), vm.dataStackTypes.pop(), vm.dataStackTopValue, vm.dataStackTopType)
+
+
+def logNots(vm, args):
+    if vm.dataStackTopType == None:
+        emptyStackError(vm)
+
+    vm.dataStackTopValue, vm.dataStackTopType = logNotsOperation(vm, vm.dataStackTopValue, vm.dataStackTopType)
+
+
+def int2chars(vm, args):
+    if vm.dataStackTopType == None:
+        emptyStackError(vm)
+
+    vm.dataStackTopValue, vm.dataStackTopType = int2charsOperation(vm, vm.dataStackTopValue, vm.dataStackTopType)
+
+
+def jumpifeqs(vm, args):
+    if not vm.dataStackTypes:
+        emptyStackError(vm)
+    value2, type2 = popStack(vm)
+    value1, type1 = popStack(vm)
+
+    if((type1 == T_NIL) ^ (type2 == T_NIL)):
         return
 
-    if(getType(arg1) != getType(arg2)):
+    if(type1 != type2):
         print("{}: JUMPIFEQS not same types of variables".format(
-            currentInstIndex), file=sys.stderr)
+            vm.currentInstIndex), file=vm.errorStream)
         sys.exit(53)
 
-    label = getLabel(args[0])
-    if(getVal(arg1) == getVal(arg2)):
-        currentInstIndex = label
+    label = getLabel(vm, args[0])
+    if(value1 == value2):
+        vm.currentInstIndex = label
 
 
-def jumpifneqs(args):
-    arg2 = getValStack()
-    arg1 = getValStack()
+def jumpifneqs(vm, args):
+    if not vm.dataStackTypes:
+        emptyStackError(vm)
+    value2, type2 = popStack(vm)
+    value1, type1 = popStack(vm)
 
-    global currentInstIndex
-    if((getType(arg1) == "nil") ^ (getType(arg2) == "nil")):
-        currentInstIndex = getLabel(args[0])
+    if((type1 == T_NIL) ^ (type2 == T_NIL)):
+        vm.currentInstIndex = getLabel(vm, args[0])
         return
-    if(getType(arg1) != getType(arg2)):
+    if(type1 != type2):
         print("{}: JUMPIFNEQS not same types of variables 1:{} 2:{}".format(
-            currentInstIndex, getVal(arg1), getType(arg2)), file=sys.stderr)
+            vm.currentInstIndex, value1, type2), file=vm.errorStream)
         sys.exit(53)
 
-    label = getLabel(args[0])
-    if(getVal(arg1) != getVal(arg2)):
-        currentInstIndex = label
+    label = getLabel(vm, args[0])
+    if(value1 != value2):
+        vm.currentInstIndex = label
 
 
-def nothing(args):
+def nothing(vm, args):
     pass
 
 
 
 """
     STATI --vars
+    Count of inicialized variables in all existing frames is tracked incrementally.
+    Every frame keeps count of its inicialized variables, so discarding frame is O(1).
+    Tracking versions of functions are used only when --vars is set, Machine of such run
+    takes them instead of default ones.
+"""
+class Frame(dict):
+    __slots__ = ("inicialized",)
+
+    def __init__(self):
+        super().__init__()
+        self.inicialized = 0
+
+    def clear(self):
+        super().clear()
+        self.inicialized = 0
+
+
+def setVarTracked(vm, var, value, varType):
+    variable = getVariable(vm, var)
+    if variable.type == None:
+        vm.frames[var["frame"]].inicialized += 1
+        vm.inicializedCount += 1
+    variable.value = value
+    variable.type = varType
+
+
+def setVarValueTracked(vm, var, value):
+    setVarTracked(vm, var, value, getVariable(vm, var).type)
+
+
+def createframeTracked(vm, args):
+    if "TF" in vm.frames:
+        vm.inicializedCount -= vm.frames["TF"].inicialized
+    createframe(vm, args)
+
+
+def pushframeTracked(vm, args):
+    frameExists(vm, "TF")
+    maxInicializedInFrame(vm)
+    pushframe(vm, args)
+
+
+def popframeTracked(vm, args):
+    frameExists(vm, "LF")
+    maxInicializedInFrame(vm)
+    if "TF" in vm.frames:
+        vm.inicializedCount -= vm.frames["TF"].inicialized
+    popframe(vm, args)
+
+
+"""
     Checks count of inicialized variables in actives frames.
     If count is greater then current maximum set new maximum.
 """
-def maxInicializedInFrame():
-    global inicializedMaxCount,frames,framesStack
-    counter = 0
+def maxInicializedInFrame(vm):
+    if vm.inicializedCount > vm.inicializedMaxCount:
+        vm.inicializedMaxCount = vm.inicializedCount
 
-    if "TF" in frames:
-        for x in frames["TF"]:
-            if frames["TF"][x]["value"] != None:
-                counter += 1
-    if "LF" in frames:
-        for x in frames["LF"]:
-            if frames["LF"][x]["value"] != None:
-                counter += 1
 
-    for x in frames["GF"]:
-        if frames["GF"][x]["value"] != None:
-            counter += 1
-
-    for frame in range(len(framesStack) - 1):
-        for name in framesStack[frame]:
-            if framesStack[frame][name]["value"] != None:
-                counter += 1
+# Handlers which Machine of run with --vars uses instead of those from instructions
+trackedHandlers = {
+    "CREATEFRAME": createframeTracked,
+    "PUSHFRAME": pushframeTracked,
+    "POPFRAME": popframeTracked,
+}
 
-        
-    if counter > inicializedMaxCount:
-        inicializedMaxCount = counter
 
 """
     Instruction set of IPPcode21.
@@ -962,110 +1380,218 @@ instructions = {
     "DIV": {"args": ["var", "symb", "symb"], "func": div},
 }
 
+# Instructions which are not included in --insts and --hot statistics
+notCountedInstructions = {"LABEL", "DPRINT", "BREAK"}
+
+"""
+    Validators of argument values, compiled once when first program is checked.
+    Program loaded from cache does not need them.
+"""
+argumentValidators = None
+escapeSequence = None
+textValidators = None
+
+
+def compileValidators():
+    global argumentValidators, escapeSequence, textValidators
+    import re
+    argumentValidators = {
+        "int": re.compile('^[+-]?[\d]+$'),
+        "bool": re.compile('^true$|^false$'),
+        "nil": re.compile('^nil$'),
+        "var": re.compile('^(GF|TF|LF)@[a-z_\-$&%*!?A-Z][a-z_\-$&%*!?0-9A-Z]*$'),
+        "type": re.compile('int$|^bool$|^string$|^nil$|^float$'),
+        "label": re.compile('(?i)^[a-z_\-$&%*!?][a-z_\-$&%*!?0-9]*$'),
+    }
+    escapeSequence = re.compile('\\\\[0-9]{3}')
+    textValidators = {
+        "int": re.compile('int@[+-]?[0-9]+'),
+        "bool": re.compile('bool@(true|false)'),
+        "float": re.compile('(?i)float@0x([a-f]|[0-9])(\\.[0-9|a-f]*)?p(\\+|-)?[0-9]*'),
+        "nil": re.compile('nil@nil'),
+        "var": re.compile('(GF|TF|LF)@[a-z_\\-$&%*!?A-Z][a-z_\\-$&%*!?0-9A-Z]*'),
+        "type": re.compile('int|bool|string|nil|float'),
+        "label": re.compile('[a-z_\\-$&%*!?A-Z][a-z_\\-$&%*!?0-9A-Z]*'),
+        "token": re.compile('[^ \\t\\n\\v\\f\\r]+'),
+        "comment": re.compile('#.*'),
+    }
+
+symbTypes = {"int", "string", "bool", "nil", "var", "float"}
+
+
 """
     Parser for input XML.
     Checks lexical and syntax program construction.
     Returns parsed program in dinctionary ready to be interpreted.
+
+    XML is read as stream and every instruction is checked and freed as soon as it is read.
+    Errors are reported after whole document is read, so malformed XML is always 31.
+    Checks which need all instructions ( duplicit order, duplicit label ) are done
+    afterwards in order of instructions, so exit code is same as if program was checked sorted.
 """
-def checkXMLandSave():
-    parseTree = {}
-    orderList = []
+def checkXMLandSave(vm):
+    import xml.etree.ElementTree as ET
+    if argumentValidators == None:
+        compileValidators()
+    records = []
+    error = 0
+    depth = 0
+    root = None
+
     try:
-        tree = ET.parse(sourceFile)
-        root = tree.getroot()
-    except:
+        for event, element in ET.iterparse(vm.sourceFile, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if depth == 1:
+                    root = element
+                    if root.tag != "program" or not("language" in root.attrib):
+                        error = 32
+                    elif root.attrib["language"].lower() != "ippcode21":
+                        error = 32
+                continue
+
+            depth -= 1
+            if depth != 1:
+                continue
+
+            # Instruction is fully read, check it and free it
+            if not error:
+                # Instructions are sorted by order, if order attrib not exists exit with error code
+                try:
+                    order = int(element.attrib["order"])
+                except (KeyError, ValueError):
+                    error = 32
+                else:
+                    records.append(
+                        (order, element.attrib["order"], checkInstruction(vm, element)))
+            element.clear()
+            root.remove(element)
+    except (ET.ParseError, UnicodeError):
         sys.exit(31)
 
-    if root.tag != "program" or not("language" in root.attrib):
-        sys.exit(32)
+    if error:
+        sys.exit(error)
 
-    if root.attrib["language"].lower() != "ippcode21":
-        sys.exit(32)
+    return saveInstructions(vm, records)
 
-    # Sort instruction by opcode , if opcode attrib not exists exit with error code
-    try:
-        root[:] = sorted(root, key=lambda child: int(child.attrib["order"]))
-    except:
-        sys.exit(32)
 
+"""
+    Builds parseTree and labels from checked instructions ( order, order text, instruction ).
+"""
+def saveInstructions(vm, records):
+    parseTree = {}
+    records.sort(key=lambda record: record[0])
 
+    orders = set()
     instLine = 0
-    for instruction in root:
-        # Check xml instruction tag
-        if not re.match("^instruction$", instruction.tag):
+    for order, orderText, instruction in records:
+        # Instruction itself is not valid
+        if instruction == None:
             sys.exit(32)
 
-        # Check for correct attributes and count of them
-        if not("opcode" in instruction.attrib) or len(instruction.attrib) != 2:
+        # Check for duplicit order in instructions or order is below 0 value
+        if orderText in orders or order <= 0:
             sys.exit(32)
+        orders.add(orderText)
+
+        instructionOpcode, args = instruction
+        # Add new record to parseTree
+        parseTree[instLine] = {
+            "instruction": instructionOpcode, "args": args, "order": orderText}
+        # Add label if opcode LABEL / better do there
+        if instructionOpcode == "LABEL":
+            if args[0]["value"] in vm.labels:
+                sys.exit(52)
+            vm.labels[args[0]["value"]] = instLine
+        # --------------------------------------
+        instLine += 1
 
-        order = instruction.attrib["order"]
-        instructionOpcode = instruction.attrib["opcode"].upper()
+    return parseTree
 
-        # Check for duplicit order in instructions or order is below 0 value
-        if order in orderList or int(order) <= 0:
-            sys.exit(32)
 
-        orderList.append(order)
-        # Sort arguments to be in right order ( from 1 to max )
-        instruction[:] = sorted(instruction, key=lambda child: child.tag)
+"""
+    Checks one instruction element with its arguments.
+    Returns opcode and list of arguments, or None if instruction is not valid.
+"""
+def checkInstruction(vm, instruction):
+    # Check xml instruction tag
+    if instruction.tag != "instruction":
+        return None
 
-        args = []
-        argumentCount = 1
-        for arg in instruction:
-            # Check xml arg tag
-            if arg.tag != ("arg" + str(argumentCount)):
-                sys.exit(32)
+    # Check for correct attributes and count of them
+    if not("opcode" in instruction.attrib) or len(instruction.attrib) != 2:
+        return None
 
-            # Check for correct attributes and count of them
-            if not("type" in arg.attrib) or len(arg.attrib) != 1:
-                sys.exit(32)
+    instructionOpcode = instruction.attrib["opcode"].upper()
 
-            # Default set arguemnt value if empty from xml
-            if arg.text == None:
-                arg.text = ""
+    args = []
+    argumentCount = 1
+    # Arguments are checked in right order ( from 1 to max )
+    for arg in sorted(instruction, key=lambda child: child.tag):
+        # Check xml arg tag
+        if arg.tag != ("arg" + str(argumentCount)):
+            return None
 
-            # Check if given type is correct to the given value
-            if not argumentTypeCheck(arg.text, arg.attrib["type"]):
-                sys.exit(32)
+        # Check for correct attributes and count of them
+        if not("type" in arg.attrib) or len(arg.attrib) != 1:
+            return None
 
-            argValue = decodeArgumentValue(arg.attrib["type"], arg.text)
-            args.append({"type": arg.attrib["type"], "value": argValue})
-            argumentCount += 1
+        # Default set arguemnt value if empty from xml
+        text = arg.text
+        if text == None:
+            text = ""
 
+        args.append((arg.attrib["type"], text))
+        argumentCount += 1
 
-        global instructions
+    return checkArguments(vm, instructionOpcode, args)
 
-        # Instruction opcode check if exists
-        if not instructionOpcode in instructions:
-            sys.exit(32)
 
-        # Check if count of arguments mazch to instuction arguments count
-        if len(instructions[instructionOpcode]["args"]) != len(args):
-            sys.exit(32)
+"""
+    Checks opcode of instruction and its arguments given as list of ( type, text ).
+    Returns opcode and list of decoded arguments, or None if instruction is not valid.
+"""
+def checkArguments(vm, instructionOpcode, rawArgs):
+    args = []
+    for argType, text in rawArgs:
+        # Check if given type is correct to the given value
+        if not argumentTypeCheck(text, argType):
+            return None
 
-        # Arguments check
-        for i in range(0, len(args)):
-            if instructions[instructionOpcode]["args"][i] == "symb":
-                if args[i]["type"] in ["int", "string", "bool", "nil", "var", "float"]:
-                    continue
-            elif instructions[instructionOpcode]["args"][i] == args[i]["type"]:
-                continue
-            # If evrything okay continue. If not ... exit
-            sys.exit(32)
+        argValue = decodeArgumentValue(vm, argType, text)
+        args.append({"type": sys.intern(argType), "value": argValue})
 
-        # Add new record to parseTree
-        parseTree[instLine] = {
-            "instruction": instructionOpcode, "args": args, "order": order, "counter": 0}
-        # Add label if opcode LABEL / better do there
-        if instructionOpcode == "LABEL":
-            if args[0]["value"] in labels:
-                sys.exit(52)
-            labels[args[0]["value"]] = instLine
-        # --------------------------------------
-        instLine += 1
+    # Instruction opcode check if exists
+    if not instructionOpcode in instructions:
+        return None
+    instructionOpcode = sys.intern(instructionOpcode)
+
+    if not argumentsMatch(instructionOpcode, args):
+        return None
+
+    return instructionOpcode, args
 
-    return parseTree
+
+"""
+    Check if count and types of arguments match to arguments of instruction.
+"""
+def argumentsMatch(instructionOpcode, args):
+    # Check if count of arguments mazch to instuction arguments count
+    expectedArgs = instructions[instructionOpcode]["args"]
+    if len(expectedArgs) != len(args):
+        return False
+
+    # Arguments check
+    for i in range(0, len(args)):
+        if expectedArgs[i] == "symb":
+            if args[i]["type"] in symbTypes:
+                continue
+        elif expectedArgs[i] == args[i]["type"]:
+            continue
+        # If evrything okay continue. If not ... not valid
+        return False
+
+    return True
 
 
 """
@@ -1073,28 +1599,13 @@ def checkXMLandSave():
 """
 def argumentTypeCheck(value, expectedType):
     expectedType = expectedType.lower()
-    if(expectedType == "int"):
-        if not re.match('^[+-]?[\d]+$', value):
-            return False
-    elif(expectedType == "bool"):
-        if not re.match('^true$|^false$', value):
-            return False
-    elif(expectedType == "nil"):
-        if not re.match('^nil$', value):
-            return False
-    elif(expectedType == "var"):
-        if not re.match('^(GF|TF|LF)@[a-z_\-$&%*!?A-Z][a-z_\-$&%*!?0-9A-Z]*$', value):
-            return False
-    elif(expectedType == "type"):
-        if not re.match('int$|^bool$|^string$|^nil$|^float$', value):
-            return False
-    elif(expectedType == "label"):
-        if not re.match('(?i)^[a-z_\-$&%*!?][a-z_\-$&%*!?0-9]*$', value):
-            return False
-    elif(expectedType == "float"):
+    if(expectedType == "float"):
         try:
             float.fromhex(value)
-        except:
+        except (ValueError, OverflowError):
+            return False
+    elif expectedType in argumentValidators:
+        if not argumentValidators[expectedType].match(value):
             return False
 
     return True
@@ -1111,11 +1622,11 @@ def escapeSeqToAscii(match):
 """
     Return formated value to the relevant type of variable.
 """
-def decodeArgumentValue(argType, value):
+def decodeArgumentValue(vm, argType, value):
     decodedValue = value
 
     if(argType == "string"):
-        decodedValue = re.sub('\\\\[0-9]{3}', escapeSeqToAscii, value)
+        decodedValue = escapeSequence.sub(escapeSeqToAscii, value)
     elif(argType == "int"):
         decodedValue = int(value)
     elif(argType == "bool"):
@@ -1123,60 +1634,324 @@ def decodeArgumentValue(argType, value):
             decodedValue = True
         else:
             decodedValue = False
+    elif argType in ("var", "label", "type"):
+        # Names repeat through whole program, every one is kept only once
+        decodedValue = sys.intern(value)
     elif(argType == "float"):
         try:
             decodedValue = float.fromhex(value)
-        except:
+        except (ValueError, OverflowError):
             print("{}: bad notation of float".format(
-                currentInstIndex), file=sys.stderr)
+                vm.currentInstIndex), file=vm.errorStream)
             sys.exit(32)
 
     return decodedValue
 
 
 """
-    STATI --hot
-    Check for most used operation while interpreting code.
+    Parser for IPPcode21 source text ( --source-format=text ).
+    Uses the same lexical and syntax rules and exit codes as parse.php: missing header is 21,
+    unknown opcode 22, wrong count or form of arguments 23. Instructions are numbered from 1
+    and then checked and saved the same way as instructions read from XML, so program is
+    interpreted the same as output of parse.php would be.
+    Unlike parse.php, STRI2INTS is known instruction ( its key in parse.php has trailing space ).
 """
-def getMostUsedOperation(tree):
-    mostUsed = 0
-    bestMatch = 0
-    for x in tree:
-        if tree[x]["counter"] > mostUsed:
-            mostUsed = tree[x]["counter"]
-            bestMatch = tree[x]["order"]
+phpTrim = " \t\n\r\0\x0b"
+toUpper = str.maketrans("abcdefghijklmnopqrstuvwxyz", "ABCDEFGHIJKLMNOPQRSTUVWXYZ")
 
-    return bestMatch
 
+def checkTextAndSave(vm):
+    if argumentValidators == None:
+        compileValidators()
+    # Source is opened without newline translation, lines end only with \n as in fgets of parse.php.
+    # \r before \n is removed by trim as other white space, \r alone separates tokens.
+    try:
+        lines = vm.sourceFile.read().split("\n")
+    except UnicodeError:
+        sys.exit(31)
 
+    # Empty lines and comments before header are skipped
+    line = 0
+    while line < len(lines) - 1 and (lines[line].strip(" \t\n\v\f\r") == "" or
+                                     lines[line].lstrip(" \t\n\v\f\r").startswith("#")):
+        line += 1
+    header = textValidators["comment"].sub("", lines[line]).strip(phpTrim)
+    if header.translate(toUpper) != ".IPPCODE21":
+        print("Missing header .IPPcode21", file=vm.errorStream)
+        sys.exit(21)
+
+    records = []
+    for text in lines[line + 1:]:
+        text = textValidators["comment"].sub("", text.strip(phpTrim))
+        # parse.php skips "0" as empty line and "0" arguments as empty arguments
+        if text == "" or text == "0":
+            continue
+        tokens = textValidators["token"].findall(text) or [""]
+        order = len(records) + 1
+        records.append((order, str(order), checkTextInstruction(
+            vm, tokens[0].translate(toUpper), [token for token in tokens[1:] if token != "0"])))
+
+    return saveInstructions(vm, records)
 
-def processArguments():
-    global sourceFile, inputFile, statistic
-    if args.help:
-        if len(sys.argv) == 2:
-            help()
-            sys.exit(0)
-        else:
-            sys.exit(10)
 
-    if (args.input == None and args.source == None):
-        sys.exit(10)
+"""
+    Checks one instruction of source text.
+    Returns opcode and list of arguments, or None if instruction is not valid.
+"""
+def checkTextInstruction(vm, instructionOpcode, tokens):
+    if not instructionOpcode in instructions:
+        print("Unknown opcode {}".format(instructionOpcode), file=vm.errorStream)
+        sys.exit(22)
 
-    if(args.input):
-        try:
-            inputFile = open(args.input)
-        except:
-            sys.exit(10)
+    expectedArgs = instructions[instructionOpcode]["args"]
+    if len(expectedArgs) != len(tokens):
+        print("Wrong count of arguments of {}".format(instructionOpcode), file=vm.errorStream)
+        sys.exit(23)
 
-    if(args.source):
-        try:
-            sourceFile = open(args.source)
-        except:
-            sys.exit(10)
+    args = []
+    for expected, token in zip(expectedArgs, tokens):
+        arg = textArgument(expected, token)
+        if arg == None:
+            print("Wrong argument {} of {}".format(token, instructionOpcode), file=vm.errorStream)
+            sys.exit(23)
+        args.append(arg)
 
-    if args.insts or args.hot or args.vars:
-        if not args.stats:
+    return checkArguments(vm, instructionOpcode, args)
+
+
+"""
+    Returns type and text of argument in the same form as in XML, or None if token is not valid.
+"""
+def textArgument(expected, token):
+    if expected == "symb":
+        if textValidators["int"].fullmatch(token):
+            return "int", token[4:]
+        if token.startswith("string@"):
+            # Every backslash has to start escape sequence
+            if len(escapeSequence.findall(token)) != token.count("\\"):
+                return None
+            return "string", token[7:]
+        if textValidators["bool"].fullmatch(token):
+            return "bool", token[5:]
+        if textValidators["float"].fullmatch(token):
+            return "float", token[6:]
+        if textValidators["nil"].fullmatch(token):
+            return "nil", token[4:]
+
+    if expected == "symb" or expected == "var":
+        if textValidators["var"].fullmatch(token):
+            return "var", token
+    elif textValidators[expected].fullmatch(token):
+        return expected, token
+
+    return None
+
+
+"""
+    PRECOMPILED PROGRAM CACHE --cache
+    Checked and decoded program is saved to cache directory as .ippc file named by hash of source
+    and its format.
+    Next run with the same source loads it directly and skips XML parsing and checking.
+    Every cache file contains fingerprint of interpreter and Python version,
+    so any change of interpreter invalidates old cache files.
+
+    Cache file is JSON, so loading it can't run any code even when someone else can write
+    to cache directory. Instructions are stored as [ order, opcode, [ [ type, value ], ... ] ]
+    with decoded values. Loaded program is checked again ( known opcode, arguments, types of values,
+    names of variables and labels ), file which isn't valid program is ignored as missing one.
+    Labels are not stored, their indexes are taken from LABEL instructions.
+    Labels are linked by loadProgram, after --optimize which changes indexes of instructions.
+"""
+def interpreterFingerprint():
+    import hashlib
+    interpreter = __loader__.get_data(os.path.abspath(__file__))
+    return hashlib.sha256(interpreter + sys.version.encode()).hexdigest()
+
+
+def encodeProgram(fingerprint, tree):
+    import json
+    program = [[tree[x]["order"], tree[x]["instruction"],
+                [[arg["type"], arg["value"]] for arg in tree[x]["args"]]] for x in tree]
+    return json.dumps({"format": "ippc", "fingerprint": fingerprint, "program": program}).encode("utf-8")
+
+
+cachedValueTypes = {"int": int, "bool": bool, "float": float, "string": str,
+                    "nil": str, "var": str, "label": str, "type": str}
+
+
+"""
+    Returns program and its labels from encoded program, or None if it isn't valid program
+    of this interpreter.
+"""
+def decodeProgram(data, fingerprint):
+    import json
+    if argumentValidators == None:
+        compileValidators()
+    try:
+        cached = json.loads(data)
+        if cached["format"] != "ippc" or cached["fingerprint"] != fingerprint:
+            return None
+
+        tree = {}
+        programLabels = {}
+        for index, (order, opcode, rawArgs) in enumerate(cached["program"]):
+            if type(order) is not str or not opcode in instructions:
+                return None
+            args = []
+            for argType, value in rawArgs:
+                if type(value) is not cachedValueTypes[argType]:
+                    return None
+                if argType in argumentValidators and type(value) is str:
+                    if not argumentValidators[argType].match(value):
+                        return None
+                    value = sys.intern(value)
+                args.append({"type": sys.intern(argType), "value": value})
+            if not argumentsMatch(opcode, args):
+                return None
+
+            opcode = sys.intern(opcode)
+            tree[index] = {"instruction": opcode, "args": args, "order": order}
+            if opcode == "LABEL":
+                if args[0]["value"] in programLabels:
+                    return None
+                programLabels[args[0]["value"]] = index
+    except (KeyError, TypeError, ValueError, UnicodeError):
+        return None
+
+    return tree, programLabels
+
+
+def loadCachedProgram(vm, path, fingerprint):
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        # Missing cache file, program is checked and saved again
+        return None
+
+    program = decodeProgram(data, fingerprint)
+    if program == None:
+        return None
+
+    tree, vm.labels = program
+    return tree
+
+
+def saveCachedProgram(vm, path, fingerprint, tree):
+    import tempfile
+    tmpPath = None
+    try:
+        os.makedirs(vm.cacheDirectory, exist_ok=True)
+        fd, tmpPath = tempfile.mkstemp(dir=vm.cacheDirectory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(encodeProgram(fingerprint, tree))
+        os.replace(tmpPath, path)
+    except OSError:
+        # Cache is only optimization, program is interpreted anyway
+        if tmpPath != None and os.path.exists(tmpPath):
+            os.remove(tmpPath)
+
+
+"""
+    Returns checked program from source file.
+    If cache is enabled program is taken from cache, or saved to cache after check.
+"""
+def loadSource(vm):
+    checkSource = checkTextAndSave if vm.options.sourceFormat == "text" else checkXMLandSave
+    if vm.cacheDirectory == None:
+        return checkSource(vm)
+
+    try:
+        source = vm.sourceFile.read()
+    except (OSError, UnicodeError):
+        sys.exit(31)
+
+    import hashlib
+    fingerprint = interpreterFingerprint()
+    sourceHash = hashlib.sha256(source.encode("utf-8", "surrogatepass")).hexdigest()
+    path = os.path.join(vm.cacheDirectory, sourceHash + "." + vm.options.sourceFormat + ".ippc")
+
+    tree = loadCachedProgram(vm, path, fingerprint)
+    if tree != None:
+        return tree
+
+    vm.sourceFile = io.StringIO(source)
+    tree = checkSource(vm)
+    saveCachedProgram(vm, path, fingerprint, tree)
+    return tree
+
+
+"""
+    STATI --hot
+    Check for most used operation while interpreting code.
+"""
+def getMostUsedOperation(vm, tree):
+    mostUsed = 0
+    bestMatch = 0
+    for x in tree:
+        if tree[x]["instruction"] in notCountedInstructions:
+            continue
+        if vm.instCounters[x] > mostUsed:
+            mostUsed = vm.instCounters[x]
+            bestMatch = tree[x]["order"]
+
+    return bestMatch
+
+
+"""
+    STATI --insts
+    Sum of executed instructions. (LABEL | DPRINT | BREAK) not included.
+"""
+def getInstructionsCount(vm, tree):
+    count = 0
+    for x in tree:
+        if not tree[x]["instruction"] in notCountedInstructions:
+            count += vm.instCounters[x]
+
+    return count
+
+
+
+"""
+    Command line part of argument check, opens source and input files and notes order of statistics.
+    Options of run itself are checked by checkOptions, which is called by every Interpreter run.
+    Returns source file, input file and statistics for writeStatsToFile ( False without --stats ).
+"""
+def processArguments(args):
+    sourceFile = sys.stdin
+    inputFile = sys.stdin
+    statistic = False
+    if args.help:
+        if len(sys.argv) == 2:
+            help()
+            sys.exit(0)
+        else:
+            sys.exit(10)
+
+    if (args.input == None and args.source == None):
+        sys.exit(10)
+
+    if(args.input):
+        try:
+            inputFile = open(args.input)
+        except (OSError, ValueError):
+            sys.exit(10)
+
+    if(args.source):
+        try:
+            sourceFile = open(args.source, newline="")
+        except (OSError, ValueError):
             sys.exit(10)
+    else:
+        # Source is read without newline translation also from stdin
+        sourceFile.reconfigure(newline="")
+
+    if args.insts or args.hot or args.vars or args.memohits:
+        if not args.stats:
+            sys.exit(10)
+
+    if args.results:
+        sys.exit(10)
 
     if args.stats:
         statistic = {"file": args.stats}
@@ -1186,13 +1961,39 @@ def processArguments():
         statistic[sys.argv.index("--hot")] = "hot"
     if args.vars:
         statistic[sys.argv.index("--vars")] = "vars"
+    if args.memohits:
+        statistic[sys.argv.index("--memohits")] = "memohits"
+
+    return sourceFile, inputFile, statistic
+
 
+"""
+    Checks and normalizes options of one run. Command line, Interpreter API and --batch jobs
+    are all checked here, so the same options behave the same everywhere.
+"""
+def checkOptions(options):
+    if options.report and not (options.fuse or options.specialize or options.optimize or options.tailcalls or options.memo):
+        sys.exit(10)
 
-def writeStatsToFile(statistic, tree):
+    # Profile is measured on plain interpreting loop
+    if options.profile:
+        options.fuse = False
+        options.compile = False
+        options.tailcalls = False
+        options.memo = None
+
+    if options.memo != None and options.memo <= 0:
+        sys.exit(10)
+
+
+"""
+    Writes statistics returned by run to --stats file in the order of their options.
+"""
+def writeStatsToFile(statistic, stats):
     try:
         statsFile = open(statistic["file"], "w")
         statistic.pop('file', None)
-    except:
+    except (OSError, ValueError):
         sys.exit(10)
 
     first = True
@@ -1202,12 +2003,7 @@ def writeStatsToFile(statistic, tree):
             first = False
         else:
             statsFile.write("\n")
-        if "vars" in x[1]:
-            statsFile.write(str(inicializedMaxCount))
-        elif "insts" in x[1]:
-            statsFile.write(str(instCount))
-        elif "hot" in x[1]:
-            statsFile.write(str(getMostUsedOperation(tree)))
+        statsFile.write(str(stats[x[1]]))
 
 
 def help():
@@ -1215,44 +2011,1910 @@ def help():
     print(
         f"Usage: {sys.argv[0]} [ --source=file | --input=file | --stats ]")
     print("    --source    | Source file of IPPcode21")
+    print("    --source-format | Format of source file, 'xml' ( default, output of parse.php ) or 'text'")
+    print("                  ( IPPcode21 itself, checked with the same rules and exit codes as parse.php )")
     print("    --input     | Input file for program to read from")
     print("    --stats     | Sets the file that the statistics will be written to")
+    print("    --cache     | Directory for precompiled programs, unchanged source is not parsed again")
+    print("    --fuse      | Fuse common sequences of instructions to superinstructions")
+    print("    --optimize  | Fold constants and remove unreachable instructions before interpreting")
+    print("    --specialize| Infer types of variables, instructions with proven types skip type checks")
+    print("    --compile   | Translate program to Python code before running, --fuse and --specialize are not used")
+    print("    --tailcalls | CALL followed by RETURN doesn't push return address, tail recursion runs in constant memory")
+    print("    --memo[=N]  | Cache results of pure subroutines, at most N results ( default 1024 )")
+    print("    --profile   | Sets the file that the execution profile will be written to (JSON), folded stacks to FILE.folded")
+    print("                  --fuse, --compile, --tailcalls and --memo are not used while profiling")
+    print("    --report    | Sets the file that the changes made by optimizations will be written to")
+    print("    --batch     | Runs all jobs from manifest ( JSON line per job ) in this process, see runBatch")
+    print("    --results   | Sets the file that the results of --batch will be written to ( default stdout )")
 
     print("\nTo use these parameters, --stats has to be already set!")
     print("    --insts     | Count every executed instructionm. (LABEL | DPRTIN | BREAK) not included.")
     print("    --hot       | Most executed insctrution in program")
     print("    --vars      | Maximum inicialized vars in one moment in any frame.")
+    print("    --memohits  | Count of CALLs answered from --memo cache.")
+    print("With --memo instructions of subroutines answered from cache are not executed,")
+    print("so --insts, --hot and --vars don't count them.")
     print("Statistics are logged in the order that they were written in arguments.")
 
 
-def interpreteCode(tree, lastIndex):
-    global currentInstIndex, instCount
-    while currentInstIndex <= lastIndex and (not exitBool):
-        if not re.match('^LABEL$|^DPRINT$|^BREAK$', tree[currentInstIndex]["instruction"]):
-            tree[currentInstIndex]["counter"] += 1
-            instCount += 1
+"""
+    Resolver for arguments.
+    Splits every 'var' argument to frame and interned name once at load phase,
+    so variable access doesn't have to slice string on every execution.
+    Constant arguments get type tag of their value, type arguments tag of type they name.
+"""
+def resolveArguments(tree):
+    for x in tree:
+        for arg in tree[x]["args"]:
+            if arg["type"] == "var":
+                arg["frame"] = sys.intern(arg["value"][0:2])
+                arg["name"] = sys.intern(arg["value"][3:])
+            elif arg["type"] in typeTags:
+                arg["tag"] = typeTags[arg["type"]]
+            elif arg["type"] == "type":
+                arg["tag"] = typeTags.get(arg["value"])
 
-        instructions[tree[currentInstIndex]["instruction"]
-                     ]["func"](tree[currentInstIndex]["args"])
-        currentInstIndex += 1
 
-    maxInicializedInFrame()
+"""
+    Linker.
+    Every label operand of jump or call gets 'target', index of instruction executed before its label,
+    so interpreting loop continues right at the label. Undefined label gets None and error 52
+    is raised only when the jump is executed, same as without linking.
+"""
+def linkLabels(vm, tree):
+    for x in tree:
+        if tree[x]["instruction"] == "LABEL":
+            continue
+        for arg in tree[x]["args"]:
+            if arg["type"] == "label":
+                index = vm.labels.get(arg["value"])
+                arg["target"] = None if index == None else index - 1
 
 
-def main():
-    global exitValue, statistic
-    processArguments()
-    tree = checkXMLandSave()
+"""
+    Control flow graph of linked program.
+    Program is split to basic blocks, block starts at label or after instruction which changes
+    flow and ends before next one. RETURN can go back after any CALL, so all RETURN blocks lead
+    to one extra node 'returnNode' which leads to blocks after every CALL.
+    Jump to undefined label has no edge, it ends with error.
+    Graph contains list of 'blocks' (first, last instruction index), 'successors' and 'predecessors'
+    of every node and 'blockOf' which maps first instruction of block to its index.
+"""
+flowInstructions = {"JUMP", "JUMPIFEQ", "JUMPIFNEQ",
+                    "JUMPIFEQS", "JUMPIFNEQS", "CALL", "RETURN", "EXIT"}
+
+
+def buildControlFlowGraph(code):
+    leaders = {0}
+    for index, instruction in enumerate(code):
+        if instruction["instruction"] == "LABEL":
+            leaders.add(index)
+        elif instruction["instruction"] in flowInstructions:
+            leaders.add(index + 1)
+    leaders = sorted(x for x in leaders if x < len(code))
+
+    blocks = []
+    blockOf = {}
+    for x, first in enumerate(leaders):
+        last = leaders[x + 1] - 1 if x + 1 < len(leaders) else len(code) - 1
+        blockOf[first] = x
+        blocks.append((first, last))
+
+    returnNode = len(blocks)
+    successors = []
+    returnSites = []
+    for first, last in blocks:
+        opcode = code[last]["instruction"]
+        following = [blockOf[last + 1]] if last + 1 < len(code) else []
+        target = []
+        if opcode in flowInstructions and opcode not in ("RETURN", "EXIT"):
+            label = code[last]["args"][0]["target"]
+            if label != None:
+                target = [blockOf[label + 1]]
+
+        if opcode == "JUMP":
+            successors.append(target)
+        elif opcode == "CALL":
+            successors.append(target)
+            returnSites += following
+        elif opcode == "RETURN":
+            successors.append([returnNode])
+        elif opcode == "EXIT":
+            successors.append([])
+        else:
+            successors.append(following + target)
+    successors.append(returnSites)
+
+    predecessors = [[] for _ in successors]
+    for node, nodeSuccessors in enumerate(successors):
+        for successor in nodeSuccessors:
+            predecessors[successor].append(node)
+
+    return {"blocks": blocks, "successors": successors, "predecessors": predecessors,
+            "blockOf": blockOf, "returnNode": returnNode}
+
+
+"""
+    Superinstruction fusion.
+    Common sequences of instructions are replaced by one handler which executes whole sequence
+    in one dispatch. Only first instruction of sequence is replaced, others stay in program,
+    so jump into the middle of sequence still executes original instructions.
+    Fused handlers check operands in the same order as original instructions,
+    so errors are the same. Jump can be only last instruction of sequence.
+"""
+stackBinaryOperations = {
+    "ADDS": addsOperation,
+    "SUBS": subsOperation,
+    "MULS": mulsOperation,
+    "IDIVS": idivsOperation,
+    "DIVS": divsOperation,
+    "LTS": ltsOperation,
+    "GTS": gtsOperation,
+    "EQS": eqsOperation,
+    "ANDS": logAndsOperation,
+    "ORS": logOrsOperation,
+    "STRI2INTS": str2intsOperation,
+}
+
+stackUnaryOperations = {
+    "NOTS": logNotsOperation,
+    "INT2CHARS": int2charsOperation,
+}
+
+
+def compareSymbols(vm, opcode, symb1, symb2):
+    type1 = getType(vm, symb1)
+    if opcode == "EQ":
+        type2 = getType(vm, symb2)
+        if (type1 == T_NIL) ^ (type2 == T_NIL):
+            return False
+        if type1 != type2:
+            print("{}: EQ not same types of variables".format(
+                vm.currentInstIndex), file=vm.errorStream)
+            sys.exit(53)
+        return getVal(vm, symb1) == getVal(vm, symb2)
+
+    if type1 == T_NIL or getType(vm, symb2) == T_NIL or type1 != getType(vm, symb2):
+        print("{}: {} not same types of variables".format(
+            vm.currentInstIndex, opcode), file=vm.errorStream)
+        sys.exit(53)
+
+    if opcode == "LT":
+        return getVal(vm, symb1) < getVal(vm, symb2)
+    return getVal(vm, symb1) > getVal(vm, symb2)
+
+
+# LT/GT/EQ var symb symb ; JUMPIFEQ/JUMPIFNEQ label var bool
+def matchCompareJump(code, index):
+    if code[index]["instruction"] not in ("LT", "GT", "EQ") or index + 1 >= len(code):
+        return 0
+    jump = code[index + 1]
+    if jump["instruction"] not in ("JUMPIFEQ", "JUMPIFNEQ"):
+        return 0
+
+    result = code[index]["args"][0]["value"]
+    symb1, symb2 = jump["args"][1], jump["args"][2]
+    if symb1["type"] == "var" and symb1["value"] == result and symb2["type"] == "bool":
+        return 2
+    if symb2["type"] == "var" and symb2["value"] == result and symb1["type"] == "bool":
+        return 2
+    return 0
+
+
+def fuseCompareJump(vm, code, index, count):
+    opcode = code[index]["instruction"]
+    result, symb1, symb2 = code[index]["args"]
+    jump = code[index + 1]
+    label = jump["args"][0]
+    constant = jump["args"][2]["value"] if jump["args"][2]["type"] == "bool" else jump["args"][1]["value"]
+    jumpIfEqual = jump["instruction"] == "JUMPIFEQ"
+
+    def compareJump():
+        value = compareSymbols(vm, opcode, symb1, symb2)
+        vm.setVar(result, value, T_BOOL)
+        vm.currentInstIndex = index + 1
+        target = getLabel(vm, label)
+        if (value == constant) == jumpIfEqual:
+            vm.currentInstIndex = target
+
+    return compareJump
+
+
+# PUSHS symb ; PUSHS symb ; binary stack operation ; POPS var
+# PUSHS symb ; unary stack operation ; POPS var
+def matchStackOperation(code, index):
+    if code[index]["instruction"] != "PUSHS":
+        return 0
+    if index + 2 < len(code) and code[index + 1]["instruction"] in stackUnaryOperations \
+            and code[index + 2]["instruction"] == "POPS":
+        return 3
+    if index + 3 < len(code) and code[index + 1]["instruction"] == "PUSHS" \
+            and code[index + 2]["instruction"] in stackBinaryOperations \
+            and code[index + 3]["instruction"] == "POPS":
+        return 4
+    return 0
+
+
+def fuseStackOperation(vm, code, index, count):
+    symb1 = code[index]["args"][0]
+    result = code[index + count - 1]["args"][0]
+
+    if count == 3:
+        operation = stackUnaryOperations[code[index + 1]["instruction"]]
+
+        def stackUnary():
+            value1, type1 = getValAndType(vm, symb1)
+            if vm.dataStackCount + 1 > vm.dataStackMaxCount:
+                vm.dataStackMaxCount = vm.dataStackCount + 1
+            value, valueType = operation(vm, value1, type1)
+            vm.currentInstIndex = index + 2
+            vm.setVar(result, value, valueType)
+
+        return stackUnary
+
+    symb2 = code[index + 1]["args"][0]
+    operation = stackBinaryOperations[code[index + 2]["instruction"]]
+
+    def stackBinary():
+        value1, type1 = getValAndType(vm, symb1)
+        value2, type2 = getValAndType(vm, symb2)
+        if vm.dataStackCount + 2 > vm.dataStackMaxCount:
+            vm.dataStackMaxCount = vm.dataStackCount + 2
+        value, valueType = operation(vm, value1, type1, value2, type2)
+        vm.currentInstIndex = index + 3
+        vm.setVar(result, value, valueType)
+
+    return stackBinary
+
+
+# CREATEFRAME ; DEFVAR TF@a ; DEFVAR TF@b ...
+def matchCreateFrame(code, index):
+    if code[index]["instruction"] != "CREATEFRAME":
+        return 0
+    names = set()
+    count = 1
+    while index + count < len(code) and code[index + count]["instruction"] == "DEFVAR":
+        var = code[index + count]["args"][0]
+        # Redefinition has to be executed by DEFVAR itself to exit with error
+        if var["frame"] != "TF" or var["name"] in names:
+            break
+        names.add(var["name"])
+        count += 1
+    return count if count > 1 else 0
+
+
+def fuseCreateFrame(vm, code, index, count):
+    createFrame = vm.handlers["CREATEFRAME"]
+    names = tuple(code[index + x]["args"][0]["name"] for x in range(1, count))
+
+    def createFrameDefvar():
+        createFrame(vm, None)
+        frame = vm.frames["TF"]
+        for name in names:
+            frame[name] = newCell(vm)
+        vm.currentInstIndex = index + count - 1
+
+    return createFrameDefvar
+
+
+fusions = (
+    ("compare-jump", matchCompareJump, fuseCompareJump),
+    ("stack-operation", matchStackOperation, fuseStackOperation),
+    ("createframe-defvar", matchCreateFrame, fuseCreateFrame),
+)
+
+
+def countedFusion(vm, handler, index, count):
+    def counted():
+        for x in range(index + 1, index + count):
+            vm.instCounters[x] += 1
+        handler()
+
+    return counted
+
+
+"""
+    Replaces sequences in program by fused handlers.
+    Sequence is not fused if its first instruction was already specialized, unchecked handler is faster.
+    Returns list of fired fusions (name, index of first instruction, count of instructions).
+"""
+def fuseProgram(vm, tree, program, countInstructions, specialized=()):
+    code = list(tree.values())
+    fired = []
+    index = 0
+    while index < len(code):
+        if index in specialized:
+            index += 1
+            continue
+        for name, match, fuse in fusions:
+            count = match(code, index)
+            if count:
+                handler = fuse(vm, code, index, count)
+                if countInstructions:
+                    handler = countedFusion(vm, handler, index, count)
+                program[index] = handler
+                fired.append((name, index, count))
+                index += count - 1
+                break
+        index += 1
+
+    return fired
+
+
+def fusionReport(fired, tree):
+    code = list(tree.values())
+    total = {}
+    lines = []
+    for name, index, count in fired:
+        total[name] = total.get(name, 0) + 1
+        lines.append("{} order {}: {}".format(name, code[index]["order"], " ".join(
+            code[x]["instruction"] for x in range(index, index + count))))
+    for name, _, _ in fusions:
+        lines.append("{}: {}".format(name, total.get(name, 0)))
+    return lines
+
+
+"""
+    Static type inference.
+    For every variable of global frame computes set of types it can have before every instruction,
+    set is bit mask of type tags with extra bits for uninicialized and undefined variable.
+    Variables of local and temporary frame are not tracked, they can be anything.
+    Instruction whose operand types are proven runs through unchecked handler,
+    every other instruction keeps full checks.
+"""
+S_UNINIT = 1 << 5
+S_UNDEFINED = 1 << 6
+S_VALUES = S_UNINIT - 1
+S_ANY = S_VALUES | S_UNINIT | S_UNDEFINED
+S_NUMBER = 1 << T_INT | 1 << T_FLOAT
+
+resultTypeSets = {
+    "DEFVAR": S_UNINIT,
+    "DIV": 1 << T_FLOAT,
+    "LT": 1 << T_BOOL,
+    "GT": 1 << T_BOOL,
+    "EQ": 1 << T_BOOL,
+    "AND": 1 << T_BOOL,
+    "OR": 1 << T_BOOL,
+    "NOT": 1 << T_BOOL,
+    "INT2CHAR": 1 << T_STRING,
+    "STRI2INT": 1 << T_INT,
+    "INT2FLOAT": 1 << T_FLOAT,
+    "FLOAT2INT": 1 << T_INT,
+    "CONCAT": 1 << T_STRING,
+    "STRLEN": 1 << T_INT,
+    "GETCHAR": 1 << T_STRING,
+    "SETCHAR": 1 << T_STRING,
+    "TYPE": 1 << T_STRING,
+}
+
+
+def symbolTypeSet(arg, state):
+    if arg["type"] == "var":
+        if arg["frame"] != "GF":
+            return S_ANY
+        return state.get(arg["name"], S_UNDEFINED)
+    return 1 << arg["tag"]
+
+
+"""
+    Returns type tag of symbol if it is proven to be inicialized with only one type, otherwise None.
+"""
+def provenType(arg, state):
+    typeSet = symbolTypeSet(arg, state)
+    if typeSet == 0 or typeSet & ~S_VALUES or typeSet & (typeSet - 1):
+        return None
+    return typeSet.bit_length() - 1
+
+
+# Instruction which finishes without error leaves its variable with type from result set
+def transferTypes(instruction, state):
+    opcode = instruction["instruction"]
+    args = instruction["args"]
+    if not args or instructions[opcode]["args"][0] != "var" or args[0]["frame"] != "GF":
+        return
+
+    if opcode == "MOVE":
+        result = symbolTypeSet(args[1], state) & S_VALUES
+    elif opcode in ("ADD", "SUB", "MUL", "IDIV"):
+        result = symbolTypeSet(args[1], state) & symbolTypeSet(
+            args[2], state) & S_NUMBER
+    elif opcode == "READ":
+        result = 1 << args[1]["tag"] | 1 << T_NIL
+    else:
+        result = resultTypeSets.get(opcode, S_VALUES)
+    state[args[0]["name"]] = result
+
+
+def joinTypes(state, target):
+    changed = False
+    for name in target:
+        if not name in state and not target[name] & S_UNDEFINED:
+            target[name] |= S_UNDEFINED
+            changed = True
+    for name, typeSet in state.items():
+        old = target.get(name, S_UNDEFINED)
+        if old | typeSet != old:
+            target[name] = old | typeSet
+            changed = True
+    return changed
+
+
+"""
+    Returns states of variables before every reachable node of graph, None for unreachable node.
+"""
+def inferTypes(code, graph):
+    blocks = graph["blocks"]
+    successors = graph["successors"]
+    states = [None] * len(successors)
+    states[0] = {}
+    worklist = [0]
+    queued = {0}
+    while worklist:
+        node = worklist.pop()
+        queued.discard(node)
+        state = dict(states[node])
+        if node < len(blocks):
+            first, last = blocks[node]
+            for index in range(first, last + 1):
+                transferTypes(code[index], state)
+
+        for successor in successors[node]:
+            if states[successor] == None:
+                states[successor] = dict(state)
+                changed = True
+            else:
+                changed = joinTypes(state, states[successor])
+            if changed and not successor in queued:
+                worklist.append(successor)
+                queued.add(successor)
+
+    return states
+
+
+def uncheckedOperand(vm, arg):
+    if arg["type"] == "var":
+        return vm.frames["GF"], arg["name"]
+    return {None: Cell(arg["value"], arg["tag"])}, None
+
+
+def floorDivision(value1, value2):
+    if value2 == 0:
+        sys.exit(57)
+    return value1 // value2
+
+
+def uncheckedMove(vm, args, types):
+    result = args[0]
+    frame1, name1 = uncheckedOperand(vm, args[1])
+
+    def unchecked():
+        variable = frame1[name1]
+        vm.setVar(result, variable.value, variable.type)
+
+    return unchecked
+
+
+def uncheckedNot(vm, args, types):
+    result = args[0]
+    frame1, name1 = uncheckedOperand(vm, args[1])
+
+    def unchecked():
+        vm.setVar(result, not frame1[name1].value, T_BOOL)
+
+    return unchecked
+
+
+def uncheckedOperation(operation, resultType=None):
+    def build(vm, args, types):
+        result = args[0]
+        frame1, name1 = uncheckedOperand(vm, args[1])
+        frame2, name2 = uncheckedOperand(vm, args[2])
+        valueType = types[0] if resultType == None else resultType
+
+        def unchecked():
+            vm.setVar(result, operation(
+                frame1[name1].value, frame2[name2].value), valueType)
+
+        return unchecked
+
+    return build
+
+
+def uncheckedJump(jumpIfEqual):
+    def build(vm, args, types):
+        label = args[0]
+        frame1, name1 = uncheckedOperand(vm, args[1])
+        frame2, name2 = uncheckedOperand(vm, args[2])
+
+        def unchecked():
+            target = getLabel(vm, label)
+            if (frame1[name1].value == frame2[name2].value) == jumpIfEqual:
+                vm.currentInstIndex = target
+
+        return unchecked
+
+    return build
+
+
+def numbersProven(types):
+    return types[0] == types[1] and types[0] in (T_INT, T_FLOAT)
+
+
+def comparableProven(types):
+    return types[0] == types[1] and types[0] not in (None, T_NIL)
+
+
+def sameTypeProven(types):
+    return types[0] == types[1] and types[0] != None
+
+
+def boolsProven(types):
+    return types[0] == T_BOOL and types[1] == T_BOOL
+
+
+"""
+    Unchecked handlers.
+    'symbs' are indexes of arguments whose types are inferred,
+    'proven' decides from their types if checks of instruction can be left out.
+"""
+uncheckedInstructions = {
+    "MOVE": {"symbs": [1], "proven": lambda types: types[0] != None, "build": uncheckedMove},
+    "ADD": {"symbs": [1, 2], "proven": numbersProven, "build": uncheckedOperation(operator.add)},
+    "SUB": {"symbs": [1, 2], "proven": numbersProven, "build": uncheckedOperation(operator.sub)},
+    "MUL": {"symbs": [1, 2], "proven": numbersProven, "build": uncheckedOperation(operator.mul)},
+    "IDIV": {"symbs": [1, 2], "proven": numbersProven, "build": uncheckedOperation(floorDivision)},
+    "LT": {"symbs": [1, 2], "proven": comparableProven, "build": uncheckedOperation(operator.lt, T_BOOL)},
+    "GT": {"symbs": [1, 2], "proven": comparableProven, "build": uncheckedOperation(operator.gt, T_BOOL)},
+    "EQ": {"symbs": [1, 2], "proven": sameTypeProven, "build": uncheckedOperation(operator.eq, T_BOOL)},
+    "AND": {"symbs": [1, 2], "proven": boolsProven, "build": uncheckedOperation(operator.and_, T_BOOL)},
+    "OR": {"symbs": [1, 2], "proven": boolsProven, "build": uncheckedOperation(operator.or_, T_BOOL)},
+    "NOT": {"symbs": [1], "proven": lambda types: types[0] == T_BOOL, "build": uncheckedNot},
+    "JUMPIFEQ": {"symbs": [1, 2], "proven": sameTypeProven, "build": uncheckedJump(True)},
+    "JUMPIFNEQ": {"symbs": [1, 2], "proven": sameTypeProven, "build": uncheckedJump(False)},
+}
+
+
+"""
+    Replaces handlers of instructions with proven operand types by unchecked ones.
+    Returns list of indexes of specialized instructions.
+"""
+def specializeProgram(vm, tree, program, graph):
+    code = list(tree.values())
+    states = inferTypes(code, graph)
+
+    specialized = []
+    for node, (first, last) in enumerate(graph["blocks"]):
+        if states[node] == None:
+            continue
+        state = dict(states[node])
+        for index in range(first, last + 1):
+            instruction = code[index]
+            unchecked = uncheckedInstructions.get(instruction["instruction"])
+            if unchecked:
+                args = instruction["args"]
+                types = [provenType(args[x], state) for x in unchecked["symbs"]]
+                if unchecked["proven"](types):
+                    program[index] = unchecked["build"](vm, args, types)
+                    specialized.append(index)
+            transferTypes(instruction, state)
+
+    return specialized
+
+
+def specializationReport(specialized, tree):
+    code = list(tree.values())
+    lines = ["specialized order {}: {}".format(
+        code[index]["order"], code[index]["instruction"]) for index in specialized]
+    lines.append("specialized: {}".format(len(specialized)))
+    return lines
+
+
+"""
+    Optimizer (--optimize).
+    Works on parsed tree before load phase. In every basic block variables with known constant value
+    are replaced by the constant, operations on constants are folded to MOVE and conditional jump
+    on constants which always jumps becomes JUMP. Operation which would end with error at runtime
+    is never folded, it stays as it is. At last instructions unreachable from start are removed.
+    Every kept instruction keeps its order and is executed the same number of times,
+    so statistics don't change.
+"""
+frameInstructions = {"CREATEFRAME": ("TF@",), "PUSHFRAME": (
+    "TF@", "LF@"), "POPFRAME": ("TF@", "LF@")}
+
 
-    if len(list(tree)) != 0:
-        lastInstruction = int(list(tree)[-1])
-        interpreteCode(tree, lastInstruction)
+def literalArgument(value, tag):
+    return {"type": typeNames[tag], "value": value, "tag": tag}
+
+
+def isLiteral(arg):
+    return arg["type"] in typeTags
+
+
+"""
+    Returns result of operation on constants as literal argument,
+    or None if operation would end with error at runtime.
+"""
+def foldOperation(opcode, values, tags):
+    if opcode in ("ADD", "SUB", "MUL", "IDIV"):
+        if tags[0] != tags[1] or not tags[0] in (T_INT, T_FLOAT):
+            return None
+    elif opcode == "DIV":
+        if tags[0] != T_FLOAT or tags[1] != T_FLOAT:
+            return None
+    elif opcode in ("LT", "GT"):
+        if tags[0] != tags[1] or tags[0] == T_NIL:
+            return None
+    elif opcode == "EQ":
+        if tags[0] != tags[1] and not T_NIL in tags:
+            return None
+    elif opcode in ("AND", "OR", "NOT"):
+        if any(tag != T_BOOL for tag in tags):
+            return None
+    elif opcode in ("STRI2INT", "GETCHAR"):
+        if tags[0] != T_STRING or tags[1] != T_INT or values[1] < 0:
+            return None
+    elif opcode == "CONCAT":
+        if tags[0] != T_STRING or tags[1] != T_STRING:
+            return None
+    elif opcode == "STRLEN":
+        if tags[0] != T_STRING:
+            return None
+    elif opcode in ("INT2CHAR", "INT2FLOAT"):
+        if tags[0] != T_INT:
+            return None
+    elif opcode == "FLOAT2INT":
+        if tags[0] != T_FLOAT:
+            return None
+    elif opcode != "TYPE":
+        return None
+
+    # Zero division, wrong index or value out of range is left to runtime as well
+    try:
+        if opcode == "ADD":
+            return literalArgument(values[0] + values[1], tags[0])
+        elif opcode == "SUB":
+            return literalArgument(values[0] - values[1], tags[0])
+        elif opcode == "MUL":
+            return literalArgument(values[0] * values[1], tags[0])
+        elif opcode == "IDIV":
+            return literalArgument(values[0] // values[1], tags[0])
+        elif opcode == "DIV":
+            return literalArgument(values[0] / values[1], T_FLOAT)
+        elif opcode == "LT":
+            return literalArgument(values[0] < values[1], T_BOOL)
+        elif opcode == "GT":
+            return literalArgument(values[0] > values[1], T_BOOL)
+        elif opcode == "EQ":
+            return literalArgument(tags[0] == tags[1] and values[0] == values[1], T_BOOL)
+        elif opcode == "AND":
+            return literalArgument(values[0] and values[1], T_BOOL)
+        elif opcode == "OR":
+            return literalArgument(values[0] or values[1], T_BOOL)
+        elif opcode == "NOT":
+            return literalArgument(not values[0], T_BOOL)
+        elif opcode == "STRI2INT":
+            return literalArgument(ord(values[0][values[1]]), T_INT)
+        elif opcode == "GETCHAR":
+            return literalArgument(values[0][values[1]], T_STRING)
+        elif opcode == "CONCAT":
+            return literalArgument(values[0] + values[1], T_STRING)
+        elif opcode == "STRLEN":
+            return literalArgument(len(values[0]), T_INT)
+        elif opcode == "INT2CHAR":
+            return literalArgument(chr(values[0]), T_STRING)
+        elif opcode == "INT2FLOAT":
+            return literalArgument(float(values[0]), T_FLOAT)
+        elif opcode == "FLOAT2INT":
+            return literalArgument(int(values[0]), T_INT)
+        else:
+            return literalArgument(typeNames[tags[0]], T_STRING)
+    except (ZeroDivisionError, IndexError, ValueError, OverflowError):
+        return None
+
+
+"""
+    Returns True if conditional jump on constants always jumps.
+    Jump which doesn't jump is kept, it still checks its label.
+"""
+def jumpAlwaysTaken(opcode, symb1, symb2):
+    if (symb1["tag"] == T_NIL) ^ (symb2["tag"] == T_NIL):
+        return opcode == "JUMPIFNEQ"
+    if symb1["tag"] != symb2["tag"]:
+        return False
+    return (symb1["value"] == symb2["value"]) == (opcode == "JUMPIFEQ")
+
+
+"""
+    Propagates and folds constants in one instruction.
+    'constants' maps variables with known value in current block to literal argument.
+    Returns kind of change and its description or None.
+"""
+def optimizeInstruction(instruction, constants):
+    opcode = instruction["instruction"]
+    args = instruction["args"]
+    kinds = instructions[opcode]["args"]
+    change = None
+
+    for x, kind in enumerate(kinds):
+        if kind == "symb" and args[x]["type"] == "var" and args[x]["value"] in constants:
+            args[x] = dict(constants[args[x]["value"]])
+            change = ("propagated", opcode)
+
+    symbs = [arg for arg, kind in zip(args, kinds) if kind == "symb"]
+    if opcode in ("JUMPIFEQ", "JUMPIFNEQ"):
+        if isLiteral(args[1]) and isLiteral(args[2]) and jumpAlwaysTaken(opcode, args[1], args[2]):
+            instruction["instruction"] = "JUMP"
+            instruction["args"] = [args[0]]
+            change = ("folded", opcode + " -> JUMP")
+    elif opcode != "MOVE" and kinds and kinds[0] == "var" and symbs and all(isLiteral(arg) for arg in symbs):
+        result = foldOperation(opcode, [arg["value"] for arg in symbs], [
+            arg["tag"] for arg in symbs])
+        if result != None:
+            instruction["instruction"] = "MOVE"
+            instruction["args"] = [args[0], result]
+            change = ("folded", opcode + " -> MOVE")
+
+    # Variable written by instruction has known value only after MOVE of constant
+    opcode = instruction["instruction"]
+    args = instruction["args"]
+    if opcode in frameInstructions:
+        for name in [name for name in constants if name.startswith(frameInstructions[opcode])]:
+            del constants[name]
+    elif args and instructions[opcode]["args"][0] == "var":
+        if opcode == "MOVE" and isLiteral(args[1]):
+            constants[args[0]["value"]] = args[1]
+        else:
+            constants.pop(args[0]["value"], None)
+
+    return change
+
+
+"""
+    Returns optimized tree and list of changes (kind, order, description).
+    Labels of run are updated to indexes in optimized tree.
+"""
+def optimizeProgram(vm, tree):
+    resolveArguments(tree)
+    linkLabels(vm, tree)
+    code = list(tree.values())
+    changes = []
+
+    graph = buildControlFlowGraph(code)
+    for first, last in graph["blocks"]:
+        constants = {}
+        for index in range(first, last + 1):
+            change = optimizeInstruction(code[index], constants)
+            if change:
+                changes.append((change[0], code[index]["order"], change[1]))
+
+    # Folded jumps could make some blocks unreachable
+    graph = buildControlFlowGraph(code)
+    reachable = {0}
+    stack = [0]
+    while stack:
+        for successor in graph["successors"][stack.pop()]:
+            if not successor in reachable:
+                reachable.add(successor)
+                stack.append(successor)
+
+    optimized = {}
+    vm.labels.clear()
+    for node, (first, last) in enumerate(graph["blocks"]):
+        for index in range(first, last + 1):
+            instruction = code[index]
+            if not node in reachable:
+                changes.append(
+                    ("removed", instruction["order"], instruction["instruction"]))
+                continue
+            if instruction["instruction"] == "LABEL":
+                vm.labels[instruction["args"][0]["value"]] = len(optimized)
+            optimized[len(optimized)] = instruction
+
+    return optimized, changes
+
+
+def optimizationReport(changes):
+    total = {}
+    lines = []
+    for kind, order, description in changes:
+        total[kind] = total.get(kind, 0) + 1
+        lines.append("{} order {}: {}".format(kind, order, description))
+    for kind in ("propagated", "folded", "removed"):
+        lines.append("{}: {}".format(kind, total.get(kind, 0)))
+    return lines
+
+
+def writeReport(lines, reportFile):
+    try:
+        report = open(reportFile, "w")
+    except (OSError, ValueError):
+        sys.exit(10)
+
+    for line in lines:
+        report.write(line + "\n")
+    report.close()
+
+
+"""
+    Tail calls (--tailcalls).
+    CALL after which only LABELs, JUMPs and RETURN follow is in tail position: when callee returns,
+    caller returns right after it. Such CALL jumps to its label without pushing return address,
+    so RETURN of callee goes straight back to caller of caller and tail recursion runs in constant
+    callStack. CALL and RETURN don't touch frames, so contents of frames are the same as without it,
+    also in usual shape POPFRAME ; CALL ; RETURN.
+    With empty callStack CALL pushes as usual, so RETURN after it still ends with error 56.
+    Skipped instructions are counted for --insts and --hot when callee returns: tail CALL is noted
+    in tailReturns under current depth of callStack and RETURN from that depth counts its path,
+    so statistics are the same as without elimination.
+"""
+def findTailCalls(code):
+    paths = {}
+    for index, instruction in enumerate(code):
+        if instruction["instruction"] != "CALL":
+            continue
+        path = []
+        following = index + 1
+        while following < len(code) and not following in path:
+            opcode = code[following]["instruction"]
+            if opcode == "RETURN":
+                paths[index] = tuple(path + [following])
+                break
+            path.append(following)
+            if opcode == "LABEL":
+                following += 1
+            elif opcode == "JUMP" and code[following]["args"][0]["target"] != None:
+                following = code[following]["args"][0]["target"] + 1
+            else:
+                break
+    return paths
+
+
+def eliminateTailCalls(vm, tree, program, countInstructions):
+    code = list(tree.values())
+    # CALL with cached result has to push, its RETURN saves the result
+    vm.tailPaths = {index: path for index, path in findTailCalls(code).items()
+                    if not index in vm.memoSites}
+    for index in vm.tailPaths:
+        if countInstructions:
+            program[index] = partial(tailCallCounted, vm, index, code[index]["args"])
+        else:
+            program[index] = partial(tailCall, vm, code[index]["args"])
+    if countInstructions:
+        for index, instruction in enumerate(code):
+            if instruction["instruction"] == "RETURN":
+                program[index] = partial(retCounted, vm, program[index])
+
+
+def tailCall(vm, args):
+    if len(vm.callStack) == 0:
+        call(vm, args)
+        return
+    vm.currentInstIndex = getLabel(vm, args[0])
+
+
+def tailCallCounted(vm, index, args):
+    if len(vm.callStack) == 0:
+        call(vm, args)
+        return
+    vm.currentInstIndex = getLabel(vm, args[0])
+    countTailCall(vm, index)
+
+
+def countTailCall(vm, index):
+    depth = len(vm.callStack)
+    waiting = vm.tailReturns.get(depth)
+    if waiting == None:
+        waiting = vm.tailReturns[depth] = {}
+    waiting[index] = waiting.get(index, 0) + 1
+
+
+def countTailReturns(vm, depth):
+    for index, count in vm.tailReturns.pop(depth).items():
+        for x in vm.tailPaths[index]:
+            vm.instCounters[x] += count
+
+
+def retCounted(vm, returnFunc):
+    if len(vm.callStack) in vm.tailReturns:
+        countTailReturns(vm, len(vm.callStack))
+    returnFunc()
+
+
+def tailCallReport(vm, tree):
+    code = list(tree.values())
+    lines = ["tail-call order {}: CALL {}".format(
+        code[index]["order"], code[index]["args"][0]["value"]) for index in sorted(vm.tailPaths)]
+    lines.append("tail-call: {}".format(len(vm.tailPaths)))
+    return lines
+
+
+"""
+    Memoization of pure subroutines (--memo).
+    Subroutine is code from label of CALL to its RETURNs. It is pure when it depends only on its
+    arguments: it doesn't touch GF or LF of its caller, doesn't READ, WRITE, EXIT, DPRINT, BREAK
+    or CLEARS and calls only pure subroutines. Arguments are its TF ( LF after PUSHFRAME ) and top
+    of data stack down to the deepest value it can pop.
+    Every subroutine is walked with depth of data stack and frames relative to its CALL, each
+    instruction has to be reached always with the same ones. All RETURNs have to leave the same
+    count of values on data stack, no pushed frame and the same TF ( TF of CALL, new frame or none ).
+    Recursive subroutine is unknown at first, paths through its CALL are walked once its RETURN
+    is reached without recursion, until no subroutine changes.
+
+    CALL of pure subroutine with loop or CALL inside looks up its label and values of arguments
+    in memoCache. Hit sets data stack and TF to saved result and continues after CALL, miss calls
+    the subroutine and its RETURN saves the result. Cache keeps at most --memo results, least
+    recently used is removed first.
+    Instructions of subroutine answered from cache are not executed, so --insts, --hot and --vars
+    count only executed instructions. Hits are counted separately by --memohits.
+"""
+impureInstructions = {"READ", "WRITE", "EXIT", "DPRINT", "BREAK", "CLEARS"}
+
+# Count of values popped from and pushed to data stack
+stackEffects = {"PUSHS": (0, 1), "POPS": (1, 0), "ADDS": (2, 1), "SUBS": (2, 1), "MULS": (2, 1),
+                "DIVS": (2, 1), "IDIVS": (2, 1), "LTS": (2, 1), "GTS": (2, 1), "EQS": (2, 1),
+                "ANDS": (2, 1), "ORS": (2, 1), "NOTS": (1, 1), "INT2CHARS": (1, 1),
+                "STRI2INTS": (2, 1), "JUMPIFEQS": (2, 0), "JUMPIFNEQS": (2, 0)}
+
+# Subroutine which can pop more values is not memoized
+memoMaxArguments = 16
+
+
+"""
+    Walks subroutine which starts at index 'start'. Returns None if it is not pure, empty dict if
+    none of its RETURNs is reached yet, else its summary: values it pops from data stack ('need'),
+    change of depth of data stack ('delta'), TF after RETURN ('exit' is "entry", "new" or "none"),
+    if it uses frame which was TF at CALL ('entry') and if it has loop or CALL inside ('heavy').
+    Frames are named "A" ( TF at CALL ) and by index of instruction which created them.
+"""
+def analyzeSubroutine(code, start, summaries):
+    states = {start: (0, (), "A")}
+    worklist = [start]
+    need = 0
+    usesEntry = False
+    heavy = False
+    exits = set()
+    while worklist:
+        index = worklist.pop()
+        if index >= len(code):
+            return None
+        depth, pushed, tf = states[index]
+        opcode = code[index]["instruction"]
+        args = code[index]["args"]
+        if opcode in impureInstructions:
+            return None
+
+        for arg in args:
+            if arg["type"] != "var":
+                continue
+            if arg["frame"] == "GF":
+                return None
+            frame = tf if arg["frame"] == "TF" else (pushed[-1] if pushed else None)
+            if frame == None:
+                return None
+            if frame == "A":
+                usesEntry = True
+
+        following = [index + 1]
+        if opcode == "CREATEFRAME":
+            tf = index
+        elif opcode == "PUSHFRAME":
+            if tf == None:
+                return None
+            # PUSHFRAME of TF from CALL fails when caller has no TF
+            if tf == "A":
+                usesEntry = True
+            pushed = pushed + (tf,)
+            tf = None
+        elif opcode == "POPFRAME":
+            if not pushed:
+                return None
+            tf = pushed[-1]
+            pushed = pushed[:-1]
+        elif opcode in stackEffects:
+            pops, pushes = stackEffects[opcode]
+            need = max(need, pops - depth)
+            depth += pushes - pops
+
+        if opcode == "RETURN":
+            if pushed:
+                return None
+            exits.add((depth, "entry" if tf == "A" else "none" if tf == None else "new"))
+            following = []
+        elif opcode == "CALL":
+            target = args[0]["target"]
+            summary = None if target == None else summaries.get(target + 1)
+            if summary == None:
+                return None
+            heavy = True
+            if not summary:
+                # Path continues when subroutine is known
+                following = []
+            else:
+                need = max(need, summary["need"] - depth)
+                depth += summary["delta"]
+                if summary["entry"] and tf == "A":
+                    usesEntry = True
+                if summary["exit"] == "none":
+                    tf = None
+                elif summary["exit"] == "new":
+                    tf = index
+        elif opcode in flowInstructions and opcode != "EXIT":
+            target = args[0]["target"]
+            if target == None:
+                return None
+            following = [target + 1] if opcode == "JUMP" else [index + 1, target + 1]
+            if target < index:
+                heavy = True
+
+        for x in following:
+            if not x in states:
+                states[x] = (depth, pushed, tf)
+                worklist.append(x)
+            elif states[x] != (depth, pushed, tf):
+                return None
+
+    if need > memoMaxArguments or len(exits) > 1:
+        return None
+    if not exits:
+        return {}
+    delta, exit = exits.pop()
+    return {"need": need, "delta": delta, "exit": exit, "entry": usesEntry, "heavy": heavy}
+
+
+"""
+    Returns summaries of pure subroutines by index of their label.
+"""
+def findPureSubroutines(code):
+    starts = {instruction["args"][0]["target"] + 1 for instruction in code
+              if instruction["instruction"] == "CALL" and instruction["args"][0]["target"] != None}
+    summaries = {start: {} for start in starts}
+    changed = True
+    rounds = 0
+    while changed:
+        changed = False
+        rounds += 1
+        for start in starts:
+            if summaries[start] == None:
+                continue
+            summary = analyzeSubroutine(code, start, summaries)
+            if summary != summaries[start]:
+                # Subroutine which keeps changing is given up
+                summaries[start] = summary if rounds <= len(starts) + memoMaxArguments else None
+                changed = True
+
+    return {start: summary for start, summary in summaries.items() if summary}
+
+
+def memoizeSubroutines(vm, tree, program, size):
+    code = list(tree.values())
+    summaries = findPureSubroutines(code)
+    vm.memoSize = size
+    vm.memoSites = {}
+    for index, instruction in enumerate(code):
+        if instruction["instruction"] != "CALL":
+            continue
+        target = instruction["args"][0]["target"]
+        summary = None if target == None else summaries.get(target + 1)
+        # Subroutine without loop and CALL is cheaper than lookup in cache
+        if summary and summary["heavy"]:
+            vm.memoSites[index] = (target + 1, summary)
+            program[index] = partial(memoizedCall, vm, index, instruction["args"])
+
+    if vm.memoSites:
+        for index, instruction in enumerate(code):
+            if instruction["instruction"] == "RETURN":
+                program[index] = partial(memoReturn, vm, program[index])
+
+
+"""
+    Returns top 'count' values and types of data stack, top is last.
+"""
+def stackTop(vm, count):
+    if count == 0:
+        return (), ()
+    values = vm.dataStackValues[len(vm.dataStackValues) - count + 1:]
+    types = vm.dataStackTypes[len(vm.dataStackTypes) - count + 1:]
+    values.append(vm.dataStackTopValue)
+    types.append(vm.dataStackTopType)
+    return tuple(values), tuple(types)
+
+
+# Floats are compared by their hex notation, so 0.0 and -0.0 are different arguments
+def valueKey(value, varType):
+    return value.hex() if varType == T_FLOAT else value
+
+
+"""
+    Looks up result of memoized CALL at 'index'. Returns True if result was taken from cache,
+    else notes the call, so its RETURN saves the result.
+"""
+def memoCall(vm, index):
+    start, summary = vm.memoSites[index]
+    need = summary["need"]
+    if len(vm.dataStackTypes) + (vm.dataStackTopType != None) < need:
+        # Subroutine ends with error or doesn't pop so deep, it is run as usual
+        return False
+
+    values, types = stackTop(vm, need)
+    stack = tuple(map(valueKey, values, types))
+    frame = None
+    if summary["entry"] and "TF" in vm.frames:
+        frame = tuple((name, cell.type, valueKey(cell.value, cell.type))
+                      for name, cell in vm.frames["TF"].items())
+    key = (start, types, stack, frame)
+
+    result = vm.memoCache.pop(key, None)
+    if result == None:
+        vm.memoPending.append((len(vm.callStack) + 1, key, summary))
+        return False
+
+    vm.memoCache[key] = result
+    vm.memoHits += 1
+    values, types, contents = result
+    for _ in range(need):
+        popStack(vm)
+    for value, varType in zip(values, types):
+        pushStack(vm, value, varType)
+    if summary["exit"] != "entry" or summary["entry"]:
+        setMemoFrame(vm, contents)
+    return True
+
+
+def memoizedCall(vm, index, args):
+    if not memoCall(vm, index):
+        call(vm, args)
+
+
+"""
+    Saves result of memoized CALL, called by RETURN from it.
+"""
+def saveMemo(vm):
+    _, key, summary = vm.memoPending.pop()
+    values, types = stackTop(vm, summary["need"] + summary["delta"])
+    contents = None
+    if (summary["exit"] == "new" or summary["exit"] == "entry" and summary["entry"]) and "TF" in vm.frames:
+        contents = tuple((name, cell.value, cell.type) for name, cell in vm.frames["TF"].items())
 
-    if statistic:
-        writeStatsToFile(statistic, tree)
+    vm.memoCache[key] = (values, types, contents)
+    if len(vm.memoCache) > vm.memoSize:
+        del vm.memoCache[next(iter(vm.memoCache))]
+
+
+def memoReturn(vm, returnFunc):
+    if vm.memoPending and vm.memoPending[-1][0] == len(vm.callStack):
+        saveMemo(vm)
+    returnFunc()
+
+
+"""
+    Replaces TF by new frame with saved variables, or removes it if 'contents' is None.
+"""
+def setMemoFrame(vm, contents):
+    if "TF" in vm.frames:
+        if vm.frameType is Frame:
+            vm.inicializedCount -= vm.frames["TF"].inicialized
+        releaseFrame(vm, vm.frames.pop("TF"))
+    if contents == None:
+        return
+
+    frame = newFrame(vm)
+    for name, value, varType in contents:
+        cell = newCell(vm)
+        cell.value = value
+        cell.type = varType
+        frame[name] = cell
+        if varType != None and vm.frameType is Frame:
+            frame.inicialized += 1
+            vm.inicializedCount += 1
+    vm.frames["TF"] = frame
+
+
+def memoReport(vm, tree):
+    code = list(tree.values())
+    lines = ["memo order {}: CALL {}".format(
+        code[index]["order"], code[index]["args"][0]["value"]) for index in sorted(vm.memoSites)]
+    lines.append("memo: {}".format(len(vm.memoSites)))
+    return lines
+
+
+"""
+    Load phase of interpreting.
+    Turns parsed tree into flat list of instruction functions with already bound arguments,
+    so interpreting loop does only one fetch and one call per instruction.
+"""
+def loadProgram(vm, tree):
+    resolveArguments(tree)
+    linkLabels(vm, tree)
+
+    program = []
+    for x in tree:
+        program.append(
+            partial(vm.handlers[tree[x]["instruction"]], vm, tree[x]["args"]))
+
+    return program
+
+
+def interpreteCode(vm, program, countInstructions):
+    lastIndex = len(program) - 1
+
+    if countInstructions:
+        vm.instCounters = [0] * len(program)
+        counters = vm.instCounters
+        while vm.currentInstIndex <= lastIndex and (not vm.exitBool):
+            counters[vm.currentInstIndex] += 1
+            program[vm.currentInstIndex]()
+            vm.currentInstIndex += 1
+    else:
+        while vm.currentInstIndex <= lastIndex and (not vm.exitBool):
+            program[vm.currentInstIndex]()
+            vm.currentInstIndex += 1
+
+    maxInicializedInFrame(vm)
+
+
+"""
+    Ahead-of-time compiler (--compile).
+    Loaded program is translated to Python source, every basic block becomes one function
+    which returns index of next block (None ends program), so instructions inside block run
+    without dispatch. MOVE, arithmetic, relational and logic instructions and jumps are inlined
+    with their type checks in the same order as in their functions above, every other instruction
+    calls its function, so these stay reference semantics.
+    Executions are counted per block, every instruction of block is executed as many times
+    as the block, so --insts and --hot give the same numbers.
+"""
+def uninicializedError(vm, index):
+    print("{}: Trying to get value from uninicialzated variable".format(
+        index), file=vm.errorStream)
+    sys.exit(56)
+
+
+def typesError(vm, index, opcode):
+    print("{}: {} variable types missmatch".format(
+        index, opcode), file=vm.errorStream)
+    sys.exit(53)
+
+
+def labelError(vm, index):
+    print("{}: Undefiend label".format(index), file=vm.errorStream)
+    sys.exit(52)
+
+
+def callStackError(vm, index):
+    print("{}: RETURN missing value at call stack".format(
+        index), file=vm.errorStream)
+    sys.exit(56)
+
+
+class ProgramCompiler:
+    arithmeticOperators = {"ADD": "+", "SUB": "-", "MUL": "*"}
+    relationalOperators = {"LT": "<", "GT": ">"}
+    logicOperators = {"AND": "and", "OR": "or"}
+
+    def __init__(self, vm, tree, tracked, counted):
+        self.vm = vm
+        self.code = list(tree.values())
+        self.graph = buildControlFlowGraph(self.code)
+        self.tracked = tracked
+        self.counted = counted
+        # Lists and dictionaries of run which blocks use, they are never replaced while it runs
+        self.constants = {"vm": vm, "GF": vm.frames["GF"], "callStack": vm.callStack,
+                          "memoPending": vm.memoPending, "tailReturns": vm.tailReturns}
+        self.lines = []
+
+    def constant(self, value, prefix):
+        name = "{}{}".format(prefix, len(self.constants))
+        self.constants[name] = value
+        return name
+
+    def emit(self, line):
+        self.lines.append("        " + line)
+
+    # Index of block which starts at instruction, None if program ends there
+    def blockAt(self, index):
+        return self.graph["blockOf"].get(index)
+
+    def variable(self, arg):
+        argName = self.constant(arg, "A")
+        if arg["frame"] == "GF":
+            return "(GF.get({!r}) or getVariable(vm, {}))".format(arg["name"], argName)
+        return "getVariable(vm, {})".format(argName)
+
+    # Emits reading of symbol, returns expressions of its value and type
+    def symbol(self, arg, n):
+        if arg["type"] != "var":
+            return self.constant(arg["value"], "K"), str(arg["tag"])
+        self.emit("c{} = {}".format(n, self.variable(arg)))
+        self.emit("t{0} = c{0}.type".format(n))
+        self.emit("if t{} == None: uninicializedError(vm, {})".format(n, self.index))
+        self.emit("v{0} = c{0}.value".format(n))
+        return "v{}".format(n), "t{}".format(n)
+
+    def store(self, arg, value, valueType):
+        if self.tracked:
+            self.emit("vm.setVar({}, {}, {})".format(
+                self.constant(arg, "A"), value, valueType))
+        else:
+            self.emit("d = " + self.variable(arg))
+            self.emit("d.value = " + value)
+            self.emit("d.type = " + valueType)
+
+    def jumpTarget(self, arg):
+        if arg["target"] == None:
+            return "labelError(vm, {})".format(self.index)
+        return "return {}".format(self.blockAt(arg["target"] + 1))
+
+    def instruction(self, index, following):
+        instruction = self.code[index]
+        opcode = instruction["instruction"]
+        args = instruction["args"]
+        self.index = index
+        error = "typesError(vm, {}, {!r})".format(index, opcode)
+
+        if opcode == "MOVE":
+            value, valueType = self.symbol(args[1], 1)
+            self.store(args[0], value, valueType)
+
+        elif opcode in self.arithmeticOperators:
+            value1, type1 = self.symbol(args[1], 1)
+            self.emit("if {0} != {1} and {0} != {2}: {3}".format(
+                type1, T_INT, T_FLOAT, error))
+            value2, type2 = self.symbol(args[2], 2)
+            self.emit("if {} != {}: {}".format(type2, type1, error))
+            self.emit("r = {} {} {}".format(
+                value1, self.arithmeticOperators[opcode], value2))
+            self.store(args[0], "r", type1)
+
+        elif opcode in ("IDIV", "DIV"):
+            value2, type2 = self.symbol(args[2], 2)
+            self.emit("if {} == 0: sys.exit(57)".format(value2))
+            value1, type1 = self.symbol(args[1], 1)
+            if opcode == "IDIV":
+                self.emit("if {0} != {1} and {0} != {2}: {3}".format(
+                    type1, T_INT, T_FLOAT, error))
+                self.emit("if {} != {}: {}".format(type2, type1, error))
+                self.emit("r = {} // {}".format(value1, value2))
+                self.store(args[0], "r", type1)
+            else:
+                self.emit("if {} != {} or {} != {}: {}".format(
+                    type1, T_FLOAT, type2, T_FLOAT, error))
+                self.emit("r = {} / {}".format(value1, value2))
+                self.store(args[0], "r", str(T_FLOAT))
+
+        elif opcode in self.relationalOperators:
+            value1, type1 = self.symbol(args[1], 1)
+            self.emit("if {} == {}: {}".format(type1, T_NIL, error))
+            value2, type2 = self.symbol(args[2], 2)
+            self.emit("if {0} == {1} or {0} != {2}: {3}".format(
+                type2, T_NIL, type1, error))
+            self.emit("r = {} {} {}".format(
+                value1, self.relationalOperators[opcode], value2))
+            self.store(args[0], "r", str(T_BOOL))
+
+        elif opcode == "EQ":
+            value1, type1 = self.symbol(args[1], 1)
+            value2, type2 = self.symbol(args[2], 2)
+            self.emit("if ({} == {}) != ({} == {}): r = False".format(
+                type1, T_NIL, type2, T_NIL))
+            self.emit("elif {} != {}: {}".format(type1, type2, error))
+            self.emit("else: r = {} == {}".format(value1, value2))
+            self.store(args[0], "r", str(T_BOOL))
+
+        elif opcode in self.logicOperators:
+            value1, type1 = self.symbol(args[1], 1)
+            self.emit("if {} != {}: {}".format(type1, T_BOOL, error))
+            value2, type2 = self.symbol(args[2], 2)
+            self.emit("if {} != {}: {}".format(type2, T_BOOL, error))
+            self.emit("r = {} {} {}".format(
+                value1, self.logicOperators[opcode], value2))
+            self.store(args[0], "r", str(T_BOOL))
+
+        elif opcode == "NOT":
+            value1, type1 = self.symbol(args[1], 1)
+            self.emit("if {} != {}: {}".format(type1, T_BOOL, error))
+            self.store(args[0], "not " + value1, str(T_BOOL))
+
+        elif opcode == "JUMP":
+            self.emit(self.jumpTarget(args[0]))
+
+        elif opcode in ("JUMPIFEQ", "JUMPIFNEQ"):
+            value1, type1 = self.symbol(args[1], 1)
+            value2, type2 = self.symbol(args[2], 2)
+            self.emit("if ({} == {}) != ({} == {}):".format(
+                type1, T_NIL, type2, T_NIL))
+            if opcode == "JUMPIFEQ":
+                self.emit("    return {}".format(following))
+            else:
+                self.emit("    " + self.jumpTarget(args[0]))
+            self.emit("if {} != {}: {}".format(type1, type2, error))
+            if args[0]["target"] == None:
+                self.emit("labelError(vm, {})".format(index))
+            self.emit("if {} {} {}: {}".format(value1, "==" if opcode == "JUMPIFEQ" else "!=",
+                                                value2, self.jumpTarget(args[0])))
+            self.emit("return {}".format(following))
+
+        elif opcode == "CALL" and index in self.vm.memoSites:
+            self.emit("if memoCall(vm, {}): return {}".format(index, following))
+            self.emit("callStack.append({})".format(index))
+            self.emit(self.jumpTarget(args[0]))
+
+        elif opcode == "CALL" and index in self.vm.tailPaths:
+            if self.counted:
+                self.emit("if callStack: countTailCall(vm, {})".format(index))
+                self.emit("else: callStack.append({})".format(index))
+            else:
+                self.emit("if not callStack: callStack.append({})".format(index))
+            self.emit(self.jumpTarget(args[0]))
+
+        elif opcode == "CALL":
+            self.emit("callStack.append({})".format(index))
+            self.emit(self.jumpTarget(args[0]))
+
+        elif opcode == "RETURN":
+            self.emit("if not callStack: callStackError(vm, {})".format(index))
+            if self.vm.memoSites:
+                self.emit("if memoPending and memoPending[-1][0] == len(callStack): saveMemo(vm)")
+            if self.counted and self.vm.tailPaths:
+                self.emit("if len(callStack) in tailReturns: countTailReturns(vm, len(callStack))")
+            self.emit("return R[callStack.pop()]")
+
+        elif opcode == "LABEL":
+            self.emit("pass")
+
+        else:
+            handler = self.constant(
+                partial(self.vm.handlers[opcode], self.vm, args), "I")
+            self.emit("vm.currentInstIndex = {}".format(index))
+            self.emit(handler + "()")
+            if opcode == "EXIT":
+                self.emit("return None")
+            elif opcode in ("JUMPIFEQS", "JUMPIFNEQS"):
+                # Function itself stops with undefined label when jump is taken
+                if args[0]["target"] != None:
+                    self.emit("if vm.currentInstIndex != {}: return {}".format(
+                        index, self.blockAt(args[0]["target"] + 1)))
+                self.emit("return {}".format(following))
+
+    """
+        Returns list of block functions.
+    """
+    def compile(self):
+        returns = {}
+        for first, last in self.graph["blocks"]:
+            if self.code[last]["instruction"] == "CALL":
+                returns[last] = self.blockAt(last + 1)
+        self.constants["R"] = returns
+
+        body = []
+        for node, (first, last) in enumerate(self.graph["blocks"]):
+            self.lines = []
+            following = self.blockAt(last + 1)
+            for index in range(first, last + 1):
+                self.instruction(index, following)
+            if not self.code[last]["instruction"] in flowInstructions:
+                self.emit("return {}".format(following))
+            body.append("    def block{}():".format(node))
+            body += self.lines
+
+        source = ["def makeBlocks(constants):"]
+        source += ["    {0} = constants[{0!r}]".format(name) for name in self.constants]
+        source += body
+        source.append("    return [{}]".format(", ".join(
+            "block{}".format(node) for node in range(len(self.graph["blocks"])))))
+
+        namespace = {}
+        exec(compile("\n".join(source), "<ippcode21>", "exec"), globals(), namespace)
+        return namespace["makeBlocks"](self.constants)
+
+
+def runCompiled(vm, tree, countInstructions):
+    compiler = ProgramCompiler(vm, tree, vm.options.vars, countInstructions)
+    blocks = compiler.compile()
+    node = 0 if blocks else None
+
+    if countInstructions:
+        counts = [0] * len(blocks)
+        # Instructions skipped by tail calls are counted here while running
+        vm.instCounters = [0] * len(tree)
+        while node != None and not vm.exitBool:
+            counts[node] += 1
+            node = blocks[node]()
+        for node, (first, last) in enumerate(compiler.graph["blocks"]):
+            for index in range(first, last + 1):
+                vm.instCounters[index] += counts[node]
+    else:
+        while node != None and not vm.exitBool:
+            node = blocks[node]()
+
+    maxInicializedInFrame(vm)
+
+
+"""
+    PROFILER (--profile)
+    Counts executions and measures wall time of every instruction. Time is also attributed to
+    the stack of labels of active CALLs, every distinct stack is one node of call tree.
+    Profile is written as JSON and as folded stacks ( one line "main;label;label time" per stack,
+    time in microseconds ), which can be read by flamegraph tools.
+    Profile is filled while program runs, so it is written also when program ends with error.
+"""
+def newProfile(program):
+    # Call tree, node 0 is program itself
+    return {"time": 0.0, "times": [0.0] * len(program), "parents": [0], "calls": [None],
+            "nodeTimes": [0.0], "nodeCounts": [0]}
+
+
+def profileCode(vm, program, profile):
+    lastIndex = len(program) - 1
+    vm.instCounters = [0] * len(program)
+    counters = vm.instCounters
+    times = profile["times"]
+    parents = profile["parents"]
+    calls = profile["calls"]
+    children = {}
+    nodeTimes = profile["nodeTimes"]
+    nodeCounts = profile["nodeCounts"]
+    node = 0
+    depth = 0
+
+    clock = time.perf_counter
+    started = start = clock()
+    try:
+        while vm.currentInstIndex <= lastIndex and (not vm.exitBool):
+            index = vm.currentInstIndex
+            counters[index] += 1
+            program[index]()
+            now = clock()
+            times[index] += now - start
+            nodeTimes[node] += now - start
+            nodeCounts[node] += 1
+            start = now
+
+            if len(vm.callStack) != depth:
+                if len(vm.callStack) > depth:
+                    key = (node, vm.callStack[-1])
+                    if key not in children:
+                        children[key] = len(parents)
+                        parents.append(node)
+                        calls.append(vm.callStack[-1])
+                        nodeTimes.append(0.0)
+                        nodeCounts.append(0)
+                    node = children[key]
+                else:
+                    node = parents[node]
+                depth = len(vm.callStack)
+
+            vm.currentInstIndex += 1
+    except SystemExit:
+        # Instruction which ended program with error is measured too
+        now = clock()
+        times[index] += now - start
+        nodeTimes[node] += now - start
+        nodeCounts[node] += 1
+        raise
+    finally:
+        profile["time"] = clock() - started
+
+    maxInicializedInFrame(vm)
+
+
+def profileStacks(profile, code):
+    stacks = {}
+    for node in range(len(profile["parents"])):
+        stack = []
+        current = node
+        while current != 0:
+            stack.append(code[profile["calls"][current]]["args"][0]["value"])
+            current = profile["parents"][current]
+        stack = tuple(["main"] + stack[::-1])
+
+        elapsed, count = stacks.get(stack, (0.0, 0))
+        stacks[stack] = (elapsed + profile["nodeTimes"][node],
+                         count + profile["nodeCounts"][node])
+    return stacks
+
+
+def writeProfile(vm, profile, tree, profileFile):
+    code = list(tree.values())
+
+    instructionsProfile = []
+    opcodes = {}
+    for index, instruction in enumerate(code):
+        count = vm.instCounters[index]
+        if count == 0:
+            continue
+        elapsed = profile["times"][index]
+        instructionsProfile.append({"order": int(instruction["order"]), "opcode": instruction["instruction"],
+                                    "count": count, "time": elapsed})
+        opcodeCount, opcodeTime = opcodes.get(instruction["instruction"], (0, 0.0))
+        opcodes[instruction["instruction"]] = (opcodeCount + count, opcodeTime + elapsed)
+
+    stacks = profileStacks(profile, code)
+    data = {
+        "time": profile["time"],
+        "instructions": getInstructionsCount(vm, tree),
+        "opcodes": [{"opcode": opcode, "count": count, "time": elapsed}
+                    for opcode, (count, elapsed) in sorted(opcodes.items(), key=lambda x: -x[1][1])],
+        "orders": instructionsProfile,
+        "stacks": [{"stack": list(stack), "count": count, "time": elapsed}
+                   for stack, (elapsed, count) in sorted(stacks.items())]
+    }
+
+    try:
+        import json
+        with open(profileFile, "w") as output:
+            json.dump(data, output, indent=2)
+        with open(profileFile + ".folded", "w") as output:
+            for stack, (elapsed, count) in sorted(stacks.items()):
+                output.write("{} {}\n".format(";".join(stack), round(elapsed * 1000000)))
+    except (OSError, ValueError):
+        sys.exit(10)
+
+
+"""
+    Runs loaded program with options of vm and returns its exit code and program which was run,
+    --optimize replaces loaded one and statistics are counted by instructions of the run one.
+    Errors of program end it by sys.exit with their code.
+"""
+def runProgram(vm, tree):
+    options = vm.options
+    report = []
+    if options.optimize:
+        tree, changes = optimizeProgram(vm, tree)
+        report += optimizationReport(changes)
+    program = loadProgram(vm, tree)
+    if options.memo:
+        memoizeSubroutines(vm, tree, program, options.memo)
+        report += memoReport(vm, tree)
+    if options.tailcalls:
+        eliminateTailCalls(vm, tree, program, options.insts or options.hot)
+        report += tailCallReport(vm, tree)
+    specialized = []
+    if options.specialize and not options.compile:
+        graph = buildControlFlowGraph(list(tree.values()))
+        specialized = specializeProgram(vm, tree, program, graph)
+        report += specializationReport(specialized, tree)
+    if options.fuse and not options.compile:
+        fired = fuseProgram(vm, tree, program, options.insts or options.hot, set(specialized))
+        report += fusionReport(fired, tree)
+    if options.report:
+        writeReport(report, options.report)
+
+    try:
+        if options.profile:
+            profile = newProfile(program)
+            profileCode(vm, program, profile)
+        elif options.compile:
+            runCompiled(vm, tree, options.insts or options.hot)
+        else:
+            interpreteCode(vm, program, options.insts or options.hot)
+    finally:
+        flushOutput(vm)
+        if options.profile:
+            writeProfile(vm, profile, tree, options.profile)
+    return vm.exitValue, tree
+
+
+"""
+    Statistics of finished run, only those enabled by options.
+"""
+def getStatistics(vm, tree):
+    options = vm.options
+    stats = {}
+    if options.insts:
+        stats["insts"] = getInstructionsCount(vm, tree)
+    if options.hot:
+        stats["hot"] = getMostUsedOperation(vm, tree)
+    if options.vars:
+        stats["vars"] = vm.inicializedMaxCount
+    if options.memohits:
+        stats["memohits"] = vm.memoHits
+    return stats
+
+
+"""
+    INTERPRETER API
+    Every run of Interpreter has its own Machine ( frames, stacks, labels, counters, output buffer )
+    and shares with other runs only tables of this module, which are not changed by any run,
+    so programs can be interpreted many times in one process, also in threads at once,
+    without interfering.
+
+    Source is path of XML file, text stream with XML or program returned by Interpreter.load.
+    With option sourceFormat="text" source is IPPcode21 text instead of XML.
+    Input is text stream or string with whole input ( default stdin ), output and error messages
+    go to given text streams ( default stdout and stderr ).
+    Options are the same as command line options without dashes, for example
+    Interpreter(source, insts=True, fuse=True, cache="cache").
+    run() returns exit code and statistics enabled by insts, hot and vars options.
+    Statistics are returned only when program ends normally or by EXIT, as with --stats.
+    Options are checked by checkOptions, wrong ones end the run with 10 as on command line.
+    Command line runs its program through Interpreter too.
+"""
+# Options which only command line has
+commandLineOptions = ("help", "source", "input", "stats", "batch", "results")
+
+
+class Interpreter:
+    def __init__(self, source, inputStream=None, outputStream=None, errorStream=None, **options):
+        self.source = source
+        self.inputStream = sys.stdin if inputStream == None else inputStream
+        self.outputStream = sys.stdout if outputStream == None else outputStream
+        self.errorStream = sys.stderr if errorStream == None else errorStream
+        self.options = types.SimpleNamespace(**optionDefaults)
+        for name, value in options.items():
+            if name in commandLineOptions or not name in optionDefaults:
+                raise TypeError("Unknown interpreter option '{}'".format(name))
+            setattr(self.options, name, value)
+
+    """
+        Checks program and returns it loaded, so it can be run many times without parsing it again.
+        Raises SystemExit with exit code of error in program.
+    """
+    @staticmethod
+    def load(source, cache=None, sourceFormat="xml"):
+        vm = Machine(types.SimpleNamespace(**dict(optionDefaults, cache=cache, sourceFormat=sourceFormat)))
+        vm.sourceFile = Interpreter.openSource(source)
+        tree = loadSource(vm)
+        return encodeProgram(interpreterFingerprint(), tree)
+
+    @staticmethod
+    def openSource(source):
+        if not isinstance(source, str):
+            return source
+        try:
+            return open(source, newline="")
+        except OSError:
+            sys.exit(10)
+
+    @staticmethod
+    def inputReader(inputStream):
+        if isinstance(inputStream, str):
+            inputStream = io.TextIOWrapper(io.BytesIO(inputStream.encode("utf-8")), encoding="utf-8")
+        elif not hasattr(inputStream, "buffer"):
+            inputStream = io.TextIOWrapper(io.BytesIO(inputStream.read().encode("utf-8")), encoding="utf-8")
+        return InputReader(inputStream, inputStream != sys.stdin)
+
+    def run(self):
+        options = types.SimpleNamespace(**vars(self.options))
+        try:
+            checkOptions(options)
+            vm = Machine(options, self.outputStream, self.errorStream)
+            vm.inputFile = self.inputReader(self.inputStream)
+            if isinstance(self.source, bytes):
+                program = decodeProgram(self.source, interpreterFingerprint())
+                if program == None:
+                    raise ValueError("Program was not returned by Interpreter.load of this interpreter")
+                tree, vm.labels = program
+            else:
+                vm.sourceFile = self.openSource(self.source)
+                tree = loadSource(vm)
+            exitCode, tree = runProgram(vm, tree)
+        except SystemExit as exit:
+            return exit.code or 0, None
+
+        return exitCode, getStatistics(vm, tree)
+
+
+"""
+    BATCH MODE (--batch)
+    Manifest has one JSON object per line: "source" file, optional "input" file ( default empty input ),
+    optional "output" file with expected output, "rc" expected exit code and "options" of interpreter.
+    Relative paths are taken from directory of manifest. Options from command line ( --fuse, --insts, ... )
+    are used for every job, "options" of job override them, --stats is not needed for statistics.
+    Options from command line are checked once before first job. --profile and --report can't be
+    given on command line, every job would overwrite the same file, job can set its own in "options".
+    Every job runs in its own Machine, tables of module are shared by all jobs.
+    Result of every job is written as one JSON line in order of manifest: "source", "rc", "stdout",
+    "stderr", "stats", "time" and "passed" when job has expected output or exit code.
+    Expected output is compared only when expected exit code is 0, same as in test.php.
+"""
+def readManifest(manifest):
+    import json
+    try:
+        with open(manifest, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        sys.exit(10)
+
+    jobs = []
+    for line in lines:
+        if line.strip() == "":
+            continue
+        try:
+            job = json.loads(line)
+        except ValueError:
+            sys.exit(10)
+        if not isinstance(job, dict) or not isinstance(job.get("source"), str):
+            sys.exit(10)
+        if not isinstance(job.get("options", {}), dict):
+            sys.exit(10)
+        jobs.append(job)
+    return jobs
+
+
+# Files are read without newline translation, output of program is compared as it is
+def readJobFile(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+def runJob(job, directory, options):
+    def path(name):
+        return os.path.join(directory, job[name])
+
+    jobOptions = dict(options)
+    jobOptions.update(job.get("options", {}))
+    output = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    errors = io.StringIO()
+    result = {"source": job["source"]}
+
+    start = time.perf_counter()
+    try:
+        inputText = readJobFile(path("input")) if "input" in job else ""
+        exitCode, stats = Interpreter(path("source"), inputText, output, errors, **jobOptions).run()
+    except OSError:
+        exitCode, stats = 10, None
+    except Exception as error:
+        # Uncaught exception ends interpreter with 1, same as from command line
+        print("{}: {}".format(type(error).__name__, error), file=errors)
+        exitCode, stats = 1, None
+    result["time"] = time.perf_counter() - start
+
+    output.flush()
+    result["rc"] = exitCode
+    result["stdout"] = output.buffer.getvalue().decode("utf-8", "surrogateescape")
+    result["stderr"] = errors.getvalue()
+    result["stats"] = stats
+
+    if "output" in job or "rc" in job:
+        passed = exitCode == job.get("rc", 0)
+        if passed and exitCode == 0 and "output" in job:
+            try:
+                passed = result["stdout"] == readJobFile(path("output"))
+            except OSError:
+                passed = False
+        result["passed"] = passed
+    return result
+
+
+def runBatch(manifest, resultsFile, args):
+    import json
+    jobs = readManifest(manifest)
+    directory = os.path.dirname(os.path.abspath(manifest))
+    checkOptions(args)
+    options = {name: value for name, value in vars(args).items()
+               if not name in commandLineOptions}
+
+    try:
+        results = open(resultsFile, "w", encoding="utf-8") if resultsFile else sys.stdout
+    except OSError:
+        sys.exit(10)
+
+    for job in jobs:
+        results.write(json.dumps(runJob(job, directory, options)) + "\n")
+    if resultsFile:
+        results.close()
+
+
+def main():
+    try:
+        args = buildParser().parse_args()
+    except SystemExit:
+        sys.exit(10)
+
+    if args.batch:
+        if args.source or args.input or args.stats or args.help or args.profile or args.report:
+            sys.exit(10)
+        runBatch(args.batch, args.results, args)
+        sys.exit(0)
 
-    sys.exit(exitValue)
+    sourceFile, inputFile, statistic = processArguments(args)
+    options = {name: value for name, value in vars(args).items() if not name in commandLineOptions}
+    exitCode, stats = Interpreter(sourceFile, inputFile, sys.stdout, sys.stderr, **options).run()
+    if statistic and stats != None:
+        writeStatsToFile(statistic, stats)
+    sys.exit(exitCode)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,493 @@
+# ----------------------------
+# Description: Parallel tester for IPPcode21, same arguments and HTML report as test.php
+# Name: test.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import argparse
+import glob
+import importlib.util
+import io
+import multiprocessing
+import os
+import re
+import signal
+import subprocess
+import sys
+import xml.etree.ElementTree as ET
+
+directory = "."
+parseScript = "parse.php"
+interpretScript = "interpret.py"
+parseOnly = False
+interpretOnly = False
+jexamxml = "/pub/courses/ipp/jexamxml/jexamxml.jar"
+jexamcfg = "/pub/courses/ipp/jexamxml/options"
+timeout = 10
+
+# Interpreter module of worker process
+interpreter = None
+
+
+"""
+    ARGUMENT PARSING
+"""
+parser = argparse.ArgumentParser(add_help=False, prefix_chars="--")
+parser.add_argument('--help', action='store_true')
+parser.add_argument('--directory', dest='directory')
+parser.add_argument('--recursive', action='store_true')
+parser.add_argument('--parse-script', dest='parseScript')
+parser.add_argument('--int-script', dest='interpretScript')
+parser.add_argument('--parse-only', action='store_true')
+parser.add_argument('--int-only', action='store_true')
+parser.add_argument('--jexamxml', dest='jexamxml')
+parser.add_argument('--jexamcfg', dest='jexamcfg')
+parser.add_argument('--testlist', dest='testlist')
+parser.add_argument('--match', dest='match')
+parser.add_argument('--jobs', type=int, default=os.cpu_count())
+parser.add_argument('--timeout', type=float, default=10)
+
+
+"""
+    Recursive scan in directory.
+    Returns list of all subdirectories, in the same order as test.php.
+"""
+def scanDirRecursive(directory):
+    dirs = []
+    for subdirectory in sorted(glob.glob(directory + "/*")):
+        if os.path.isdir(subdirectory):
+            dirs = scanDirRecursive(subdirectory) + dirs
+            dirs.append(subdirectory)
+    return dirs
+
+
+"""
+    Converts PHP regex with delimiters ( /^.*$/i ) to Python regex.
+    Returns None for invalid regex, preg_match fails for it in test.php.
+"""
+def phpRegex(pattern):
+    if len(pattern) < 2 or pattern[0].isalnum() or pattern[0] == "\\":
+        return None
+    closing = {"(": ")", "[": "]", "{": "}", "<": ">"}.get(pattern[0], pattern[0])
+    end = pattern.rfind(closing)
+    if end <= 0:
+        return None
+
+    flags = 0
+    for modifier in pattern[end + 1:]:
+        if modifier == "i":
+            flags |= re.IGNORECASE
+        elif modifier == "m":
+            flags |= re.MULTILINE
+        elif modifier == "s":
+            flags |= re.DOTALL
+        elif modifier == "x":
+            flags |= re.VERBOSE
+        elif modifier != "u":
+            return None
+    try:
+        return re.compile(pattern[1:end], flags)
+    except re.error:
+        return None
+
+
+def readableOrExit(path):
+    if not os.access(path, os.R_OK):
+        sys.exit(41)
+    return path
+
+
+def processArguments():
+    global directory, parseScript, interpretScript, parseOnly, interpretOnly, jexamxml, jexamcfg, timeout
+    try:
+        args = parser.parse_args()
+    except:
+        sys.exit(10)
+
+    if args.help:
+        if len(sys.argv) == 2:
+            printHelp()
+            sys.exit(0)
+        else:
+            sys.exit(10)
+
+    if args.directory != None:
+        directory = readableOrExit(args.directory)
+    dirs = [directory]
+
+    if args.recursive:
+        dirs = scanDirRecursive(directory) + dirs
+    if args.parseScript != None:
+        parseScript = readableOrExit(args.parseScript)
+    if args.interpretScript != None:
+        interpretScript = readableOrExit(args.interpretScript)
+    interpretOnly = args.int_only
+    if args.jexamxml != None:
+        jexamxml = readableOrExit(args.jexamxml)
+    if args.jexamcfg != None:
+        jexamcfg = readableOrExit(args.jexamcfg)
+
+    if args.testlist != None:
+        if args.directory != None:
+            sys.exit(10)
+        dirs = []
+        try:
+            with open(args.testlist) as f:
+                lines = f.read().splitlines()
+        except OSError:
+            sys.exit(11)
+        for line in lines:
+            line = line.strip()
+            if os.path.isdir(line):
+                dirs.append(line)
+                if args.recursive:
+                    dirs = scanDirRecursive(line) + dirs
+
+    match = phpRegex(args.match if args.match != None else "/^.*$/")
+    parseOnly = args.parse_only
+
+    if parseOnly and (args.interpretScript != None or interpretOnly):
+        sys.exit(10)
+    if interpretOnly and (args.parseScript != None or parseOnly):
+        sys.exit(10)
+
+    timeout = args.timeout
+    return dirs, match, max(1, args.jobs)
+
+
+"""
+    Finds tests in directories. Missing .in, .out and .rc files are created, same as in test.php.
+"""
+def collectTests(dirs, match):
+    tests = []
+    for testDirectory in dirs:
+        for testSrc in sorted(glob.glob(testDirectory + "/*.src")):
+            testName = os.path.basename(testSrc)[:-4]
+            if match == None:
+                sys.exit(11)
+            if not match.search(testName):
+                continue
+
+            files = []
+            for extension, default in ((".in", ""), (".out", ""), (".rc", "0")):
+                path = os.path.join(testDirectory, testName + extension)
+                if not os.path.exists(path):
+                    try:
+                        with open(path, "w") as f:
+                            f.write(default)
+                    except OSError:
+                        sys.exit(12)
+                files.append(path)
+            tests.append((testDirectory, testName, testSrc, *files))
+    return tests
+
+
+"""
+    TEST EXECUTION
+    Tests run in pool of worker processes. Interpreter is loaded once in every worker and
+    programs run in it through Interpreter class, so no process is started for interpret tests.
+    Timeout is enforced by timer signal of worker. TestTimeout is not Exception, so no handler
+    of interpreter can catch it and turn it to its own exit code.
+"""
+class TestTimeout(BaseException):
+    pass
+
+
+def timeoutHandler(signum, frame):
+    raise TestTimeout()
+
+
+def initWorker(settings):
+    global interpreter, parseScript, interpretScript, parseOnly, interpretOnly, timeout
+    parseScript, interpretScript, parseOnly, interpretOnly, timeout = settings
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGALRM, timeoutHandler)
+    if not parseOnly:
+        try:
+            spec = importlib.util.spec_from_file_location("interpret", os.path.abspath(interpretScript))
+            interpreter = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(interpreter)
+        except Exception:
+            # Tests fail as python fails with missing or broken script
+            interpreter = None
+
+
+"""
+    Output as test.php gets it from exec(): split to lines, trailing whitespace
+    of every line removed, joined by newline without newline at the end.
+"""
+def execOutput(output):
+    lines = output.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return "\n".join(line.rstrip(" \t\n\v\f\r") for line in lines)
+
+
+def runParser(testSrc):
+    with open(testSrc, "rb") as source:
+        try:
+            process = subprocess.run(["php7.4", parseScript], stdin=source, stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return 124, ""
+    return process.returncode, process.stdout.decode("utf-8", "surrogateescape")
+
+
+def runInterpreter(source, testIn):
+    if interpreter == None:
+        return 2, ""
+    output = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        with open(testIn) as inputFile:
+            returnCode, stats = interpreter.Interpreter(source, inputFile, output, io.StringIO()).run()
+    except TestTimeout:
+        returnCode = 124
+    except Exception:
+        # Uncaught exception ends interpreter with 1
+        returnCode = 1
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    output.flush()
+    return returnCode, output.buffer.getvalue().decode("utf-8", "surrogateescape")
+
+
+"""
+    Expected return code is first line of .rc file compared as number, like in test.php.
+"""
+def expectedReturnCode(testRc):
+    with open(testRc) as f:
+        number = re.match(r"\s*[+-]?\d+", f.readline())
+    return int(number.group()) if number else 0
+
+
+"""
+    XML comparison instead of JExamXML. Elements are equal when they have same tag,
+    same attributes in any order, same text without surrounding whitespace and equal children.
+"""
+def xmlKey(element):
+    return (element.tag, sorted(element.attrib.items()), (element.text or "").strip(),
+            [xmlKey(child) for child in element])
+
+
+def sameXML(expected, actual):
+    try:
+        return xmlKey(ET.fromstring(expected)) == xmlKey(ET.fromstring(actual))
+    except ET.ParseError:
+        return False
+
+
+def doTest(test):
+    testDirectory, testName, testSrc, testIn, testOut, testRc = test
+    if parseOnly:
+        returnCode, output = runParser(testSrc)
+    elif interpretOnly:
+        returnCode, output = runInterpreter(testSrc, testIn)
+    else:
+        returnCode, output = runParser(testSrc)
+        if returnCode != 0:
+            return testDirectory, testName, returnCode == expectedReturnCode(testRc)
+        returnCode, output = runInterpreter(io.StringIO(execOutput(output)), testIn)
+
+    if returnCode != expectedReturnCode(testRc):
+        return testDirectory, testName, False
+    if returnCode != 0:
+        return testDirectory, testName, True
+
+    with open(testOut, encoding="utf-8", errors="surrogateescape", newline="") as f:
+        expected = f.read()
+    if parseOnly:
+        return testDirectory, testName, sameXML(expected, execOutput(output))
+    return testDirectory, testName, expected == execOutput(output)
+
+
+"""
+    HTML REPORT
+    Same document as test.php writes.
+"""
+def dirReport(dirname, passedTests, failedTests):
+    passedRows = ""
+    failedRows = ""
+    for test in sorted(passedTests):
+        passedRows += '<tr class="test-row"><td class="test-name">' + test + '</td><td class="test-result green">Passed</td></tr>'
+    for test in sorted(failedTests):
+        failedRows += '<tr class="test-row"><td class="test-name">' + test + '</td><td class="test-result red">Failed</td></tr>'
+
+    if dirname == ".":
+        dirname = "Current directory"
+    return '''
+        <div class="flex-item">
+            <h2 class="dirname">''' + dirname + '''</h2>
+                <div class="report">
+                    <h4>All: <span>''' + str(len(passedTests) + len(failedTests)) + '''</span></h4>
+                    <h4>Passed: <span class="green">''' + str(len(passedTests)) + '''</span></h4>
+                    <h4>Failed: <span class="red">''' + str(len(failedTests)) + '''</span></h4>
+                </div>
+                <table>
+                    <tbody>
+                        ''' + passedRows + '''
+                        ''' + failedRows + '''
+                    </tbody>
+            </table>
+        </div>
+    '''
+
+
+def htmlReport(tests, allTests, passed, failed):
+    report = ""
+    for dirname, results in tests.items():
+        if len(results["passed"]) + len(results["failed"]) != 0:
+            report += dirReport(dirname, results["passed"], results["failed"])
+
+    mode = "Interpret only" if interpretOnly else ("Parse only" if parseOnly else "Both")
+    return '''
+<!DOCTYPE html>
+<html lang="en">
+  <head>
+    <meta charset="UTF-8" />
+    <meta http-equiv="X-UA-Compatible" content="IE=edge" />
+    <meta name="viewport" content="width=device-width, initial-scale=1.0" />
+    <title>IPP21 TEST REPORT</title>
+
+    <style>
+      html {
+        box-sizing: border-box;
+      }
+      *, *:before, *:after {
+        box-sizing: inherit;
+      }
+      html {
+        font-family: Arial, Helvetica, sans-serif;
+        background-color: #f9f9f9;
+      }
+      h1,
+      body {
+        margin: 0;
+      }
+      h1 {
+        font-family: "Courier New", monospace;
+      }
+      h2,
+      h3 {
+        font-weight: bold;
+      }
+      h4 {
+        margin: 10px 0;
+      }
+      .content {
+        padding: 2em;
+      }
+      .head {
+        background-color: #ebebeb;
+      }
+      .green {
+        color: #4cbb17;
+      }
+      .red {
+        color: #ce1212;
+      }
+      .report {
+        font-family: "Courier New", monospace;
+      }
+      .shadow {
+        box-shadow: 0px 12px 18px -9px rgba(0, 0, 0, 0.3);
+      }
+      .flex {
+        display: flex;
+        flex-wrap: wrap;
+        align-items: stretch;
+      }
+      .flex-item {
+        width: 33%;
+        padding-right: 2em;
+      }
+      .flex-item:last-child {
+        padding-right: 0;
+      }
+      .test-result{
+        text-align:right;
+      }
+      table {
+        width: 100%;
+        background-color: #ccc;
+        border: 1px solid rgb(155, 155, 155);
+      }
+      td{
+          border:1px solid #f9f9f9;
+      }
+    </style>
+  </head>
+
+  <body>
+    <div class="content head shadow">
+      <h1>IPP21 Tester report</h1>
+      <p>
+        Mode: <b>''' + mode + '''</b>
+      </p>
+      <div class="report">
+        <h2>All tests: <span id="all">''' + str(allTests) + '''</span></h2>
+        <h3>Passed: <span id="passed" class="green">''' + str(passed) + '''</span></h3>
+        <h3>Failed: <span id="failed" class="red">''' + str(failed) + '''</span></h3>
+      </div>
+    </div>
+
+    <div class="content main">
+      <h1>Report by directories</h1>
+      <div id="dir-report">
+        <div class="flex">
+            ''' + report + '''
+        </div>
+      </div>
+    </div>
+  </body>
+</html>
+'''
+
+
+def printHelp():
+    print("Tester for interpret.py and parse.php, Version 1.0")
+    print("==========================================================")
+    print("Usage: {} \n [ --help | --directory=dir | --recursive | --parse-script=script | --int-script=script | --parse-only | --int-only | --jexamxml=file | --jexamcfg=file | --testlist=file | --match=regex | --jobs=n | --timeout=s ]".format(sys.argv[0]))
+    print("    --directory    | Search directory for tests")
+    print("    --recursive    | Search in directory recursivly in subdirectories")
+    print("    --parse-script | Path to parse script")
+    print("    --int-script   | Path to interpret script, it is run in tester process")
+    print("    --parse-only   | Test only parse script")
+    print("    --int-only     | Test only interpret script")
+    print("    --jexamxml     | Path to xml copmarator ( only checked, XML is compared by tester )")
+    print("    --jexamcfg     | Path to xml copmarator config ( only checked )")
+    print("    --testlist     | File that contain directories to search for tests")
+    print("    --match        | Do tests only match regex")
+    print("    --jobs         | Count of worker processes ( default count of CPUs )")
+    print("    --timeout      | Seconds after which test fails ( default 10 )")
+    print("\nExample usage: ")
+    print("       ./test.py --directory=tests --parse-only --parse-script=./parse.php")
+    print("       ./test.py --recursive --int-only --jobs=8")
+    print("==========================================================")
+
+
+def main():
+    dirs, match, jobs = processArguments()
+
+    tests = {}
+    for testDirectory in dirs:
+        tests[testDirectory] = {"passed": [], "failed": []}
+    testList = collectTests(dirs, match)
+
+    allTests = passed = failed = 0
+    settings = (parseScript, interpretScript, parseOnly, interpretOnly, timeout)
+    with multiprocessing.Pool(jobs, initWorker, (settings,)) as pool:
+        for testDirectory, testName, success in pool.imap(doTest, testList, chunksize=4):
+            if success:
+                tests[testDirectory]["passed"].append(testName)
+                passed += 1
+            else:
+                tests[testDirectory]["failed"].append(testName)
+                failed += 1
+            allTests += 1
+
+    sys.stdout.write(htmlReport(tests, allTests, passed, failed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# ----------------------------
+# Description: Tests of batch mode of interpret.py ( --batch )
+# Name: test_batch.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+testsDir = os.path.dirname(os.path.abspath(__file__))
+interpretScript = os.path.join(os.path.dirname(testsDir), "interpret.py")
+casesDir = os.path.join(testsDir, "options")
+
+
+def writeManifest(directory, jobs):
+    path = directory / "manifest.jsonl"
+    path.write_text("".join(json.dumps(job) + "\n" for job in jobs))
+    return str(path)
+
+
+def job(name, **options):
+    job = {"source": os.path.join(casesDir, name + ".src"), "output": os.path.join(casesDir, name + ".out")}
+    with open(os.path.join(casesDir, name + ".rc")) as f:
+        job["rc"] = int(f.read())
+    if os.path.exists(os.path.join(casesDir, name + ".in")):
+        job["input"] = os.path.join(casesDir, name + ".in")
+    if options:
+        job["options"] = options
+    return job
+
+
+def runBatch(manifest, *options):
+    process = subprocess.run([sys.executable, interpretScript, "--batch=" + manifest] + list(options),
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+    return process.returncode, [json.loads(line) for line in process.stdout.decode("utf-8").splitlines()]
+
+
+def testJobsPass(tmp_path):
+    manifest = writeManifest(tmp_path, [job("arithmetic"), job("read"), job("memo_types", memo=8)])
+    returnCode, results = runBatch(manifest, "--fuse", "--insts")
+    assert returnCode == 0
+    assert [result["passed"] for result in results] == [True, True, True]
+    assert results[0]["stats"]["insts"] > 0
+    assert results[2]["stats"] == None
+
+
+@pytest.mark.parametrize("options", [["--memo=0"], ["--profile=profile.json"], ["--report=report.txt", "--fuse"]])
+def testWrongOptionsRejected(tmp_path, monkeypatch, options):
+    monkeypatch.chdir(tmp_path)
+    manifest = writeManifest(tmp_path, [job("arithmetic")])
+    assert runBatch(manifest, *options) == (10, [])
+    assert sorted(os.listdir(tmp_path)) == ["manifest.jsonl"]
+
+
+def testJobOptionsChecked(tmp_path):
+    manifest = writeManifest(tmp_path, [job("arithmetic", memo=0), job("arithmetic")])
+    returnCode, results = runBatch(manifest)
+    assert returnCode == 0
+    assert [result["rc"] for result in results] == [10, 0]
+
+
+def testProfilePerJob(tmp_path):
+    first = str(tmp_path / "first.json")
+    second = str(tmp_path / "second.json")
+    manifest = writeManifest(tmp_path, [job("arithmetic", profile=first), job("read", profile=second)])
+    returnCode, results = runBatch(manifest)
+    assert returnCode == 0
+    assert os.path.exists(first) and os.path.exists(second)
+
+
+def testOptionsNotMapping(tmp_path):
+    manifest = writeManifest(tmp_path, [job("arithmetic"), dict(job("read"), options=["x"])])
+    assert runBatch(manifest) == (10, [])
+
+
+def testCarriageReturnInOutput(tmp_path):
+    source = tmp_path / "cr.src"
+    source.write_text("""<?xml version="1.0" encoding="UTF-8"?>
+<program language="IPPcode21">
+<instruction order="1" opcode="WRITE"><arg1 type="string">a\\013b\\013\\010c</arg1></instruction>
+</program>
+""")
+    (tmp_path / "cr.out").write_bytes(b"a\rb\r\nc")
+    manifest = writeManifest(tmp_path, [{"source": "cr.src", "output": "cr.out", "rc": 0}])
+    returnCode, results = runBatch(manifest)
+    assert returnCode == 0
+    assert results[0]["stdout"] == "a\rb\r\nc"
+    assert results[0]["passed"]
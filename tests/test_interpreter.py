@@ -0,0 +1,151 @@
+# ----------------------------
+# Description: Tests of Interpreter API of interpret.py against command line
+# Name: test_interpreter.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import concurrent.futures
+import importlib.util
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+testsDir = os.path.dirname(os.path.abspath(__file__))
+interpretScript = os.path.join(os.path.dirname(testsDir), "interpret.py")
+casesDir = os.path.join(testsDir, "options")
+
+spec = importlib.util.spec_from_file_location("interpret", interpretScript)
+interpret = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(interpret)
+
+statsOptions = ["insts", "hot", "vars", "memohits"]
+
+
+def casePath(name, extension):
+    return os.path.join(casesDir, name + extension)
+
+
+def inputText(name):
+    if not os.path.exists(casePath(name, ".in")):
+        return ""
+    with open(casePath(name, ".in")) as f:
+        return f.read()
+
+
+"""
+    Runs program from command line, options are given as for Interpreter.
+    Returns exit code, output and statistics read from --stats file ( None if file is not written ).
+"""
+def runCommandLine(name, options, statsFile):
+    arguments = [sys.executable, interpretScript, "--source=" + casePath(name, ".src"),
+                 "--stats=" + statsFile]
+    for option, value in options.items():
+        if value is True:
+            arguments.append("--" + option)
+        elif value is not False and value is not None:
+            arguments.append("--{}={}".format(option, value))
+    for option in statsOptions:
+        arguments.append("--" + option)
+
+    process = subprocess.run(arguments, input=inputText(name).encode("utf-8"),
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+    stats = None
+    if os.path.exists(statsFile):
+        with open(statsFile) as f:
+            stats = dict(zip(statsOptions, (int(x) for x in f.read().split("\n"))))
+    return process.returncode, process.stdout.decode("utf-8"), stats
+
+
+def runInterpreter(name, options):
+    output = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+    allOptions = dict(options, **{option: True for option in statsOptions})
+    returnCode, stats = interpret.Interpreter(
+        casePath(name, ".src"), inputText(name), output, io.StringIO(), **allOptions).run()
+    output.flush()
+    if stats != None:
+        # Order of hot instruction is text of order attribute
+        stats = {option: int(value) for option, value in stats.items()}
+    return returnCode, output.buffer.getvalue().decode("utf-8"), stats
+
+
+optionSets = [
+    {},
+    {"optimize": True, "specialize": True, "fuse": True},
+    {"compile": True, "tailcalls": True},
+    {"memo": 1024},
+    {"memo": 0},
+    {"memo": -3, "profile": "profile.json"},
+    {"report": "report.txt"},
+    {"report": "report.txt", "fuse": True, "profile": "profile.json"},
+    {"profile": "profile.json", "fuse": True, "compile": True, "tailcalls": True, "memo": 16},
+]
+
+
+@pytest.mark.parametrize("options", optionSets, ids=json.dumps)
+@pytest.mark.parametrize("name", ["arithmetic", "memo_fib", "read", "tail_recursion", "stack"])
+def testSameAsCommandLine(name, options, tmp_path, monkeypatch):
+    # Profile and report files are written to working directory of run
+    commandLineDirectory = tmp_path / "cli"
+    interpreterDirectory = tmp_path / "api"
+    commandLineDirectory.mkdir()
+    interpreterDirectory.mkdir()
+
+    monkeypatch.chdir(commandLineDirectory)
+    commandLine = runCommandLine(name, options, str(tmp_path / "stats"))
+    monkeypatch.chdir(interpreterDirectory)
+    assert runInterpreter(name, options) == commandLine
+
+    files = sorted(os.listdir(commandLineDirectory))
+    assert sorted(os.listdir(interpreterDirectory)) == files
+    if "report.txt" in files:
+        assert (interpreterDirectory / "report.txt").read_text() == (commandLineDirectory / "report.txt").read_text()
+
+
+def testOptionsAreChecked():
+    assert runInterpreter("arithmetic", {"memo": 0})[0] == 10
+    assert runInterpreter("arithmetic", {"report": "report.txt"})[0] == 10
+
+
+def testUnknownOption():
+    with pytest.raises(TypeError):
+        interpret.Interpreter(casePath("arithmetic", ".src"), stats="stats")
+
+
+def testProfileWrittenOnError(tmp_path):
+    profile = str(tmp_path / "profile.json")
+    process = subprocess.run([sys.executable, interpretScript, "--source=" + casePath("constant_folding", ".src"),
+                              "--input=" + os.devnull, "--profile=" + profile],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+    assert process.returncode == 57
+    with open(profile) as f:
+        data = json.load(f)
+    # IDIV which ended program is counted too
+    assert [instruction["opcode"] for instruction in data["orders"]][-1] == "IDIV"
+    assert os.path.exists(profile + ".folded")
+
+
+def testStatisticsOfOptimizedProgram():
+    # Unreachable WRITE is removed, statistics are counted by instructions which were run
+    assert runInterpreter("unreachable", {"optimize": True})[2] == {"insts": 4, "hot": 1, "vars": 1, "memohits": 0}
+
+
+def testVarsDoNotChangeTables():
+    runInterpreter("memo_fib", {"fuse": True})
+    assert interpret.instructions["CREATEFRAME"]["func"] is interpret.createframe
+    assert interpret.instructions["PUSHFRAME"]["func"] is interpret.pushframe
+    # Run without --vars has frames without tracking
+    vm = interpret.Machine()
+    assert type(vm.frames["GF"]) is dict and vm.handlers["POPFRAME"] is interpret.popframe
+
+
+def testRunsInThreads():
+    names = ["arithmetic", "memo_fib", "read", "tail_recursion", "stack"] * 4
+    options = {"compile": True, "tailcalls": True, "memo": 16}
+    expected = {name: runInterpreter(name, options) for name in set(names)}
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(lambda name: runInterpreter(name, options), names))
+    assert results == [expected[name] for name in names]
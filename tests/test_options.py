@@ -0,0 +1,78 @@
+# ----------------------------
+# Description: Regression tests of interpret.py optimization options
+# Name: test_options.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import glob
+import os
+import subprocess
+import sys
+
+import pytest
+
+testsDir = os.path.dirname(os.path.abspath(__file__))
+interpretScript = os.path.join(os.path.dirname(testsDir), "interpret.py")
+casesDir = os.path.join(testsDir, "options")
+
+
+"""
+    Every program in tests/options has expected output and exit code of plain interpreter
+    ( .out and .rc, .in is optional input ), same files as tests of test.php.
+    Every option has to give the same output and exit code, also when program ends with error.
+"""
+optionSets = [
+    [],
+    ["--optimize"],
+    ["--specialize"],
+    ["--fuse"],
+    ["--compile"],
+    ["--tailcalls"],
+    ["--memo"],
+    ["--memo=1"],
+    ["--optimize", "--specialize", "--fuse"],
+    ["--tailcalls", "--memo"],
+    ["--compile", "--tailcalls", "--memo"],
+    ["--optimize", "--specialize", "--fuse", "--tailcalls", "--memo"],
+    ["--optimize", "--insts", "--hot"],
+    ["--compile", "--tailcalls", "--memo", "--insts", "--hot", "--vars"],
+]
+
+cases = sorted(os.path.basename(path)[:-4] for path in glob.glob(os.path.join(casesDir, "*.src")))
+
+
+def readCase(name, extension, default):
+    path = os.path.join(casesDir, name + extension)
+    if not os.path.exists(path):
+        return default
+    with open(path, encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+def runInterpreter(name, options, statsFile):
+    if any(option in options for option in ("--insts", "--hot", "--vars")):
+        options = ["--stats=" + statsFile] + options
+    inputFile = os.path.join(casesDir, name + ".in")
+    if not os.path.exists(inputFile):
+        inputFile = os.devnull
+    process = subprocess.run(
+        [sys.executable, interpretScript, "--source=" + os.path.join(casesDir, name + ".src"),
+         "--input=" + inputFile] + options,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+    return process.returncode, process.stdout.decode("utf-8")
+
+
+@pytest.mark.parametrize("options", optionSets, ids=lambda options: " ".join(options) or "plain")
+@pytest.mark.parametrize("name", cases)
+def testSameAsPlainInterpreter(name, options, tmp_path):
+    statsFile = str(tmp_path / "stats")
+    returnCode, output = runInterpreter(name, options, statsFile)
+    assert returnCode == int(readCase(name, ".rc", "0"))
+    assert output == readCase(name, ".out", "")
+
+    # Statistics are written when program ends normally or by EXIT
+    if "--insts" in options and (returnCode == 0 or name == "exit"):
+        with open(statsFile) as f:
+            stats = f.read().split("\n")
+        assert len(stats) == len([option for option in options if option in ("--insts", "--hot", "--vars")])
+        assert all(value.isdigit() for value in stats)
@@ -0,0 +1,113 @@
+# ----------------------------
+# Description: Tests of IPPcode21 source text frontend of interpret.py ( --source-format=text )
+# Name: test_source_text.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import os
+import subprocess
+import sys
+
+import pytest
+
+testsDir = os.path.dirname(os.path.abspath(__file__))
+interpretScript = os.path.join(os.path.dirname(testsDir), "interpret.py")
+
+
+def runInterpreter(directory, source, sourceFormat):
+    path = directory / ("program." + sourceFormat)
+    path.write_bytes(source)
+    process = subprocess.run([sys.executable, interpretScript, "--source=" + str(path), "--input=" + os.devnull,
+                              "--source-format=" + sourceFormat],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
+    return process.returncode, process.stdout.decode("utf-8")
+
+
+"""
+    Exit code and output of source text, as parse.php would check it and interpret.py
+    would run its XML. Expected exit codes follow rules of parse.php: header is the first line which
+    is not empty or comment ( 21 ), opcode is case insensitive ( 22 ), arguments are checked by
+    regular expressions of parse.php ( 23 ). Lines end only with \\n, as fgets reads them.
+"""
+textCases = [
+    # Header
+    (b".IPPcode21\nWRITE string@a\n", 0, "a"),
+    (b"\n   \n# comment\n  .ippCODE21   # comment\nWRITE string@a\n", 0, "a"),
+    (b"WRITE string@a\n", 21, ""),
+    (b".IPPcode20\nWRITE string@a\n", 21, ""),
+    (b".IPPcode21 WRITE string@a\n", 21, ""),
+    (b"", 21, ""),
+    # Comments and white space
+    (b".IPPcode21\nWRITE string@a#comment\n#WRITE string@b\n\t WRITE\tstring@c # comment\n", 0, "ac"),
+    (b".IPPcode21\nwrite string@a\n0\nWRITE string@b 0\n", 0, "ab"),
+    (b".IPPcode21\nWRITE string@a#\n", 0, "a"),
+    # Line endings
+    (b".IPPcode21\r\nWRITE string@a\r\nWRITE int@1\r\n", 0, "a1"),
+    (b".IPPcode21\nWRITE string@a\rWRITE string@b\n", 23, ""),
+    (b".IPPcode21\rWRITE string@a\n", 21, ""),
+    (b".IPPcode21\nWRITE\rstring@a\n", 0, "a"),
+    # Escape sequences
+    (b".IPPcode21\nWRITE string@a\\032b\\010c\n", 0, "a b\nc"),
+    (b".IPPcode21\nWRITE string@\\092\\035\n", 0, "\\#"),
+    (b".IPPcode21\nWRITE string@a\\03\n", 23, ""),
+    (b".IPPcode21\nWRITE string@a\\\n", 23, ""),
+    (b".IPPcode21\nWRITE string@a\\x41\n", 23, ""),
+    # Opcodes and arguments
+    (b".IPPcode21\nPRINT string@a\n", 22, ""),
+    (b".IPPcode21\nWRITE\n", 23, ""),
+    (b".IPPcode21\nWRITE string@a string@b\n", 23, ""),
+    (b".IPPcode21\nWRITE int@1a\n", 23, ""),
+    (b".IPPcode21\nDEFVAR gf@a\n", 23, ""),
+    (b".IPPcode21\nWRITE float@0x1.8p+1\nWRITE bool@true\nWRITE nil@nil\n", 0, "0x1.8000000000000p+1true"),
+]
+
+
+@pytest.mark.parametrize("source, returnCode, output", textCases)
+def testTextRules(tmp_path, source, returnCode, output):
+    assert runInterpreter(tmp_path, source, "text") == (returnCode, output)
+
+
+"""
+    Source text and XML which parse.php writes for it give the same run.
+"""
+parsedPrograms = [
+    (b".IPPcode21 # header\r\nDEFVAR GF@a # a\r\nMOVE GF@a string@x\\032y\\035\r\n\r\nCONCAT GF@a GF@a string@\\092\r\nWRITE GF@a\r\n",
+     b"""<?xml version="1.0" encoding="UTF-8"?>
+<program language="IPPcode21">
+  <instruction order="1" opcode="DEFVAR">
+    <arg1 type="var">GF@a</arg1>
+  </instruction>
+  <instruction order="2" opcode="MOVE">
+    <arg1 type="var">GF@a</arg1>
+    <arg2 type="string">x\\032y\\035</arg2>
+  </instruction>
+  <instruction order="3" opcode="CONCAT">
+    <arg1 type="var">GF@a</arg1>
+    <arg2 type="var">GF@a</arg2>
+    <arg3 type="string">\\092</arg3>
+  </instruction>
+  <instruction order="4" opcode="WRITE">
+    <arg1 type="var">GF@a</arg1>
+  </instruction>
+</program>
+"""),
+    (b".IPPcode21\nLABEL end\nJUMP end\nlabel end\n",
+     b"""<?xml version="1.0" encoding="UTF-8"?>
+<program language="IPPcode21">
+  <instruction order="1" opcode="LABEL">
+    <arg1 type="label">end</arg1>
+  </instruction>
+  <instruction order="2" opcode="JUMP">
+    <arg1 type="label">end</arg1>
+  </instruction>
+  <instruction order="3" opcode="LABEL">
+    <arg1 type="label">end</arg1>
+  </instruction>
+</program>
+"""),
+]
+
+
+@pytest.mark.parametrize("text, xml", parsedPrograms)
+def testSameAsParsedXML(tmp_path, text, xml):
+    assert runInterpreter(tmp_path, text, "text") == runInterpreter(tmp_path, xml, "xml")
@@ -0,0 +1,88 @@
+# ----------------------------
+# Description: Tests of parallel tester test.py in interpret only mode
+# Name: test_tester.py
+# Version: 1.0
+# Python 3.8
+# ----------------------------
+import importlib.util
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+testsDir = os.path.dirname(os.path.abspath(__file__))
+testerScript = os.path.join(os.path.dirname(testsDir), "test.py")
+interpretScript = os.path.join(os.path.dirname(testsDir), "interpret.py")
+casesDir = os.path.join(testsDir, "options")
+
+
+def loadModule(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+tester = loadModule("tester", testerScript)
+interpret = loadModule("interpret", interpretScript)
+
+# Endless loop which spends most of its time in GETCHAR and INT2CHAR, their errors are 58
+endlessLoop = """<?xml version="1.0" encoding="UTF-8"?>
+<program language="IPPcode21">
+<instruction order="1" opcode="DEFVAR"><arg1 type="var">GF@c</arg1></instruction>
+<instruction order="2" opcode="LABEL"><arg1 type="label">loop</arg1></instruction>
+<instruction order="3" opcode="GETCHAR"><arg1 type="var">GF@c</arg1><arg2 type="string">abc</arg2><arg3 type="int">1</arg3></instruction>
+<instruction order="4" opcode="INT2CHAR"><arg1 type="var">GF@c</arg1><arg2 type="int">66</arg2></instruction>
+<instruction order="5" opcode="JUMP"><arg1 type="label">loop</arg1></instruction>
+</program>
+"""
+
+
+def runTester(directory, *options):
+    process = subprocess.run([sys.executable, testerScript, "--directory=" + str(directory), "--int-only",
+                              "--int-script=" + interpretScript] + list(options),
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=120)
+    report = process.stdout.decode("utf-8")
+    passed = int(re.search(r'id="passed" class="green">(\d+)<', report).group(1))
+    failed = int(re.search(r'id="failed" class="red">(\d+)<', report).group(1))
+    return process.returncode, passed, failed
+
+
+def testCases(tmp_path):
+    for name in ("arithmetic", "read", "strings"):
+        for extension in (".src", ".in", ".out", ".rc"):
+            if os.path.exists(os.path.join(casesDir, name + extension)):
+                shutil.copy(os.path.join(casesDir, name + extension), tmp_path)
+    assert runTester(tmp_path) == (0, 3, 0)
+
+
+def testTimeoutIsNotErrorOfProgram(tmp_path):
+    (tmp_path / "endless.src").write_text(endlessLoop)
+    (tmp_path / "endless.rc").write_text("58")
+    assert runTester(tmp_path, "--timeout=0.5", "--jobs=1") == (0, 0, 1)
+
+
+def constant(value, tag):
+    return {"type": "const", "value": value, "tag": tag}
+
+
+"""
+    Timeout raised while handler of instruction is in its try block has to end the test,
+    not become exit code of the instruction.
+"""
+@pytest.mark.parametrize("handler, builtin, args", [
+    ("int2char", "chr", [None, constant(66, 1)]),
+    ("str2int", "ord", [None, constant("abc", 4), constant(1, 1)]),
+    ("float2int", "int", [None, constant(1.5, 3)]),
+    ("int2float", "float", [None, constant(2, 1)]),
+])
+def testTimeoutPassesHandlers(monkeypatch, handler, builtin, args):
+    def timeout(*args):
+        raise tester.TestTimeout()
+
+    monkeypatch.setattr(interpret, builtin, timeout, raising=False)
+    with pytest.raises(tester.TestTimeout):
+        getattr(interpret, handler)(interpret.Machine(), args)